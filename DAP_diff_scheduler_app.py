@@ -2,6 +2,9 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 
+from batch_journal import BatchJournal
+from core.registry import ProtocolRegistry
+
 # Page configuration and CSS wrapper
 st.set_page_config(layout="wide")
 st.markdown(
@@ -18,11 +21,13 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-# Load mDAP protocol from Excel
-protocol_df = pd.read_excel("DAP_protocol_extended.xlsx", engine="openpyxl")
-# Only coerce percentage to numeric; keep stock_conc and working_conc as original strings
-protocol_df["percentage"] = pd.to_numeric(protocol_df["percentage"], errors="coerce")
-mask = protocol_df["percentage"].isna()
+# Protocol versions: DAP_protocol_extended.xlsx plus protocols/*.xlsx, each compiled
+# once into day-indexed lookup tables (see core/registry.py)
+@st.cache_resource
+def get_protocol_registry():
+    return ProtocolRegistry("DAP_protocol_extended.xlsx")
+
+registry = get_protocol_registry()
 
 def parse_conc(val):
     if isinstance(val, str):
@@ -44,44 +49,28 @@ def parse_conc(val):
     except:
         return None
 
-for idx in protocol_df[mask].index:
-    row = protocol_df.loc[idx]
-    w = parse_conc(row["working_conc"])
-    s = parse_conc(row["stock_conc"])
-    if w is not None and s:
-        protocol_df.at[idx, "percentage"] = (w / s) * 100
-
-protocol_df["day"] = protocol_df["day"].astype(int)
-
-mdap_protocol = {}
-for day in sorted(protocol_df["day"].dropna().unique()):
-    subset = protocol_df[protocol_df["day"] == day]
-    task = subset.iloc[0]["task"]
-    if "Media Change" in task:
-        composition = []
-        for _, r in subset.iterrows():
-            composition.append({
-                "component": r["component"],
-                "percentage": r.get("percentage", ""),
-                "stock_conc": r.get("stock_conc", ""),
-                "working_conc": r.get("working_conc", ""),
-            })
-        mdap_protocol[day] = {"task": task, "composition": composition}
-    else:
-        mdap_protocol[day] = {"task": task}
+def tasks_for_days(versions, day_counts):
+    """Task per batch for its protocol version and day count (NaN / out-of-protocol days give "No task")."""
+    return registry.lookup("task", versions, day_counts)
 
-# Load batch data
+def media_change(version, day):
+    """The Media Change entry of `version` on `day` ({"task", "composition"}), or None."""
+    for entry in registry.get(version).on("entries", day):
+        if "Media Change" in entry.get("task", "") and entry.get("composition"):
+            return entry
+    return None
+
+# Load batch data: batches.csv plus the save journal (see batch_journal.py),
+# held once per server process and indexed by batch id
 batch_file = "batches.csv"
-try:
-    batches_df = pd.read_csv(batch_file, parse_dates=["start_date"])
-except FileNotFoundError:
-    batches_df = pd.DataFrame(columns=["batch_id","cell","start_date","note"])
 
-# After reading batches_df
-if "initial_plate_count" not in batches_df.columns:
-    batches_df["initial_plate_count"] = 1
-if "replaced_plate_count" not in batches_df.columns:
-    batches_df["replaced_plate_count"] = 0
+@st.cache_resource
+def get_batch_journal():
+    return BatchJournal(batch_file)
+
+journal = get_batch_journal()
+journal.refresh()
+batches_df = journal.frame()
 
 if "selected_batch" not in st.session_state:
     st.session_state.selected_batch = None
@@ -94,20 +83,19 @@ col1, col2, col3 = st.columns([2,1,1])
 # Column 1: Existing Batches
 with col1:
     st.subheader("📋 Existing Batches")
-    display_data = []
-    for i, row in batches_df.iterrows():
-        day_count = int((today - row["start_date"].date()).days)
-        task = mdap_protocol.get(day_count, {}).get("task","No task")
-        display_data.append({
-            "Batch ID": row["batch_id"],
-            "Cell": row["cell"],
-            "Start Date": row["start_date"].date(),
-            "Day Count": day_count,
-            "Initial plate #": row["initial_plate_count"],
-            "Replated plate #": row["replaced_plate_count"],
-            "Today's Task": task
-        })
-    batch_df_display = pd.DataFrame(display_data)
+    # Whole columns at once: one date subtraction for the day counts, one array lookup for the tasks
+    day_counts = (pd.Timestamp(today) - batches_df["start_date"]).dt.days
+    versions = registry.versions_of(batches_df)
+    batch_df_display = pd.DataFrame({
+        "Batch ID": batches_df["batch_id"].to_numpy(),
+        "Cell": batches_df["cell"].to_numpy(),
+        "Start Date": batches_df["start_date"].dt.date.to_numpy(),
+        "Day Count": day_counts.astype("Int64").to_numpy(),
+        "Initial plate #": batches_df["initial_plate_count"].to_numpy(),
+        "Replated plate #": batches_df["replaced_plate_count"].to_numpy(),
+        "Protocol": versions,
+        "Today's Task": tasks_for_days(versions, day_counts),
+    })
     st.dataframe(batch_df_display, use_container_width=True)
     # After creating batch_df_display
     if batch_df_display.empty:
@@ -119,7 +107,7 @@ with col1:
         if selected_option == "➕ Add New Batch":
             st.session_state.selected_batch = None
         else:
-            st.session_state.selected_batch = batches_df[batches_df["batch_id"] == selected_option].index[0]
+            st.session_state.selected_batch = selected_option
 
 # Column 2: Batch Information Form
 with col2:
@@ -132,6 +120,7 @@ with col2:
         initial_plate_count = sel.get("initial_plate_count", 1)
         replaced_plate_count = sel.get("replaced_plate_count", 0)
         note = sel.get("note","")
+        protocol_version = registry.resolve(sel.get("protocol"))
     else:
         batch_id = ""
         cell = ""
@@ -139,10 +128,15 @@ with col2:
         initial_plate_count = 1
         replaced_plate_count = 0
         note = ""
+        protocol_version = registry.default
+    protocol_options = registry.versions()
+    if protocol_version not in protocol_options:
+        protocol_options.append(protocol_version)
     with st.form("batch_form"):
         batch_id = st.text_input("Batch ID", value=batch_id)
         cell = st.text_input("Cell", value=cell)
         start_date = st.date_input("Start Date", value=start_date)
+        protocol_version = st.selectbox("Protocol", protocol_options, index=protocol_options.index(protocol_version))
         initial_plate_count = st.number_input("Initial plate #", value=initial_plate_count, min_value=1)
         replaced_plate_count = st.number_input("Replated plate #", value=replaced_plate_count, min_value=0)
         note = st.text_area("Note", value=note)
@@ -151,20 +145,21 @@ with col2:
             new_entry = {
                 "batch_id": batch_id,
                 "cell": cell,
-                "start_date": pd.to_datetime(start_date),
+                "start_date": start_date.isoformat(),
                 "note": note,
                 "initial_plate_count": initial_plate_count,
-                "replaced_plate_count": replaced_plate_count
+                "replaced_plate_count": replaced_plate_count,
+                "protocol": protocol_version,
             }
-            if st.session_state.selected_batch is not None:
-                for k,v in new_entry.items():
-                    batches_df.at[st.session_state.selected_batch, k] = v
-                st.success("✅ Batch updated!")
+            editing = st.session_state.selected_batch
+            # Batches are keyed by id: saving must not silently replace another batch
+            if batch_id in journal and batch_id != editing:
+                st.error(f"Batch ID {batch_id} already exists.")
             else:
-                batches_df = pd.concat([batches_df, pd.DataFrame([new_entry])], ignore_index=True)
-                st.success("✅ New batch added!")
-            batches_df.to_csv(batch_file, index=False)
-            st.rerun()
+                # One appended journal line; the CSV is only rewritten on compaction
+                journal.put(new_entry, replaces=editing)
+                st.success("✅ Batch updated!" if editing is not None else "✅ New batch added!")
+                st.rerun()
 
 # Column 3: Media Composition
 with col3:
@@ -172,10 +167,15 @@ with col3:
     if st.session_state.selected_batch is not None:
         sel = batches_df.loc[st.session_state.selected_batch]
         day_count = int((today - sel["start_date"].date()).days)
-        protocol = mdap_protocol.get(day_count, {})
+        version = registry.resolve(sel.get("protocol"))
         st.markdown(f"**Day Count:** {day_count}")
-        st.markdown(f"**Task:** {protocol.get('task','No task')}")
-        if protocol.get("composition"):
+        if version in registry.versions():
+            st.markdown(f"**Task:** {registry.get(version).on('task', day_count)}")
+            protocol = media_change(version, day_count)
+        else:
+            st.warning(f"No workbook for protocol version '{version}'.")
+            protocol = None
+        if protocol:
             if day_count >= 15:
                 suggested_vol = (sel["replaced_plate_count"] + 1) * 4.0
             else:
@@ -0,0 +1,183 @@
+"""
+Hot/cold partitioning of the batch worksheets.
+
+The app only ever shows batches up to Day 21, yet `info` and `cell_counts`
+keep every batch anyone has run, so each hot read grows with lab history.
+`archive_finished()` moves the rows of finished batches to `info_archive` /
+`cell_counts_archive` (same headers), keeping the hot sheets at roughly the
+number of batches in flight.
+
+Rows are appended to the archive first and only then deleted from the hot
+sheet, so an interruption can leave a batch in both partitions but never in
+neither; readers let the hot copy win.
+
+Sheets rows are deleted by number, and any other writer (this server's archive
+job, another session's save, another server process) can shift those numbers
+between a read and a delete. So rows are never deleted by the numbers of an
+earlier read: delete_where finds them on a fresh read and, just before each
+contiguous range goes, reads that range again and checks it still holds the
+rows meant; if not, it starts over from a new read. Within a process, every
+delete / append sequence on the batch sheets also holds WRITE_LOCK.
+Nothing here imports Streamlit: the functions take gspread-like worksheets.
+"""
+import threading
+from datetime import timedelta
+
+import pandas as pd
+
+from core.rules import LAST_DAY
+from sheets import decode_sheet
+
+ARCHIVES = {"info": "info_archive", "cell_counts": "cell_counts_archive"}
+
+# Days a batch stays hot after it finishes, so recent edits don't hit the archive
+ARCHIVE_GRACE_DAYS = 7
+
+# Fresh reads delete_where makes before giving up on a sheet other writers keep changing
+DELETE_ATTEMPTS = 5
+
+# Held around every read / delete / append sequence on info, cell_counts and their archives
+WRITE_LOCK = threading.RLock()
+
+
+class SheetChangedError(RuntimeError):
+    """Rows to delete kept moving under other writers; nothing more was deleted."""
+
+
+def finished_mask(info_df: pd.DataFrame, today, grace_days=ARCHIVE_GRACE_DAYS) -> pd.Series:
+    """
+    True for batches finished more than `grace_days` ago: past Day LAST_DAY, or past
+    their end date. Rows without a start date are left where they are.
+    """
+    cutoff = pd.Timestamp(today - timedelta(days=grace_days))
+    past_last_day = info_df["start_date"] + pd.Timedelta(days=LAST_DAY) < cutoff
+    past_end = info_df["end_date"] < cutoff
+    return (info_df["start_date"].notna() & (past_last_day | past_end)).fillna(False).astype(bool)
+
+
+def row_ranges(row_numbers):
+    """Contiguous (first, last) sheet-row ranges, last range first (safe deletion order)."""
+    ranges = []
+    for r in sorted(row_numbers):
+        if ranges and r == ranges[-1][1] + 1:
+            ranges[-1][1] = r
+        else:
+            ranges.append([r, r])
+    return [tuple(rng) for rng in reversed(ranges)]
+
+
+def _keys(df):
+    users = df["username"].astype(object).tolist()
+    ids = [None if pd.isna(v) else int(v) for v in df["batch_id"].tolist()]
+    return list(zip(users, ids))
+
+
+def _trimmed(row):
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return tuple(row)
+
+
+def key_selector(name, keys):
+    """delete_where selector for the rows of sheet `name` whose (username, batch_id) is in `keys`."""
+    keys = set(keys)
+
+    def select(header, rows):
+        return [k in keys for k in _keys(decode_sheet(name, [header, *rows]))]
+    return select
+
+
+def row_selector(rows):
+    """delete_where selector for rows equal to one of `rows` (trailing blank cells ignored)."""
+    wanted = {_trimmed(r) for r in rows}
+
+    def select(header, rows):
+        return [_trimmed(r) in wanted for r in rows]
+    return select
+
+
+def delete_where(ws, select, attempts=DELETE_ATTEMPTS):
+    """
+    Delete the data rows of `ws` picked by `select(header, rows)` (one flag per
+    row), one call per contiguous range, bottom-up. Before each range is deleted
+    it is read again and must still be all picked rows, else the sheet is read
+    afresh and the remaining rows found again. Returns the number of rows deleted;
+    raises SheetChangedError after `attempts` reads that kept going stale.
+    """
+    deleted = 0
+    for _ in range(attempts):
+        values = ws.get_all_values()
+        if not values:
+            return deleted
+        header = values[0]
+        # Data row i (0-based) is sheet row i + 2: row 1 is the header
+        ranges = row_ranges(i + 2 for i, f in enumerate(select(header, values[1:])) if f)
+        for first, last in ranges:
+            current = ws.get_values(f"{first}:{last}")
+            if len(current) != last - first + 1 or not all(select(header, current)):
+                break
+            ws.delete_rows(first, last)
+            deleted += last - first + 1
+        else:
+            return deleted
+    raise SheetChangedError(f"rows of '{ws.title}' kept moving; deleted {deleted} and stopped")
+
+
+def delete_batch(ws, name, username, batch_id):
+    """Delete every row of one user's batch from sheet `name` (info, cell_counts or an archive)."""
+    return delete_where(ws, key_selector(name, [(username, int(batch_id))]))
+
+
+def move_rows(hot_ws, archive_ws, values, move):
+    """
+    Append the data rows flagged in `move` (aligned with `values[1:]`) to
+    `archive_ws`, then delete those same rows, by content, from `hot_ws`.
+    """
+    rows = [r for r, m in zip(values[1:], move) if m]
+    if not rows:
+        return 0
+    archive_ws.append_rows(rows, value_input_option="RAW")
+    delete_where(hot_ws, row_selector(rows))
+    return len(rows)
+
+
+def archive_finished(worksheets, today, grace_days=ARCHIVE_GRACE_DAYS):
+    """
+    Move finished batches and their cell counts to the archive worksheets.
+    `worksheets` maps "info", "cell_counts" and the ARCHIVES names to worksheets
+    (archives need the hot sheet's header row already). Returns {sheet: rows moved}.
+    """
+    with WRITE_LOCK:
+        return _archive_finished(worksheets, today, grace_days)
+
+
+def _archive_finished(worksheets, today, grace_days):
+    info_values = worksheets["info"].get_all_values()
+    info_df = decode_sheet("info", info_values)
+    finished = finished_mask(info_df, today, grace_days)
+    if not finished.any():
+        return {"info": 0, "cell_counts": 0}
+    keys = {k for k, f in zip(_keys(info_df), finished) if f}
+
+    moved = {"info": move_rows(worksheets["info"], worksheets[ARCHIVES["info"]], info_values, finished.tolist())}
+
+    counts_values = worksheets["cell_counts"].get_all_values()
+    counts_df = decode_sheet("cell_counts", counts_values)
+    in_finished = [k in keys for k in _keys(counts_df)]
+    moved["cell_counts"] = move_rows(
+        worksheets["cell_counts"], worksheets[ARCHIVES["cell_counts"]], counts_values, in_finished
+    )
+    return moved
+
+
+def ensure_archive(spreadsheet, hot_ws, title):
+    """The archive worksheet `title`, created with `hot_ws`'s header row if missing."""
+    for ws in spreadsheet.worksheets():
+        if ws.title == title:
+            return ws
+    header = hot_ws.get_all_values()[:1]
+    ws = spreadsheet.add_worksheet(title=title, rows=1000, cols=max(len(header[0]) if header else 1, 1))
+    if header:
+        ws.append_rows(header, value_input_option="RAW")
+    return ws
@@ -0,0 +1,163 @@
+"""
+Append-only storage for the batches of DAP_diff_scheduler_app.py.
+
+batches.csv stays the compacted snapshot. A save no longer rewrites it: it
+appends one JSON line to batches.journal ({"key": <batch id it replaces, or
+null>, "row": {...}}), so two sessions saving at nearly the same time both
+keep their change instead of the later full rewrite winning. Rows are held in
+memory in a dict keyed by batch id (str); a rerun only reads journal lines
+appended since the last one it saw, and nothing re-parses the CSV.
+
+Every COMPACT_EVERY records the rows are written back to batches.csv (via a
+temp file and os.replace) and the journal is emptied, so a cold start reads
+the snapshot and replays only what came after it. Replaying a record twice
+gives the same rows, which is what makes a crash between the two steps
+harmless. Appends and compaction share one lock: the app must be served by a
+single process, as Streamlit does. Nothing here imports Streamlit.
+"""
+import json
+import os
+import threading
+
+import pandas as pd
+
+COLUMNS = ["batch_id", "cell", "start_date", "note", "initial_plate_count", "replaced_plate_count", "protocol"]
+DEFAULTS = {"initial_plate_count": 1, "replaced_plate_count": 0}
+COMPACT_EVERY = 200
+
+
+def _text(value):
+    return "" if value is None or (not isinstance(value, str) and pd.isna(value)) else str(value)
+
+
+class BatchJournal:
+    """Batches from `snapshot_path` plus the journal next to it, indexed by batch id."""
+
+    def __init__(self, snapshot_path="batches.csv", compact_every=COMPACT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = os.path.splitext(snapshot_path)[0] + ".journal"
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._rows = {}       # batch id (str) -> row dict, in the order batches were first saved
+        self._offset = 0      # journal bytes already applied
+        self._records = 0     # journal records since the snapshot
+        self._snapshot_mtime = None
+        self._frame = None
+        with self._lock:
+            self._load()
+
+    # ---------------------- READING ----------------------
+
+    def _load(self):
+        """Read the snapshot and replay the whole journal."""
+        self._rows, self._offset, self._records, self._frame = {}, 0, 0, None
+        try:
+            snap = pd.read_csv(self.snapshot_path, dtype=str, keep_default_na=False)
+            self._snapshot_mtime = os.path.getmtime(self.snapshot_path)
+        except FileNotFoundError:
+            snap = pd.DataFrame(columns=COLUMNS)
+            self._snapshot_mtime = None
+        for row in snap.to_dict("records"):
+            # Duplicate ids in an old CSV collapse into the last row
+            self._rows[_text(row.get("batch_id"))] = {c: _text(row.get(c)) for c in COLUMNS}
+        self._replay()
+
+    def _replay(self):
+        """Apply journal lines appended since the last call. Returns the number applied."""
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(self._offset)
+                tail = f.read()
+        except FileNotFoundError:
+            return 0
+        # A line still being written has no newline yet: leave it for the next call
+        complete = tail[: tail.rfind(b"\n") + 1]
+        applied = 0
+        for line in complete.splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+                applied += 1
+        self._offset += len(complete)
+        self._records += applied
+        if applied:
+            self._frame = None
+        return applied
+
+    def _apply(self, record):
+        key, row = record["key"], {c: _text(record["row"].get(c)) for c in COLUMNS}
+        new = row["batch_id"]
+        if key is not None and key != new and key in self._rows:
+            # Renamed: keep the batch where it was in the list
+            self._rows = {(new if k == key else k): (row if k == key else v)
+                          for k, v in self._rows.items() if k != new}
+        else:
+            self._rows[new] = row
+
+    def refresh(self):
+        """Pick up changes made since the last call (by other sessions, or a compaction)."""
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self.snapshot_path)
+            except FileNotFoundError:
+                mtime = None
+            try:
+                size = os.path.getsize(self.journal_path)
+            except FileNotFoundError:
+                size = 0
+            if mtime != self._snapshot_mtime or size < self._offset:
+                self._load()
+            elif size > self._offset:
+                self._replay()
+
+    def __contains__(self, batch_id):
+        return _text(batch_id) in self._rows
+
+    def frame(self) -> pd.DataFrame:
+        """
+        All batches as a DataFrame indexed by batch id (str), start_date parsed and
+        plate counts as ints. Rebuilt only after a change; treat it as read-only.
+        """
+        with self._lock:
+            if self._frame is None:
+                df = pd.DataFrame(list(self._rows.values()), columns=COLUMNS)
+                df.index = pd.Index(list(self._rows), name=None)
+                df["start_date"] = pd.to_datetime(df["start_date"], errors="coerce")
+                for col, default in DEFAULTS.items():
+                    df[col] = pd.to_numeric(df[col], errors="coerce").fillna(default).astype(int)
+                self._frame = df
+            return self._frame
+
+    # ---------------------- WRITING ----------------------
+
+    def put(self, row, replaces=None):
+        """
+        Save `row` (a dict of COLUMNS) as one appended journal line. `replaces` is the
+        id of the batch being edited, so changing a batch's id renames it in place.
+        """
+        record = {"key": None if replaces is None else _text(replaces),
+                  "row": {c: _text(row.get(c)) for c in COLUMNS}}
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self.refresh()
+            with open(self.journal_path, "ab") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._replay()
+            if self._records >= self.compact_every:
+                self.compact()
+
+    def compact(self):
+        """Write the current rows to the snapshot and empty the journal."""
+        with self._lock:
+            self.refresh()
+            rows = pd.DataFrame(list(self._rows.values()), columns=COLUMNS)
+            tmp = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            rows.to_csv(tmp, index=False)
+            os.replace(tmp, self.snapshot_path)
+            # Crashing here leaves journal records that are already in the snapshot;
+            # replaying them on the next start changes nothing
+            open(self.journal_path, "wb").close()
+            self._snapshot_mtime = os.path.getmtime(self.snapshot_path)
+            self._offset = 0
+            self._records = 0
@@ -0,0 +1,342 @@
+"""
+Bulk import and export of a user's batches and cell counts.
+
+An import file holds many batches at once: a CSV (batches, or cell counts when
+it has a `phase` column), an Excel workbook with a `batches` and/or a
+`cell_counts` sheet, or a zip of batches.csv and cell_counts.csv. `plan_import`
+checks every row in one vectorised pass and either reports every problem with
+its file row, or returns the sheet rows to append; nothing is written unless
+the whole file is valid. `write_import` then appends them in a few batched
+requests per worksheet instead of one per row.
+
+`write_export` writes the same two tables for one user, hot and archived
+batches alike, as a zip an import accepts again. It reads nothing from the
+API: the frames come from the caller's cached sheets, and the CSVs are written
+chunk by chunk straight into the compressed zip, so a large history never sits
+in memory as one uncompressed string. Nothing here imports Streamlit.
+"""
+import io
+import os
+import zipfile
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from core.counts import parse_counts
+from core.rules import LAST_DAY
+from sheets import COUNT_COLUMNS, COUNT_PHASES, DATE_FORMAT, INFO_SCHEMA
+
+BATCH_FIELDS = [
+    "batch_id", "cell", "start_date", "end_date", "note",
+    "initial_plate_count", "replaced_plate_count", "protocol",
+]
+COUNT_FIELDS = ["batch_id", "phase", *COUNT_COLUMNS]
+TABLES = {"batches": BATCH_FIELDS, "cell_counts": COUNT_FIELDS}
+
+# Rows per append_rows request; a request carries at most a few MB
+IMPORT_CHUNK_ROWS = 2000
+# Rows per to_csv call when exporting
+EXPORT_CHUNK_ROWS = 5000
+
+# Data rows start on line 2 of a CSV or worksheet
+_FIRST_ROW = 2
+
+ERROR_COLUMNS = ["table", "row", "column", "message"]
+
+
+# ---------------------- READING ----------------------
+
+def _canonical(columns):
+    """Header cells matched case- and space-insensitively to BATCH_FIELDS / COUNT_FIELDS."""
+    known = {c.lower(): c for c in BATCH_FIELDS + COUNT_FIELDS}
+    return [known.get(str(c).strip().lower().replace(" ", "_"), str(c).strip()) for c in columns]
+
+
+def _table_of(df):
+    return "cell_counts" if "phase" in df.columns else "batches"
+
+
+def _read_csv(data):
+    df = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False, skipinitialspace=True)
+    df.columns = _canonical(df.columns)
+    return df
+
+
+def read_upload(name, data: bytes) -> dict:
+    """
+    {"batches": frame or None, "cell_counts": frame or None} from an uploaded file's
+    name and bytes. Every cell is read as text (blank = ""). ValueError if the file
+    is of another kind or holds neither table.
+    """
+    ext = os.path.splitext(name)[1].lower()
+    found = {}
+    if ext == ".csv":
+        df = _read_csv(data)
+        found[_table_of(df)] = df
+    elif ext == ".zip":
+        if not zipfile.is_zipfile(io.BytesIO(data)):
+            raise ValueError("not a zip file")
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            for member in zf.namelist():
+                stem, member_ext = os.path.splitext(os.path.basename(member))
+                if member_ext.lower() == ".csv":
+                    df = _read_csv(zf.read(member))
+                    found.setdefault(stem.lower() if stem.lower() in TABLES else _table_of(df), df)
+    elif ext in (".xlsx", ".xlsm"):
+        sheets = pd.read_excel(io.BytesIO(data), sheet_name=None, dtype=str, engine="openpyxl")
+        for sheet, df in sheets.items():
+            df = df.fillna("")
+            df.columns = _canonical(df.columns)
+            key = str(sheet).strip().lower().replace(" ", "_")
+            found.setdefault(key if key in TABLES else _table_of(df), df)
+    else:
+        raise ValueError(f"Unsupported file type '{ext or name}': use .csv, .xlsx or .zip")
+    if not found:
+        raise ValueError("The file holds no batches or cell counts.")
+    return {table: found.get(table) for table in TABLES}
+
+
+# ---------------------- VALIDATION ----------------------
+
+@dataclass
+class ImportPlan:
+    """
+    The outcome of plan_import: `errors` (one row per problem: table, row, column,
+    message) and, when there are none, the info and cell_counts rows to append.
+    `batches` is the parsed batch table, for a preview.
+    """
+    batches: pd.DataFrame
+    info_rows: list = field(default_factory=list)
+    count_rows: list = field(default_factory=list)
+    errors: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=ERROR_COLUMNS))
+
+    @property
+    def ok(self):
+        return self.errors.empty and bool(self.info_rows)
+
+
+class _Errors:
+    """Problems collected one boolean mask at a time."""
+
+    def __init__(self):
+        self.frames = []
+
+    def add(self, table, mask, column, message):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            rows = np.flatnonzero(mask) + _FIRST_ROW
+            self.frames.append(pd.DataFrame({"table": table, "row": rows, "column": column, "message": message}))
+
+    def header(self, table, column, message):
+        self.frames.append(pd.DataFrame({"table": [table], "row": [_FIRST_ROW - 1], "column": [column], "message": [message]}))
+
+    def frame(self):
+        if not self.frames:
+            return pd.DataFrame(columns=ERROR_COLUMNS)
+        return pd.concat(self.frames, ignore_index=True).sort_values(["table", "row"], kind="stable").reset_index(drop=True)
+
+
+def _column(df, name):
+    """A column as stripped text ("" where missing)."""
+    if name not in df:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[name].astype(object).where(df[name].notna(), "").astype(str).str.strip()
+
+
+def _whole_numbers(text):
+    """(values as float, mask of non-blank cells that are not whole numbers ≥ 0)."""
+    values = pd.to_numeric(text.where(text != ""), errors="coerce").to_numpy(dtype="float64")
+    bad = (text != "").to_numpy() & ~((values >= 0) & (values % 1 == 0))
+    return values, bad
+
+
+def _dates(text):
+    """Dates in DATE_FORMAT (as the sheet stores them) or ISO, optionally with a time."""
+    blank = text == ""
+    parsed = pd.to_datetime(text.where(~blank), format=DATE_FORMAT, errors="coerce")
+    rest = parsed.isna() & ~blank
+    if rest.any():
+        parsed[rest] = pd.to_datetime(text[rest], format="ISO8601", errors="coerce").dt.normalize()
+    return parsed
+
+
+def _phases(text):
+    """Phase names matched to COUNT_PHASES ignoring case and spaces ("day15" → "Day 15"); None if unknown."""
+    known = {p.lower().replace(" ", ""): p for p in COUNT_PHASES}
+    return text.str.lower().str.replace(" ", "", regex=False).map(known)
+
+
+def plan_import(batches, counts, username, existing_ids, versions, default_version) -> ImportPlan:
+    """
+    Validate an import for `username`: `batches` and `counts` are text frames as
+    from read_upload (counts may be None). Batch ids must be whole numbers ≥ 1,
+    unique in the file and not among `existing_ids`; start dates are required,
+    a blank end date means start + LAST_DAY days; plate counts are kept as text;
+    a protocol must be one of `versions` (blank = `default_version`). Counts must
+    belong to a batch of the same file, name a known phase once per batch, and
+    hold cell numbers as core.counts.parse_counts reads them.
+    """
+    errors = _Errors()
+    if batches is None:
+        batches = pd.DataFrame(columns=BATCH_FIELDS)
+    for col in ("batch_id", "start_date"):
+        if col not in batches:
+            errors.header("batches", col, "required column is missing")
+
+    ids, bad_id = _whole_numbers(_column(batches, "batch_id"))
+    bad_id |= ~(ids >= 1)
+    errors.add("batches", bad_id & ("batch_id" in batches), "batch_id", "must be a whole number ≥ 1")
+    id_series = pd.Series(ids)
+    errors.add("batches", ~bad_id & id_series.duplicated(keep=False).to_numpy(), "batch_id", "appears more than once in the file")
+    errors.add("batches", ~bad_id & id_series.isin(list(existing_ids)).to_numpy(), "batch_id", "is already used by one of your batches")
+
+    start = _dates(_column(batches, "start_date"))
+    end_text = _column(batches, "end_date")
+    end = _dates(end_text)
+    errors.add("batches", start.isna().to_numpy() & ("start_date" in batches), "start_date", "must be a date (YYYY.MM.DD or YYYY-MM-DD)")
+    errors.add("batches", (end.isna() & (end_text != "")).to_numpy(), "end_date", "must be a date (YYYY.MM.DD or YYYY-MM-DD)")
+    end = end.fillna(start + timedelta(days=LAST_DAY))
+    errors.add("batches", (end < start).to_numpy(), "end_date", "is before the start date")
+
+    protocol = _column(batches, "protocol").replace("", default_version)
+    errors.add("batches", ~protocol.isin(list(versions)).to_numpy(), "protocol", "is not a known protocol version")
+
+    parsed = pd.DataFrame({
+        "batch_id": pd.array(np.where(bad_id, np.nan, ids), dtype="Float64").astype("Int64"),
+        "cell": _column(batches, "cell"),
+        "start_date": start,
+        "end_date": end,
+        "note": _column(batches, "note"),
+        # Free text, as typed in the Batch Manager (see sheets.INFO_SCHEMA)
+        "initial_plate_count": _column(batches, "initial_plate_count"),
+        "replaced_plate_count": _column(batches, "replaced_plate_count"),
+        "protocol": protocol,
+    })
+
+    count_frame = _plan_counts(counts, parsed["batch_id"].dropna(), errors)
+    plan = ImportPlan(batches=parsed, errors=errors.frame())
+    if plan.errors.empty and len(parsed):
+        plan.info_rows = _info_rows(parsed, username)
+        plan.count_rows = _rows(username, [_ints(count_frame["batch_id"]), *(count_frame[c].tolist() for c in COUNT_FIELDS[1:])])
+    return plan
+
+
+def _plan_counts(counts, batch_ids, errors) -> pd.DataFrame:
+    """Validated count rows (batch_id, phase, plate cells as text), recording problems in `errors`."""
+    if counts is None or counts.empty:
+        return pd.DataFrame(columns=COUNT_FIELDS)
+    ids, bad_id = _whole_numbers(_column(counts, "batch_id"))
+    bad_id |= ~(ids >= 1)
+    errors.add("cell_counts", bad_id, "batch_id", "must be a whole number ≥ 1")
+    errors.add("cell_counts", ~bad_id & ~pd.Series(ids).isin(batch_ids.astype("float64")).to_numpy(),
+               "batch_id", "is not a batch of this import")
+    phase = _phases(_column(counts, "phase"))
+    errors.add("cell_counts", phase.isna().to_numpy(), "phase", f"must be one of {', '.join(COUNT_PHASES)}")
+    key = pd.DataFrame({"batch_id": ids, "phase": phase})
+    errors.add("cell_counts", (key.duplicated(keep=False) & phase.notna() & ~bad_id).to_numpy(),
+               "phase", "appears more than once for this batch")
+
+    plate_text = {c: _column(counts, c) for c in COUNT_COLUMNS}
+    for col, text in plate_text.items():
+        filled = (text != "").to_numpy()
+        if filled.any():
+            errors.add("cell_counts", filled & np.isnan(parse_counts(text)), col, "must be a cell number ≥ 0")
+    return pd.DataFrame({
+        "batch_id": pd.array(np.where(bad_id, np.nan, ids), dtype="Float64").astype("Int64"),
+        "phase": phase,
+        **plate_text,
+    })
+
+
+def _ints(values):
+    """Python ints (JSON-serialisable, unlike NumPy's), "" where missing."""
+    return ["" if pd.isna(v) else int(v) for v in values.tolist()]
+
+
+def _date_text(values):
+    """DATE_FORMAT strings, formatting each distinct date once."""
+    codes, uniques = pd.factorize(values)
+    return np.asarray(uniques.strftime(DATE_FORMAT), dtype=object)[codes].tolist()
+
+
+def _rows(username, columns):
+    """Sheet rows from per-column lists, `username` first."""
+    return [[username, *row] for row in zip(*columns)]
+
+
+def _info_rows(parsed, username):
+    """Rows for the info sheet, in INFO_SCHEMA order, with the values Batch Manager would write."""
+    columns = {
+        "batch_id": _ints(parsed["batch_id"]),
+        "cell": parsed["cell"].tolist(),
+        "start_date": _date_text(parsed["start_date"]),
+        "note": parsed["note"].tolist(),
+        "initial_plate_count": parsed["initial_plate_count"].tolist(),
+        "replaced_plate_count": parsed["replaced_plate_count"].tolist(),
+        "end_date": _date_text(parsed["end_date"]),
+        "protocol": parsed["protocol"].tolist(),
+    }
+    return _rows(username, [columns[c] for c in list(INFO_SCHEMA)[1:]])
+
+
+# ---------------------- WRITING ----------------------
+
+def append_chunked(ws, rows, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Append `rows` with one append_rows request per `chunk_rows`. Returns the number of requests."""
+    requests = 0
+    for start in range(0, len(rows), chunk_rows):
+        ws.append_rows(rows[start:start + chunk_rows], value_input_option="RAW")
+        requests += 1
+    return requests
+
+
+def write_import(plan: ImportPlan, ws_info, ws_counts, chunk_rows=IMPORT_CHUNK_ROWS):
+    """
+    Append a valid plan: info rows first, then counts, so an interruption can
+    leave batches without counts but never counts without their batch.
+    Returns the number of append requests made.
+    """
+    if not plan.ok:
+        raise ValueError("The import has errors; nothing was written.")
+    return append_chunked(ws_info, plan.info_rows, chunk_rows) + append_chunked(ws_counts, plan.count_rows, chunk_rows)
+
+
+# ---------------------- EXPORT ----------------------
+
+def _own(frames, username, key):
+    """`username`'s rows of the hot and archived frames, the hot copy winning when a key is in both."""
+    rows = pd.concat([df[df["username"] == username] for df in frames], ignore_index=True)
+    return rows.drop_duplicates(key).sort_values(key[1:], kind="stable")
+
+
+def export_frames(info_frames, count_frames, username):
+    """(batches, cell_counts) of `username` in the import layout, from decoded info and cell_counts frames."""
+    info = _own(info_frames, username, ["username", "batch_id"])
+    batches = pd.DataFrame({
+        col: info[col].dt.strftime("%Y-%m-%d") if col.endswith("_date") else info[col]
+        for col in BATCH_FIELDS if col in info
+    }).reindex(columns=BATCH_FIELDS)
+    counts = _own(count_frames, username, ["username", "batch_id", "phase"])
+    counts = counts[counts["phase"].isin(COUNT_PHASES)].reindex(columns=COUNT_FIELDS)
+    return batches, counts
+
+
+def _write_csv(zf, name, df, chunk_rows):
+    with zf.open(name, "w") as raw, io.TextIOWrapper(raw, encoding="utf-8", newline="") as out:
+        df.iloc[:0].to_csv(out, index=False)
+        for start in range(0, len(df), chunk_rows):
+            df.iloc[start:start + chunk_rows].to_csv(out, index=False, header=False)
+
+
+def write_export(batches, counts, out, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Write a zip of batches.csv and cell_counts.csv to the binary file `out`
+    (a path or a file object). The CSVs are compressed chunk by chunk as they
+    are written. Returns `out`.
+    """
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        _write_csv(zf, "batches.csv", batches, chunk_rows)
+        _write_csv(zf, "cell_counts.csv", counts, chunk_rows)
+    return out
@@ -0,0 +1,443 @@
+"""
+Shared state and helpers for streamlit_app.py and the view modules in views/.
+
+Everything here is imported once per server process. The Sheets client, the
+snapshot store and the memory registry are process-wide resources; the
+heavy client libraries (gspread, oauth2client) are only imported the first
+time the spreadsheet is opened.
+"""
+import importlib
+import os
+import threading
+from datetime import datetime
+from functools import cached_property
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import archive
+import core
+import memwatch
+import perf
+from archive import ARCHIVES
+from image_metrics import ImageAnalyzer
+from montage import MontageCache
+from history import HISTORY_FILE, HistoryIndex
+from prefetch import Prefetcher, TokenBucket
+from sheets import (
+    COUNTS_KEY, COUNT_PHASES, DATE_FORMAT, INFO_KEY, INFO_SCHEMA, build_index, decode_sheet, ensure_header,
+)
+from snapshot import SnapshotStore
+
+PROTOCOL_FILE = "DAP_protocol_extended.xlsx"
+
+BATCH_COLUMNS = [
+    "batch_id",
+    "start_date",
+    "end_date",
+    "cell",
+    "note",
+    "initial_plate_count",
+    "replaced_plate_count",
+    "protocol",
+]
+
+
+# ---------------------- SHEETS ----------------------
+
+@st.cache_resource(show_spinner=False)
+def get_spreadsheet():
+    """
+    Open the spreadsheet once per server process. Failures are not cached,
+    so the next rerun tries again.
+    """
+    if os.environ.get("DAN_FAKE_SHEETS") == "1":
+        # In-process stand-in used by loadtest.py; never touches Google
+        import fake_sheets
+        return fake_sheets.shared_spreadsheet()
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+    scope = ["https://spreadsheets.google.com/feeds","https://www.googleapis.com/auth/drive"]
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(st.secrets["GSPREAD_CRED"], scope)
+    gc    = gspread.authorize(creds)
+    perf.count_api("open_by_key")
+    return gc.open_by_key(st.secrets["SHEET_ID"])
+
+@st.cache_resource(show_spinner=False)
+def get_worksheets():
+    """
+    {"accounts", "info", "cell_counts"} worksheet proxies that count every
+    Sheets API call made during a rerun.
+    """
+    sh = get_spreadsheet()
+    perf.count_api("worksheet", 2)
+    # Select the account worksheet by its gid from secrets
+    gid_accounts = int(st.secrets["GID_ACCOUNTS"])
+    perf.count_api("worksheets")
+    return {
+        "accounts": perf.CountingWorksheet(next(ws for ws in sh.worksheets() if ws.id == gid_accounts)),
+        "info": perf.CountingWorksheet(sh.worksheet("info")),
+        "cell_counts": perf.CountingWorksheet(sh.worksheet("cell_counts")),
+    }
+
+@st.cache_resource(show_spinner=False)
+def get_archive_worksheets():
+    """The archive partitions (see archive.py), created on first use."""
+    hot = get_worksheets()
+    perf.count_api("worksheets", len(ARCHIVES))
+    return {
+        title: perf.CountingWorksheet(archive.ensure_archive(get_spreadsheet(), hot[name], title))
+        for name, title in ARCHIVES.items()
+    }
+
+def worksheet(name):
+    if name in ARCHIVES.values():
+        return get_archive_worksheets()[name]
+    return get_worksheets()[name]
+
+@st.cache_resource
+def get_snapshot_store():
+    """One snapshot store per server process, shared by every session."""
+    return SnapshotStore(ttl=300)
+
+def read_sheet(name):
+    """
+    Latest copy of a worksheet as a typed DataFrame (see sheets.py for the schemas).
+    Served from memory or the on-disk snapshot and refreshed in the background,
+    so treat it as read-only (copy before mutating).
+    """
+    ws = worksheet(name)
+
+    def fetch():
+        with perf.span(f"fetch:{name}"):
+            return decode_sheet(name, ws.get_all_values())
+
+    return get_snapshot_store().get(name, fetch)
+
+def invalidate(*names):
+    """Drop the cached copies of worksheets that were just written to."""
+    store = get_snapshot_store()
+    for name in names:
+        store.invalidate(name)
+    # Re-warm them once this rerun is done
+    st.session_state["prefetch_done"] = False
+
+def sheet_index(name, keys):
+    """The cached worksheet together with its (username, batch_id, ...) hash index."""
+    df = read_sheet(name)
+    return df, get_snapshot_store().derived(name, df, keys, lambda d: build_index(d, keys))
+
+def find_batch(username, bid):
+    """
+    `username`'s info row for batch `bid` as a Series, or None if there is none.
+    Finished batches are looked up in the archive when they are not hot.
+    """
+    for name in ("info", ARCHIVES["info"]):
+        info_df, index = sheet_index(name, INFO_KEY)
+        pos = index.get((username, int(bid)))
+        if pos is not None:
+            return info_df.iloc[pos]
+    return None
+
+def find_counts(username, bid):
+    """`username`'s cell-count rows for batch `bid`, as {phase: Series} (hot sheet first, then archive)."""
+    for name in ("cell_counts", ARCHIVES["cell_counts"]):
+        counts_df, index = sheet_index(name, COUNTS_KEY)
+        found = {}
+        for phase in COUNT_PHASES:
+            pos = index.get((username, int(bid), phase))
+            if pos is not None:
+                found[phase] = counts_df.iloc[pos]
+        if found:
+            return found
+    return {}
+
+def user_batch_ids(username):
+    """Every batch id `username` has used, hot or archived."""
+    return {b for name in ("info", ARCHIVES["info"]) for (u, b) in sheet_index(name, INFO_KEY)[1] if u == username}
+
+def cell_text(val):
+    """Render a typed cell for display or a text widget: missing values become ''."""
+    if pd.isna(val):
+        return ""
+    if isinstance(val, (pd.Timestamp, datetime)):
+        return val.strftime(DATE_FORMAT)
+    return str(val)
+
+def load_accounts():
+    df = read_sheet("accounts").copy()
+    # Ensure username and password columns exist
+    required = ["username", "password"]
+    for col in required:
+        if col not in df.columns:
+            df[col] = ""
+    return df[required]
+
+@perf.timed("load_batches")
+def load_batches(username):
+    """Load all user batches from the 'info' sheet in Google Sheets."""
+    df = read_sheet("info")
+    # filter to this user only
+    df = df[df["username"] == username].copy()
+    if df.empty:
+        return pd.DataFrame(columns=BATCH_COLUMNS)
+    # dates are already parsed with DATE_FORMAT by the sheet decoder
+    df["start_date"] = df["start_date"].dt.date
+    df["end_date"]   = df["end_date"].dt.date
+    # reindex: a snapshot saved before a column was added to the schema lacks it until refreshed
+    return df.reindex(columns=BATCH_COLUMNS)
+
+def ongoing_batches(username, today):
+    """This user's batches that are still within Day ≤ 21 today."""
+    batches = load_batches(username)
+    if not batches.empty:
+        full_cal = make_calendar(batches, today)
+        today_key = (str(today.year), today.strftime('%b'), today.strftime('%a %d'))
+        # Whole-column test: a batch id entered twice must not turn a .loc lookup into a Series
+        today_idx = pd.to_numeric(full_cal[today_key], errors="coerce")
+        valid_ids = set(full_cal.index[today_idx.notna() & (today_idx <= core.LAST_DAY)])
+        batches = batches[batches['batch_id'].astype(str).isin(valid_ids)].reset_index(drop=True)
+    return batches
+
+
+# ---------------------- CALENDAR & PROTOCOL ----------------------
+# The logic itself lives in the Streamlit-free core package
+
+make_calendar = perf.timed("make_calendar")(core.make_calendar)
+style_calendar = perf.timed("style_calendar")(core.style_calendar)
+
+@st.cache_resource
+def get_protocol_registry():
+    """
+    Every protocol version (PROTOCOL_FILE plus protocols/*.xlsx), compiled once per
+    server process and again when its workbook changes (see core/registry.py).
+    """
+    return core.ProtocolRegistry(PROTOCOL_FILE)
+
+def calendar_styles(batches, cal):
+    """Style class of every make_calendar cell, from each batch's own protocol version."""
+    # make_calendar orders its rows by batch id
+    ordered = batches.sort_values("batch_id").reset_index(drop=True)
+    registry = get_protocol_registry()
+    days = cal.apply(pd.to_numeric, errors="coerce").to_numpy(dtype="float64")
+    return registry.lookup("style", registry.versions_of(ordered), days)
+
+@st.cache_resource(show_spinner=False)
+def ensure_info_headers():
+    """
+    Give the info sheets a `protocol` header cell (sheets saved before protocol
+    versions lack it), once per server process, before the first row that has one.
+    """
+    col = list(INFO_SCHEMA).index("protocol") + 1
+    for name in ("info", ARCHIVES["info"]):
+        ensure_header(worksheet(name), "protocol", col)
+    return True
+
+
+# ---------------------- VIEW CONTEXT ----------------------
+
+class AppContext:
+    """
+    What the views need from the main script. `batches` (this user's ongoing
+    batches) is loaded on first access, so views that never touch it don't pay for it.
+    """
+
+    def __init__(self, username, today):
+        self.username = username
+        self.today = today
+
+    @cached_property
+    def batches(self):
+        return ongoing_batches(self.username, self.today)
+
+    def loaded(self):
+        """The lazily loaded attributes that have actually been loaded, for memory accounting."""
+        return {k: v for k, v in vars(self).items() if k not in ("username", "today")}
+
+
+# ---------------------- ARCHIVING ----------------------
+# Finished batches move to the archive sheets once a day (see archive.py),
+# run as a background task after the first login of the day. The move holds
+# archive.WRITE_LOCK like every save, and deletes rows only after re-checking them.
+_archive_lock = threading.Lock()
+_archived_on = {"day": None}
+
+def archive_finished(today, grace_days=archive.ARCHIVE_GRACE_DAYS):
+    """Move finished batches out of the hot sheets, at most once a day per process."""
+    with _archive_lock:
+        if _archived_on["day"] == today:
+            return None
+        moved = archive.archive_finished(
+            {name: worksheet(name) for name in ("info", "cell_counts", *ARCHIVES.values())},
+            today, grace_days,
+        )
+        _archived_on["day"] = today
+    store = get_snapshot_store()
+    for name, n in moved.items():
+        if n:
+            for changed in (name, ARCHIVES[name]):
+                store.invalidate(changed)
+                _warm_sheet(changed)
+    return moved
+
+
+# ---------------------- HISTORY ----------------------
+# Every batch, hot or archived, mirrored into an indexed SQLite file (see history.py)
+
+@st.cache_resource
+def get_history():
+    """One history index per server process, next to the sheet snapshots."""
+    return HistoryIndex(os.path.join(get_snapshot_store().directory, HISTORY_FILE))
+
+def sync_history():
+    """Bring the history index up to date with the cached info sheets and batch outcomes. Returns the index."""
+    history = get_history()
+    store = get_snapshot_store()
+    for name in ("info", ARCHIVES["info"]):
+        df = read_sheet(name)
+        store.derived(name, df, "history", lambda d, n=name: history.sync(n, d))
+    # batch_yields() returns the same frame until a count or info sheet changes
+    store.derived("yields", batch_yields(), "history", lambda y: history.sync_outcomes(core.batch_outcomes(y)))
+    return history
+
+def index_saved_batch(username, bid, row):
+    """Put a just-saved info row into the history index, so search finds it before the sheet is re-read."""
+    get_history().replace_batch(username, bid, row)
+
+
+# ---------------------- CELL COUNT ANALYTICS ----------------------
+# Counts of every batch, hot or archived, in long numeric form (see core/counts.py)
+COUNT_SHEETS = ("cell_counts", ARCHIVES["cell_counts"], "info", ARCHIVES["info"])
+
+def _build_yields(frames):
+    counts, counts_archive, info, info_archive = frames
+    # Hot rows first: a batch caught halfway through an archive move counts once, from the hot sheet
+    long = core.counts_long(pd.concat([counts, counts_archive], ignore_index=True))
+    yields = core.batch_yields(long, pd.concat([info, info_archive], ignore_index=True))
+    yields["protocol"] = get_protocol_registry().versions_of(yields)
+    return yields
+
+@perf.timed("batch_yields")
+def batch_yields():
+    """
+    One row per batch with counts (see core.counts.batch_yields), built once
+    per change of the four sheets behind it and shared by every session.
+    """
+    frames = tuple(read_sheet(name) for name in COUNT_SHEETS)
+    return get_snapshot_store().derived(COUNT_SHEETS, frames, "yields", _build_yields)
+
+
+# ---------------------- IMAGES ----------------------
+
+@st.cache_resource
+def get_montage_cache():
+    """Composed Image Viewer montages, by content hash, shared by every session (see montage.py)."""
+    return MontageCache()
+
+@st.cache_resource
+def get_image_analyzer():
+    """Image metrics on a process pool, cached by content hash, shared by every session (see image_metrics.py)."""
+    return ImageAnalyzer()
+
+
+# ---------------------- PREFETCH ----------------------
+# Warm-ups for the views the user has not opened yet (see prefetch.py)
+
+@st.cache_resource
+def get_prefetcher():
+    """One prefetcher per server process; foreground API calls are charged to its budget."""
+    prefetcher = Prefetcher(TokenBucket(float(st.secrets.get("PREFETCH_API_PER_MINUTE", 30))))
+    perf.add_listener(prefetcher.charge)
+    return prefetcher
+
+def _warm_sheet(name):
+    fetch = lambda: decode_sheet(name, worksheet(name).get_all_values())
+    thread = get_snapshot_store().warm(name, fetch)
+    if thread is not None:
+        thread.join()
+
+def schedule_prefetch(ctx):
+    """
+    Queue warm-ups of the data and code behind every view, once after login and
+    again after a write. Call it at the end of a rerun, when the page is drawn.
+    """
+    if st.session_state.get("prefetch_done"):
+        return
+    st.session_state["prefetch_done"] = True
+    prefetcher = get_prefetcher()
+    store = get_snapshot_store()
+    if _archived_on["day"] != ctx.today:
+        grace_days = int(st.secrets.get("ARCHIVE_AFTER_DAYS", archive.ARCHIVE_GRACE_DAYS))
+        prefetcher.submit("archive", lambda: archive_finished(ctx.today, grace_days), api_cost=8)
+    for name, keys in (("info", INFO_KEY), ("cell_counts", COUNTS_KEY)):
+        if not store.has(name):
+            prefetcher.submit(f"sheet:{name}", lambda n=name: _warm_sheet(n), api_cost=1)
+        # Only index what is already warm: the index task itself must never call the API
+        prefetcher.submit(f"index:{name}", lambda n=name, k=keys: store.has(n) and sheet_index(n, k))
+    for name in (ARCHIVES["info"], ARCHIVES["cell_counts"]):
+        if not store.has(name):
+            prefetcher.submit(f"sheet:{name}", lambda n=name: _warm_sheet(n), api_cost=1)
+    # The history index holds batch outcomes too, so it needs every count sheet
+    prefetcher.submit("yields", lambda: all(store.has(n) for n in COUNT_SHEETS) and batch_yields())
+    prefetcher.submit("history", lambda: all(store.has(n) for n in COUNT_SHEETS) and sync_history())
+    registry = get_protocol_registry()
+    for version in registry.versions():
+        prefetcher.submit(f"protocol:{version}", lambda v=version: registry.get(v))
+    import views
+    for view, module in views.VIEWS.items():
+        if view != "Admin":
+            prefetcher.submit(f"import:{module}", lambda m=module: importlib.import_module(m))
+    prefetcher.submit("import:PIL.Image", lambda: importlib.import_module("PIL.Image"))
+
+
+# ---------------------- MEMORY ACCOUNTING ----------------------
+# Caps are in MB. Evictable artifacts are the session_state entries under EVICTABLE_PREFIX
+# (built exports kept for their download button: views/calendar.py, views/bulk.py) and the
+# Image Viewer uploads; everything else (widget state, login) is left alone.
+EVICTABLE_PREFIX = "_cache_"
+UPLOAD_KEY_PREFIX = "img_setup_upload"
+
+def memory_caps_mb():
+    """(session cap, process cap) in MB, from secrets."""
+    return (
+        float(st.secrets.get("SESSION_MEMORY_CAP_MB", 300)),
+        float(st.secrets.get("PROCESS_MEMORY_CAP_MB", 2048)),
+    )
+
+@st.cache_resource
+def get_memory_registry():
+    """One registry per server process, shared by every session."""
+    return memwatch.SessionMemoryRegistry()
+
+def is_evictable(key):
+    return key.startswith(EVICTABLE_PREFIX) or key.startswith(UPLOAD_KEY_PREFIX)
+
+def evict_artifacts(keys):
+    for key in keys:
+        if key.startswith(UPLOAD_KEY_PREFIX):
+            # A file_uploader's value can't be assigned. Bumping the key renders a fresh,
+            # empty widget and Streamlit drops the now-orphaned files after the run.
+            st.session_state["img_upload_gen"] = st.session_state.get("img_upload_gen", 0) + 1
+            st.session_state["memory_evicted_uploads"] = True
+        else:
+            st.session_state.pop(key, None)
+
+def account_session_memory(ctx):
+    """Report this session's memory estimate to the registry and evict over the caps."""
+    run_ctx = get_script_run_ctx()
+    if run_ctx is None:
+        return
+    session_cap_mb, process_cap_mb = memory_caps_mb()
+    registry = get_memory_registry()
+    sizes = memwatch.entry_sizes(st.session_state)
+    for name, obj in ctx.loaded().items():
+        sizes[f"<local> {name}"] = memwatch.estimate_size(obj)
+    registry.report(run_ctx.session_id, ctx.username, sizes)
+    registry.enforce_process_cap(memwatch.process_rss_bytes(), process_cap_mb * memwatch.MB)
+    # An admin or the process cap can force a full eviction; otherwise trim to the session cap
+    cap = 0 if registry.take_eviction(run_ctx.session_id) else session_cap_mb * memwatch.MB
+    plan = memwatch.plan_eviction(sizes, is_evictable, cap)
+    if plan:
+        evict_artifacts(plan)
+        registry.report(run_ctx.session_id, ctx.username, {k: v for k, v in sizes.items() if k not in plan})
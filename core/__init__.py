@@ -0,0 +1,20 @@
+"""
+Scheduling logic shared by the Streamlit app and command-line tools.
+
+Nothing in this package imports Streamlit: day-index rules (rules), protocol
+workbook parsing (protocol), medium volume math (volumes), the per-batch
+calendar grid (calendar), the vectorised task schedule over a date range
+(schedule), daily workload / start-date ranking (workload), the reagent
+consumption forecast (reagents), the versioned protocol registry (registry),
+cell-count yield analytics (counts) and the styled .xlsx export (workbook).
+"""
+from core.calendar import day_index_grid, day_index_on, make_calendar, style_calendar
+from core.counts import batch_outcomes, batch_yields, counts_long, yield_summary, yield_trend
+from core.protocol import load_protocol, parse_conc
+from core.reagents import consumption_long, consumption_summary, forecast_consumption, forecast_groups
+from core.registry import CompiledProtocol, ProtocolRegistry, compile_version
+from core.rules import LAST_DAY, default_volume_ml, stage_for_day, task_weight
+from core.schedule import build_schedule, write_csv, write_ical
+from core.volumes import component_volume_ml, composition_volumes, format_volume
+from core.workbook import write_workbook
+from core.workload import daily_load, rank_start_dates, workload_profile
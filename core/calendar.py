@@ -0,0 +1,89 @@
+"""Per-batch day-index calendar over a window of dates, and its styling."""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# CSS of each style class, indexed by core.registry STYLE_NONE / STYLE_MEDIA / STYLE_MILESTONE
+STYLE_CSS = np.array(["", "background-color: #fff3b0", "background-color: #add8e6"], dtype=object)
+
+
+def make_calendar(df: pd.DataFrame, today: datetime.date, length: int = 22) -> pd.DataFrame:
+    """
+    Build a “heatmap” calendar DataFrame for each batch (rows) over the next `length` days starting today.
+    Columns are a MultiIndex [(year, month_abbr, 'weekday dd'), …].
+    Each cell’s value = day-index since start_date (0,1,2,…), or NaN if out of window.
+    """
+    dates = [today + timedelta(days=i) for i in range(length)]
+    cols = pd.MultiIndex.from_tuples(
+        [(str(d.year), d.strftime('%b'), d.strftime('%a %d')) for d in dates],
+        names=['Year','Month','Day']
+    )
+    df_sorted = df.sort_values('batch_id').reset_index(drop=True)
+    cal = pd.DataFrame(index=df_sorted.batch_id.astype(str), columns=cols)
+
+    for _, row in df_sorted.iterrows():
+        try:
+            start = pd.to_datetime(row.start_date).date()
+            end   = pd.to_datetime(row.end_date).date()
+        except:
+            continue
+        if pd.isna(row.end_date):
+            end = start + timedelta(days=length)
+        current = start
+        day_index = 0
+        while current <= end:
+            if current in dates:
+                key = (str(current.year), current.strftime('%b'), current.strftime('%a %d'))
+                cal.loc[str(row.batch_id), key] = day_index
+            current += timedelta(days=1)
+            day_index += 1
+
+    return cal
+
+
+def day_index_on(df: pd.DataFrame, on: datetime.date, length: int = 22) -> pd.Series:
+    """
+    Each batch's day index on the date `on` (nullable Int64, aligned with `df`): the
+    value make_calendar puts in that date's column. NA when the batch is not running
+    then, i.e. before its start or after its end date (start + `length` days if blank).
+    """
+    starts = pd.to_datetime(df["start_date"], errors="coerce")
+    ends = pd.to_datetime(df["end_date"], errors="coerce").fillna(starts + pd.Timedelta(days=length))
+    on = pd.Timestamp(on)
+    days = (on - starts).dt.days
+    running = starts.notna() & (starts <= on) & (on <= ends)
+    return days.where(running).astype("Int64")
+
+
+def day_index_grid(df: pd.DataFrame, dates, length: int = 22) -> np.ndarray:
+    """
+    (batches × dates) day indices as make_calendar fills them, as floats: NaN where a
+    batch is not running (before its start, after its end date or start + `length`
+    days if blank, or without a usable start date). Vectorised, for long date ranges.
+    """
+    starts = pd.to_datetime(df["start_date"], errors="coerce")
+    ends = pd.to_datetime(df["end_date"], errors="coerce").fillna(starts + pd.Timedelta(days=length))
+    starts = starts.to_numpy().astype("datetime64[D]")
+    ends = ends.to_numpy().astype("datetime64[D]")
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    days = (dates[None, :] - starts[:, None]).astype("int64").astype("float64")
+    running = ~np.isnat(starts)[:, None] & (dates[None, :] >= starts[:, None]) & (dates[None, :] <= ends[:, None])
+    return np.where(running, days, np.nan)
+
+
+def style_calendar(df: pd.DataFrame, today: datetime.date, styles=None, **kwargs):
+    """
+    Style rules:
+      • Red border on the first column (today’s date).
+      • Yellow shading on media change days, blue on milestone (replating / harvest) days.
+    `styles` holds the style class of every cell (same shape as `df`), looked up from
+    each batch's own protocol version (see ProtocolRegistry.lookup); no shading without it.
+    """
+    if styles is None:
+        css = np.full(df.shape, "", dtype=object)
+    else:
+        css = STYLE_CSS[np.asarray(styles, dtype=np.intp)]
+    if df.shape[1]:
+        css[:, 0] = [f"{c}; border: 3px solid red;" if c else "border: 3px solid red;" for c in css[:, 0]]
+    return pd.DataFrame(css, index=df.index, columns=df.columns)
@@ -0,0 +1,153 @@
+"""
+Cell counts in long, numeric form, and yield analytics across batches.
+
+The cell_counts sheet is wide and string-typed: one row per (user, batch,
+phase) with a text cell per plate column (A–C, 1–15). counts_long melts it
+once into one typed row per counted plate. A phase's yield is the sum over
+its plates. batch_yields turns that into one row per batch with its yield per
+phase and the Day 15 → Day 21 expansion ratio. yield_summary and yield_trend
+are plain group-bys over that table, so a lab-wide summary over years of
+batches costs one pass over a few thousand rows. batch_outcomes reduces it to
+how far each batch got, for the History view's outcome filter.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from core.rules import COUNT_COLUMNS, COUNT_PHASES
+
+KEY = ["username", "batch_id"]
+
+# Yield columns of batch_yields, one per phase
+YIELD_COLUMNS = {phase: f"{phase} cells" for phase in COUNT_PHASES}
+PLATE_COLUMNS = {phase: f"{phase} plates" for phase in COUNT_PHASES}
+EXPANSION = "expansion"
+
+# Metrics yield_summary / yield_trend can aggregate
+METRICS = [*YIELD_COLUMNS.values(), EXPANSION]
+
+# Outcome of a batch: the last phase it was counted at, latest first (see batch_outcomes)
+OUTCOMES = ["Banked", "Counted Day 21", "Counted Day 15", "Not counted"]
+
+_SEPARATORS = r"[,\s_]"
+_NUMBER = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+
+
+def _text(values) -> pa.Array:
+    """Values as one Arrow large_string array (zero-copy for the decoder's string columns)."""
+    return pa.array(pd.Series(values).astype("string")).cast(pa.large_string())
+
+
+def parse_counts(values) -> np.ndarray:
+    """
+    Cell numbers from count cells as floats: thousands separators and spaces are
+    ignored, "2.5e6" is understood, and blanks, text and negatives become NaN.
+    Parsed with Arrow kernels, without a Python call per cell.
+    """
+    text = values if isinstance(values, pa.Array) else _text(values)
+    text = pc.replace_substring_regex(text, _SEPARATORS, "")
+    numeric = pc.if_else(pc.match_substring_regex(text, _NUMBER), text, pa.scalar(None, text.type))
+    cells = pc.cast(numeric, pa.float64()).to_numpy(zero_copy_only=False, writable=True)
+    cells[~(cells >= 0)] = np.nan
+    return cells
+
+
+def plate_counts(values) -> np.ndarray:
+    """
+    Plate numbers from the info sheet's free-text plate count cells, as floats:
+    read like parse_counts, with anything but a whole number as NaN.
+    """
+    plates = parse_counts(values)
+    plates[plates != np.floor(plates)] = np.nan
+    return plates
+
+
+def counts_long(counts: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per counted plate of a decoded cell_counts frame: username, batch_id,
+    phase and plate (categoricals in sheet order) and cells (float). Empty and
+    unreadable cells are left out; when a (user, batch, phase) row repeats, the
+    first one wins, as in the app's lookups.
+    """
+    columns = [c for c in COUNT_COLUMNS if c in counts]
+    counts = counts[counts["phase"].isin(COUNT_PHASES)].drop_duplicates(KEY + ["phase"])
+    n = len(counts)
+    # Plate columns one after the other: cell i is row i % n of column i // n
+    stacked = pa.concat_arrays([_text(counts[c]) for c in columns]) if columns else pa.array([], pa.large_string())
+    # Most cells of the wide layout are empty: only the filled ones are parsed
+    filled = np.flatnonzero(pc.fill_null(pc.greater(pc.utf8_length(stacked), 0), False).to_numpy(zero_copy_only=False))
+    cells = parse_counts(stacked.take(pa.array(filled)))
+    keep = filled[~np.isnan(cells)]
+    rows = keep % max(n, 1)
+    users = pd.Categorical(counts["username"].astype(str))
+    phases = pd.Categorical(counts["phase"], categories=COUNT_PHASES, ordered=True)
+    return pd.DataFrame({
+        "username": users[rows],
+        "batch_id": pd.array(counts["batch_id"].to_numpy()[rows], dtype="Int64"),
+        "phase": phases[rows],
+        "plate": pd.Categorical.from_codes(keep // max(n, 1), categories=columns, ordered=True),
+        "cells": cells[~np.isnan(cells)],
+    })
+
+
+def batch_yields(long: pd.DataFrame, batches: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per batch with counts: its info columns from `batches` (first row per
+    batch wins; cell, start_date, ...), the month it started, cells and plates
+    counted per phase, and the expansion ratio (Day 21 cells / Day 15 cells).
+    """
+    grouped = long.groupby(KEY + ["phase"], observed=True)["cells"].agg(["sum", "count"])
+    # Each statistic unstacked on its own: an empty frame (nothing counted yet) keeps its columns
+    cells = grouped["sum"].unstack("phase").reindex(columns=COUNT_PHASES).rename(columns=YIELD_COLUMNS)
+    plates = grouped["count"].unstack("phase").reindex(columns=COUNT_PHASES).fillna(0).astype(int).rename(columns=PLATE_COLUMNS)
+    out = pd.concat([cells, plates], axis=1).reset_index()
+    out["username"] = out["username"].astype(str)
+
+    info = batches.drop_duplicates(KEY).assign(username=lambda d: d["username"].astype(str))
+    info = info[[c for c in info.columns if c not in out.columns or c in KEY]]
+    out = out.merge(info, on=KEY, how="left")
+    if "start_date" in out:
+        out["month"] = pd.to_datetime(out["start_date"]).dt.to_period("M")
+    day15, day21 = out[YIELD_COLUMNS[COUNT_PHASES[0]]], out[YIELD_COLUMNS[COUNT_PHASES[1]]]
+    out[EXPANSION] = (day21 / day15).where(day15 > 0)
+    return out
+
+
+def batch_outcomes(yields: pd.DataFrame) -> pd.DataFrame:
+    """
+    username, batch_id, outcome and expansion of each row of batch_yields. The
+    outcome is the latest phase with a counted plate (OUTCOMES); batches missing
+    from `yields` were never counted.
+    """
+    outcome = np.full(len(yields), OUTCOMES[-1], dtype=object)
+    # Earliest phase first, so a later phase overwrites it
+    for phase, name in zip(COUNT_PHASES, reversed(OUTCOMES[:-1])):
+        outcome[(yields[PLATE_COLUMNS[phase]] > 0).to_numpy()] = name
+    return pd.DataFrame({
+        "username": yields["username"].astype(str).to_numpy(),
+        "batch_id": pd.array(yields["batch_id"], dtype="Int64"),
+        "outcome": outcome,
+        "expansion": yields[EXPANSION].to_numpy(dtype="float64"),
+    })
+
+
+def yield_summary(yields: pd.DataFrame, by="cell") -> pd.DataFrame:
+    """Per group of `by`: batches, batches counted per phase, and the median of every metric."""
+    groups = yields.groupby(by, observed=True, dropna=False)
+    summary = groups.agg(batches=("batch_id", "size"), **{
+        f"{phase} n": (col, "count") for phase, col in YIELD_COLUMNS.items()
+    })
+    medians = groups[METRICS].median().add_prefix("median ")
+    return summary.join(medians).reset_index()
+
+
+def yield_trend(yields: pd.DataFrame, metric=EXPANSION, by="cell") -> pd.DataFrame:
+    """Median `metric` per start month (rows, every month in range) and group of `by` (columns)."""
+    trend = yields.dropna(subset=[metric, "month"]).pivot_table(
+        index="month", columns=by, values=metric, aggfunc="median", observed=True,
+    )
+    if trend.empty:
+        return trend
+    months = pd.period_range(trend.index.min(), trend.index.max(), freq="M")
+    return trend.reindex(months)
@@ -0,0 +1,72 @@
+"""Parsing of the protocol workbook (one row per day / task / component)."""
+import pandas as pd
+
+# Tasks whose rows list the components of a medium
+COMPOSITION_TASKS = ("Media Change", "Plate coating")
+
+
+def parse_conc(val):
+    """Parse a concentration string ("10 uM", "100X", "20 ug/mL") into a comparable float."""
+    if isinstance(val, str):
+        v = val.strip().lower().replace("μ","u")
+        if "nm" in v:
+            return float(v.replace("nm","")) * 1e-3
+        if "um" in v:
+            return float(v.replace("um",""))
+        if "mm" in v:
+            return float(v.replace("mm","")) * 1e3
+        if "ng/ml" in v:
+            return float(v.replace("ng/ml","")) * 1e-3
+        if "ug/ml" in v:
+            return float(v.replace("ug/ml",""))
+        if "x" in v:
+            return float(v.replace("x",""))
+    try:
+        return float(val)
+    except:
+        return None
+
+
+def compile_protocol(df_proto: pd.DataFrame) -> dict:
+    """
+    Turn protocol rows (day, task, component, percentage, stock_conc, working_conc)
+    into {day: [{"task", "composition"?}, ...]}. Missing percentages are derived
+    from working / stock concentration.
+    """
+    df_proto = df_proto.copy()
+    df_proto["percentage"] = pd.to_numeric(df_proto["percentage"], errors="coerce")
+    mask_pct = df_proto["percentage"].isna()
+
+    for idx in df_proto[mask_pct].index:
+        row = df_proto.loc[idx]
+        w = parse_conc(row["working_conc"])
+        s = parse_conc(row["stock_conc"])
+        if (w is not None) and s:
+            df_proto.at[idx, "percentage"] = (w / s) * 100
+
+    df_proto["day"] = df_proto["day"].astype(int)
+    mdap_protocol = {}
+    for day_val in sorted(df_proto["day"].dropna().unique()):
+        subset = df_proto[df_proto["day"] == day_val]
+        day_entries = []
+        for task_name in subset["task"].unique():
+            task_subset = subset[subset["task"] == task_name]
+            if any(t in task_name for t in COMPOSITION_TASKS):
+                comp_list = []
+                for _, r in task_subset.iterrows():
+                    comp_list.append({
+                        "component":    r["component"],
+                        "percentage":   r.get("percentage", ""),
+                        "stock_conc":   r.get("stock_conc", ""),
+                        "working_conc": r.get("working_conc", ""),
+                    })
+                day_entries.append({"task": task_name, "composition": comp_list})
+            else:
+                day_entries.append({"task": task_name})
+        mdap_protocol[int(day_val)] = day_entries
+    return mdap_protocol
+
+
+def load_protocol(path):
+    """Read and compile the protocol workbook at `path` (see compile_protocol)."""
+    return compile_protocol(pd.read_excel(path, engine="openpyxl"))
@@ -0,0 +1,142 @@
+"""
+Reagent consumption forecast: stock volume of every medium component needed
+per day over a planning horizon, for a set of batches.
+
+The protocol is compiled once into a (protocol days × components) matrix of
+stock fractions (mL of stock per mL of medium). Each batch's medium volume on
+each protocol day comes from its plate counts, or the default volumes when they
+are unknown. Those (batches × protocol days) volumes are folded onto a
+(dates × protocol days) grid with one bincount, and a single matrix product
+with the fraction matrix gives mL per date and component. The cost grows with
+batches × protocol days plus dates × components, however long the horizon.
+Batches on different protocol versions are forecast per version and added up
+(forecast_groups).
+"""
+import numpy as np
+import pandas as pd
+
+from core.counts import plate_counts
+from core.rules import ML_PER_PLATE, REPLATING_DAY, default_volume_ml
+
+
+def component_matrix(protocol):
+    """
+    (components, stocks, fractions) for a compiled protocol: component names in
+    first-use order, each one's stock concentration, and a (days × components)
+    array of stock mL per mL of medium. Components used by several tasks on the
+    same day add up; rows without a usable percentage are left out.
+    """
+    days = max(protocol, default=-1) + 1
+    components, stocks, cells = [], [], []
+    for day, entries in sorted(protocol.items()):
+        for entry in entries:
+            for item in entry.get("composition", []):
+                pct = pd.to_numeric(item.get("percentage"), errors="coerce")
+                if pd.isna(pct):
+                    continue
+                name = str(item["component"]).strip()
+                if name not in components:
+                    components.append(name)
+                    stock = item.get("stock_conc", "")
+                    stocks.append("" if pd.isna(stock) else str(stock))
+                cells.append((int(day), components.index(name), float(pct) / 100))
+    fractions = np.zeros((days, len(components)))
+    for day, k, frac in cells:
+        fractions[day, k] += frac
+    return components, stocks, fractions
+
+
+def _plates(batches, column):
+    if column not in batches:
+        return np.full(len(batches), np.nan)
+    return plate_counts(batches[column])
+
+
+def medium_volumes(batches: pd.DataFrame, n_days) -> np.ndarray:
+    """(batches × protocol days) total medium in mL, from plate counts or the default volumes."""
+    day = np.arange(n_days)
+    plates = np.where(
+        day[None, :] >= REPLATING_DAY,
+        _plates(batches, "replaced_plate_count")[:, None],
+        _plates(batches, "initial_plate_count")[:, None],
+    )
+    defaults = np.array([default_volume_ml(d) for d in day])
+    return np.where(np.isnan(plates), defaults[None, :], (plates + 1) * ML_PER_PLATE)
+
+
+def _days(values):
+    return pd.to_datetime(pd.Series(values), errors="coerce").to_numpy().astype("datetime64[D]")
+
+
+def forecast_consumption(batches: pd.DataFrame, protocol, start, end) -> pd.DataFrame:
+    """
+    Stock mL of every component needed on each date from `start` to `end`
+    (inclusive) by `batches` (start_date, optional end_date and plate counts).
+    Rows are dates, columns components; tasks after a batch's end date are left out.
+    """
+    components, _, fractions = component_matrix(protocol)
+    first = np.datetime64(start, "D")
+    n_dates = max(int((np.datetime64(end, "D") - first).astype(int)) + 1, 0)
+    n_days = fractions.shape[0]
+    index = pd.date_range(pd.Timestamp(first), periods=n_dates, freq="D")
+    if not len(batches) or not n_days or not n_dates:
+        return pd.DataFrame(0.0, index=index, columns=components)
+
+    starts = _days(batches["start_date"])
+    ends = _days(batches["end_date"]) if "end_date" in batches else np.full(len(starts), np.datetime64("NaT"), "datetime64[D]")
+    # batches × protocol days: date of each day's medium, as a position on the horizon
+    due = starts[:, None] + np.arange(n_days)[None, :].astype("timedelta64[D]")
+    pos = (due - first).astype("int64")
+    keep = ~np.isnat(due) & (pos >= 0) & (pos < n_dates)
+    keep &= np.isnat(ends)[:, None] | (due <= ends[:, None])
+    day_idx = np.broadcast_to(np.arange(n_days), due.shape)
+    volumes = medium_volumes(batches, n_days)
+
+    # dates × protocol days: medium made on each date for each protocol day
+    grid = np.bincount(
+        pos[keep] * n_days + day_idx[keep], weights=volumes[keep], minlength=n_dates * n_days,
+    ).reshape(n_dates, n_days)
+    return pd.DataFrame(grid @ fractions, index=index, columns=components)
+
+
+def forecast_groups(groups, start, end) -> pd.DataFrame:
+    """
+    forecast_consumption summed over (protocol, batches) pairs, e.g. one per
+    protocol version; a component used by several versions adds up.
+    """
+    frames = [forecast_consumption(batches, protocol, start, end) for protocol, batches in groups]
+    if not frames:
+        return forecast_consumption(pd.DataFrame(columns=["start_date"]), {}, start, end)
+    daily = frames[0]
+    for frame in frames[1:]:
+        daily = daily.add(frame, fill_value=0.0)
+    # add() sorts the columns; keep the first-use order of the protocols instead
+    return daily[list(dict.fromkeys(c for frame in frames for c in frame.columns))]
+
+
+def consumption_summary(daily: pd.DataFrame, *protocols) -> pd.DataFrame:
+    """
+    One row per component: stock concentration (from the first of `protocols`
+    using it), total mL over the horizon and its busiest date.
+    """
+    stock_of = {}
+    for protocol in protocols:
+        components, stocks, _ = component_matrix(protocol)
+        for component, stock in zip(components, stocks):
+            stock_of.setdefault(component, stock)
+    used = daily.loc[:, daily.sum() > 0]
+    return pd.DataFrame({
+        "component": used.columns,
+        "stock_conc": [stock_of.get(c, "") for c in used.columns],
+        "total_ml": used.sum().to_numpy(),
+        "peak_date": used.idxmax().to_numpy() if not used.empty else [],
+        "peak_ml": used.max().to_numpy(),
+    })
+
+
+def consumption_long(daily: pd.DataFrame) -> pd.DataFrame:
+    """date / component / ml / cumulative_ml rows, for export. Dates a component is not used on are left out."""
+    long = daily.stack().rename("ml").to_frame()
+    long["cumulative_ml"] = daily.cumsum().stack()
+    long.index.names = ["date", "component"]
+    return long[long["ml"] > 0].reset_index()
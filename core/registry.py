@@ -0,0 +1,227 @@
+"""
+Protocol versions, each compiled once into dense day-indexed lookup tables.
+
+The default version is the original workbook; variants are further workbooks
+in a directory (protocols/<version>.xlsx). A batch names its version in the
+`protocol` column of the info sheet, blank meaning the default.
+
+Compiling a version turns its rows into one array per field, indexed by
+protocol day: task names, stage, calendar style class, workload weight and the
+composition entries. The registry also stacks each field over all versions
+into a (versions × days) table, so looking up a whole calendar's worth of
+(batch, day) cells is one fancy-indexing step whatever the number of versions.
+A workbook is recompiled when its modification time changes.
+"""
+import os
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from core.protocol import compile_protocol
+from core.rules import stage_for_day
+from core.schedule import task_table
+from core.workload import workload_profile
+
+PROTOCOL_DIR = "protocols"
+
+NO_TASK = "No task"
+
+# Calendar style classes (see core.calendar.STYLE_CSS)
+STYLE_NONE, STYLE_MEDIA, STYLE_MILESTONE = 0, 1, 2
+
+# Days with one of these tasks are shaded as milestones (counting, replating, harvest);
+# other media change days after Day 0 as media changes
+MILESTONE_TASKS = ("replating", "harvest", "banking")
+
+# Value of each field for days outside a protocol and for unknown versions
+FILL = {"task": NO_TASK, "stage": "Unknown", "style": STYLE_NONE, "weight": 0.0, "entries": ()}
+
+
+def _style(day, tasks):
+    names = [t.lower() for t in tasks]
+    if any(k in n for n in names for k in MILESTONE_TASKS):
+        return STYLE_MILESTONE
+    if day > 0 and any("media change" in n for n in names):
+        return STYLE_MEDIA
+    return STYLE_NONE
+
+
+def _stages(df_proto, length):
+    """Stage per day from the workbook's optional `stage` column, else from rules.STAGES."""
+    stages = [stage_for_day(day) for day in range(length)]
+    if "stage" in df_proto:
+        named = df_proto.dropna(subset=["stage"])
+        for day, stage in zip(named["day"].astype(int), named["stage"].astype(str).str.strip()):
+            if stage and 0 <= day < length:
+                stages[day] = stage
+    return stages
+
+
+@dataclass(frozen=True)
+class CompiledProtocol:
+    """One protocol version: {day: entries} as from core.protocol, plus one array per field indexed by day."""
+    version: str
+    days: dict
+    task: np.ndarray
+    stage: np.ndarray
+    style: np.ndarray
+    weight: np.ndarray
+    entries: np.ndarray
+
+    @property
+    def length(self):
+        return len(self.task)
+
+    def on(self, field, day):
+        """Value of `field` on protocol day `day` (FILL outside the protocol)."""
+        values = getattr(self, field)
+        return values[day] if 0 <= day < len(values) else FILL[field]
+
+    def tasks(self):
+        """core.schedule.task_table of this version, with its own stages."""
+        return task_table(self.days, stage=lambda day: self.on("stage", day))
+
+
+def compile_version(version, df_proto: pd.DataFrame) -> CompiledProtocol:
+    """Compile the rows of one protocol workbook into a CompiledProtocol."""
+    days = compile_protocol(df_proto)
+    length = max(days, default=-1) + 1
+    task = np.full(length, NO_TASK, dtype=object)
+    style = np.zeros(length, dtype=np.int8)
+    entries = np.empty(length, dtype=object)
+    entries.fill(())
+    for day, day_entries in days.items():
+        names = [e.get("task", "") for e in day_entries]
+        task[day] = " / ".join(names) or NO_TASK
+        style[day] = _style(day, names)
+        entries[day] = tuple(day_entries)
+    weight = np.zeros(length)
+    profile = workload_profile(days)
+    weight[:len(profile)] = profile
+    return CompiledProtocol(
+        version=version, days=days, task=task,
+        stage=np.array(_stages(df_proto, length), dtype=object),
+        style=style, weight=weight, entries=entries,
+    )
+
+
+class ProtocolRegistry:
+    """
+    The default workbook plus every workbook in `directory`, compiled on first
+    use. Versions are named after their file (without .xlsx). Thread-safe.
+    """
+
+    def __init__(self, default_path, directory=PROTOCOL_DIR):
+        self.default_path = default_path
+        self.directory = directory
+        self.default = os.path.splitext(os.path.basename(default_path))[0]
+        self._lock = threading.Lock()
+        self._compiled = {}   # version -> (mtime, CompiledProtocol)
+        self._stacked = {}    # field -> (signature, version rows, table); row 0 is the FILL row
+
+    def paths(self):
+        """{version: workbook path}, the default version first."""
+        found = {self.default: self.default_path}
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext.lower() == ".xlsx" and not name.startswith("~$"):
+                found.setdefault(stem, os.path.join(self.directory, name))
+        return found
+
+    def versions(self):
+        return list(self.paths())
+
+    def resolve(self, version):
+        """Version name for a batch's `protocol` cell: blank means the default."""
+        if version is None or (not isinstance(version, str) and pd.isna(version)):
+            return self.default
+        return str(version).strip() or self.default
+
+    def get(self, version=None) -> CompiledProtocol:
+        """The compiled `version` (the default if blank). KeyError if there is no such workbook."""
+        version = self.resolve(version)
+        path = self.paths().get(version)
+        if path is None:
+            raise KeyError(version)
+        return self._compile(version, path)[1]
+
+    def _compile(self, version, path):
+        """(mtime, CompiledProtocol) of the workbook at `path`, compiled again only when it changed."""
+        # FileNotFoundError when the workbook is gone, like core.protocol.load_protocol
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._compiled.get(version)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, compile_version(version, pd.read_excel(path, engine="openpyxl")))
+                self._compiled[version] = cached
+            return cached
+
+    def missing(self, versions):
+        """Names among `versions` (batch `protocol` cells) with no workbook, sorted."""
+        known = set(self.paths())
+        return sorted({self.resolve(v) for v in versions} - known)
+
+    def versions_of(self, batches: pd.DataFrame, column="protocol") -> np.ndarray:
+        """The version name of every row of `batches` (all the default when there is no `column`)."""
+        if column not in batches:
+            return np.full(len(batches), self.default, dtype=object)
+        return np.array([self.resolve(v) for v in batches[column]], dtype=object)
+
+    def groups(self, batches: pd.DataFrame, column="protocol"):
+        """(CompiledProtocol, its rows of `batches`) for every known version the batches use."""
+        names = self.versions_of(batches, column)
+        known = self.paths()
+        for version in dict.fromkeys(names):
+            if version in known:
+                yield self.get(version), batches[names == version]
+
+    # ---------------------- STACKED LOOKUP ----------------------
+
+    def _table(self, field):
+        """(version -> row, (1 + versions) × days table of `field`), rebuilt when a workbook changes."""
+        stamped = [(v, *self._compile(v, path)) for v, path in self.paths().items()]
+        signature = tuple((v, mtime) for v, mtime, _ in stamped)
+        compiled = [c for _, _, c in stamped]
+        with self._lock:
+            cached = self._stacked.get(field)
+            if cached is not None and cached[0] == signature:
+                return cached[1], cached[2]
+        width = max((c.length for c in compiled), default=0)
+        sample = getattr(compiled[0], field) if compiled else np.empty(0, dtype=object)
+        table = np.empty((len(compiled) + 1, width), dtype=sample.dtype)
+        table.fill(FILL[field])
+        rows = {}
+        for row, c in enumerate(compiled, 1):
+            table[row, :c.length] = getattr(c, field)
+            rows[c.version] = row
+        with self._lock:
+            self._stacked[field] = (signature, rows, table)
+        return rows, table
+
+    def rows(self, field, versions) -> np.ndarray:
+        """The per-day `field` array of each batch's version, as (batches × days) table rows."""
+        index, table = self._table(field)
+        return table[[index.get(self.resolve(v), 0) for v in versions]]
+
+    def lookup(self, field, versions, days) -> np.ndarray:
+        """
+        `field` (task, stage, style or weight) on protocol day `days` for batches
+        following `versions`. `days` is one day per batch, or a (batches × dates)
+        grid; NaN, days outside a protocol and unknown versions give FILL[field].
+        """
+        index, table = self._table(field)
+        codes = np.array([index.get(self.resolve(v), 0) for v in versions], dtype=np.intp)
+        days = np.asarray(days, dtype="float64")
+        if days.ndim == 2:
+            codes = codes[:, None]
+        valid = ~np.isnan(days) & (days >= 0) & (days < table.shape[1])
+        idx = np.where(valid, days, 0).astype(np.intp)
+        if not table.shape[1]:
+            return np.full(days.shape, FILL[field], dtype=table.dtype)
+        return np.where(valid, table[codes, idx], FILL[field])
@@ -0,0 +1,55 @@
+"""Day-index rules of the differentiation protocol (day 0 = start date)."""
+
+LAST_DAY = 21
+
+# Plate columns and counting phases of the cell_counts sheet (see core.counts)
+COUNT_COLUMNS = ["A", "B", "C"] + [str(i) for i in range(1, 16)]
+COUNT_PHASES = ["Day 15", "Day 21", "Banking"]
+
+# Stages of a protocol workbook without a `stage` column (see core.registry)
+STAGES = [
+    (0, 5, "FP induction"),
+    (6, 11, "NP induction"),
+    (12, 21, "mDAN induction"),
+]
+
+
+def stage_for_day(day):
+    """Stage name for a day index, "Unknown" outside Day 0–21."""
+    for first, last, name in STAGES:
+        if first <= day <= last:
+            return name
+    return "Unknown"
+
+
+def default_volume_ml(day):
+    """Default total medium volume: 15 mL up to Day 14, 40 mL after replating."""
+    return 15.0 if day <= 14 else 40.0
+
+
+# Medium for a batch with known plate counts: (plates + 1) × ML_PER_PLATE, the
+# extra plate's worth covering dead volume. Initial plates count before
+# REPLATING_DAY, replaced plates from then on (see core.reagents).
+ML_PER_PLATE = 4.0
+REPLATING_DAY = 15
+
+
+# Rough hands-on effort of a task, relative to a media change; the first
+# keyword found in the task name wins, anything unmatched counts as 1
+TASK_WEIGHTS = [
+    ("replating", 3.0),
+    ("harvest", 3.0),
+    ("banking", 3.0),
+    ("coating", 1.0),
+    ("media change", 1.0),
+    ("observation", 0.25),
+]
+
+
+def task_weight(task):
+    """Workload weight of a protocol task, from its name (see TASK_WEIGHTS)."""
+    name = str(task).lower()
+    for keyword, weight in TASK_WEIGHTS:
+        if keyword in name:
+            return weight
+    return 1.0
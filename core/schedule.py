@@ -0,0 +1,180 @@
+"""
+Every protocol task of every batch over a date range, as one flat table.
+
+The protocol is first flattened into a task table (one row per day / task,
+with its stage and component volumes worked out once). Due dates for all
+batches × tasks are then a single NumPy broadcast of start dates against task
+days, so the cost depends on the number of batches, not on the length of the
+date range.
+"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from core.rules import default_volume_ml, stage_for_day
+from core.volumes import composition_volumes
+
+SCHEDULE_COLUMNS = ["date", "username", "batch_id", "cell", "day", "stage", "task_no", "task", "components"]
+TASK_COLUMNS = ["day", "task_no", "task", "stage", "components"]
+
+
+def task_table(protocol, volume_ml=default_volume_ml, stage=stage_for_day) -> pd.DataFrame:
+    """
+    One row per (day, task) of a compiled protocol (see core.protocol). `components`
+    lists each component with its volume for the day's default total volume;
+    `stage` names the stage of a day (a version's own, see core.registry).
+    """
+    rows = []
+    for day, entries in sorted(protocol.items()):
+        for n, entry in enumerate(entries, 1):
+            comps = composition_volumes(entry, volume_ml(day))
+            rows.append({
+                "day": int(day),
+                "task_no": n,
+                "task": entry.get("task", ""),
+                "stage": stage(day),
+                "components": "; ".join(f"{c['Component']} {c['Volume']}".strip() for c in comps),
+            })
+    return pd.DataFrame(rows, columns=TASK_COLUMNS)
+
+
+def _as_days(values):
+    return pd.to_datetime(pd.Series(values), errors="coerce").to_numpy().astype("datetime64[D]")
+
+
+def build_schedule(batches: pd.DataFrame, protocol, start, end, tasks=None) -> pd.DataFrame:
+    """
+    Tasks due from `start` to `end` (inclusive dates) for every batch, sorted by date.
+    `batches` needs batch_id and start_date; tasks after a batch's end_date are left
+    out, and username / cell are carried through when present. Rows without a
+    usable start date are skipped.
+    """
+    tasks = task_table(protocol) if tasks is None else tasks
+    if batches.empty or tasks.empty:
+        return pd.DataFrame(columns=SCHEDULE_COLUMNS)
+
+    n = len(batches)
+    starts = _as_days(batches["start_date"])
+    ends = _as_days(batches["end_date"]) if "end_date" in batches else np.full(n, np.datetime64("NaT"), "datetime64[D]")
+    task_days = tasks["day"].to_numpy(dtype="int64")
+
+    # batches × tasks grid of due dates; NaT never compares true, so missing starts drop out
+    due = starts[:, None] + task_days[None, :].astype("timedelta64[D]")
+    mask = (due >= np.datetime64(start, "D")) & (due <= np.datetime64(end, "D"))
+    mask &= np.isnat(ends)[:, None] | (due <= ends[:, None])
+    b, t = np.nonzero(mask)
+
+    def batch_col(name):
+        if name not in batches:
+            return np.full(len(b), "", dtype=object)
+        return batches[name].astype(object).where(batches[name].notna(), "").to_numpy()[b]
+
+    out = pd.DataFrame({
+        "date": due[b, t],
+        "username": batch_col("username"),
+        "batch_id": batches["batch_id"].to_numpy()[b],
+        "cell": batch_col("cell"),
+        **{col: tasks[col].to_numpy()[t] for col in TASK_COLUMNS},
+    }, columns=SCHEDULE_COLUMNS)
+    return out.sort_values(["date", "username", "batch_id", "task_no"], kind="stable").reset_index(drop=True)
+
+
+# ---------------------- WRITERS ----------------------
+
+def _csv_field(value):
+    text = str(value)
+    if any(c in text for c in ',"\r\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def write_csv(schedule: pd.DataFrame, f):
+    """
+    Write the schedule as CSV with ISO dates. The day / stage / task / components
+    part of a row repeats for every batch on the same task, so each distinct one
+    is quoted once.
+    """
+    dates = np.datetime_as_string(schedule["date"].to_numpy().astype("datetime64[D]"), unit="D").tolist()
+    fields = {}
+
+    def field(value):
+        if value not in fields:
+            fields[value] = _csv_field(value)
+        return fields[value]
+
+    task_cols = ["day", "stage", "task_no", "task", "components"]
+    tails = {}
+    out = [",".join(SCHEDULE_COLUMNS) + "\n"]
+    cols = [schedule[c].tolist() for c in ["username", "batch_id", "cell"] + task_cols]
+    for date, (user, bid, cell, *task) in zip(dates, zip(*cols)):
+        # Keyed on the values themselves: protocol versions can share a (day, task_no)
+        key = tuple(task)
+        if key not in tails:
+            tails[key] = ",".join(_csv_field(v) for v in task)
+        out.append(f"{date},{field(user)},{bid},{field(cell)},{tails[key]}\n")
+    f.write("".join(out))
+
+
+def _ical_text(value):
+    """Escape a TEXT value (RFC 5545 §3.3.11)."""
+    return (str(value).replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def _fold(line):
+    """Fold a content line to at most 75 octets per physical line (RFC 5545 §3.1)."""
+    if len(line) <= 75 and line.isascii():
+        return line
+    parts, current, size = [], "", 0
+    limit = 75
+    for ch in line:
+        width = len(ch.encode("utf-8"))
+        if size + width > limit:
+            parts.append(current)
+            current, size, limit = "", 0, 74  # continuation lines start with a space
+        current += ch
+        size += width
+    parts.append(current)
+    return "\r\n ".join(parts)
+
+
+def write_ical(schedule: pd.DataFrame, f, name="DAN schedule"):
+    """
+    Write the schedule as an iCalendar file: one all-day event per task, with the
+    stage and component volumes in the description. UIDs are stable across
+    exports, so calendar clients update events instead of duplicating them.
+    """
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    # Date lines, summaries and descriptions repeat a lot: build each distinct one once
+    dates = schedule["date"].to_numpy().astype("datetime64[D]")
+    uniq, inverse = np.unique(dates, return_inverse=True)
+    date_lines = [
+        f"DTSTAMP:{stamp}\r\nDTSTART;VALUE=DATE:{d:%Y%m%d}\r\nDTEND;VALUE=DATE:{d + timedelta(days=1):%Y%m%d}\r\n"
+        for d in uniq.astype(object)
+    ]
+    task_blocks = {}
+
+    def task_block(day, task_no, task, stage, components):
+        key = (day, task_no, task, stage, components)
+        if key not in task_blocks:
+            desc = stage + (f"\n{components.replace('; ', chr(10))}" if components else "")
+            task_blocks[key] = (
+                f"D{day}): {_ical_text(task)}",
+                f"{_fold(f'DESCRIPTION:{_ical_text(desc)}')}\r\nTRANSP:TRANSPARENT\r\nEND:VEVENT\r\n",
+            )
+        return task_blocks[key]
+
+    out = [
+        "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//DAN scheduler//EN\r\n"
+        f"CALSCALE:GREGORIAN\r\n{_fold('X-WR-CALNAME:' + _ical_text(name))}\r\n"
+    ]
+    cols = [schedule[c].tolist() for c in ("username", "batch_id", "day", "task_no", "task", "stage", "components")]
+    for di, (user, bid, day, task_no, task, stage, components) in zip(inverse.tolist(), zip(*cols)):
+        summary_tail, tail = task_block(day, task_no, task, stage, components)
+        out.append(
+            f"BEGIN:VEVENT\r\nUID:{user}-{bid}-D{day}-{task_no}@dan-scheduler\r\n{date_lines[di]}"
+            f"{_fold(f'SUMMARY:Batch {bid} ({summary_tail}')}\r\n{tail}"
+        )
+    out.append("END:VCALENDAR\r\n")
+    f.write("".join(out))
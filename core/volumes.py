@@ -0,0 +1,46 @@
+"""Component volumes for a medium of a given total volume."""
+import pandas as pd
+
+from core.protocol import parse_conc
+
+
+def _present(val):
+    return val is not None and not (isinstance(val, str) and not val) and not pd.isna(val)
+
+
+def component_volume_ml(total_ml, percentage=None, stock_conc="", working_conc=""):
+    """
+    Volume of one component in mL, from its percentage of the medium or else from
+    its stock / working concentrations. None when neither is usable.
+    """
+    if _present(percentage):
+        return total_ml * float(percentage) / 100
+    if _present(stock_conc) and _present(working_conc):
+        stock_val = parse_conc(stock_conc)
+        work_val  = parse_conc(working_conc)
+        if stock_val and work_val:
+            return work_val * total_ml / stock_val
+    return None
+
+
+def format_volume(ml):
+    """"250 µL" below 1 mL, "12.57 mL" otherwise, "" when unknown."""
+    if ml is None:
+        return ""
+    if ml < 1:
+        return f"{int(round(ml * 1000))} µL"
+    return f"{round(ml, 2)} mL"
+
+
+def composition_volumes(entry, total_ml):
+    """[{"Component", "Volume"}] for a protocol task entry (see core.protocol)."""
+    rows = []
+    for item in entry.get("composition", []):
+        ml = component_volume_ml(
+            total_ml,
+            item.get("percentage", None),
+            item.get("stock_conc", ""),
+            item.get("working_conc", ""),
+        )
+        rows.append({"Component": item["component"], "Volume": format_volume(ml)})
+    return rows
@@ -0,0 +1,172 @@
+"""
+Styled .xlsx export of the differentiation calendar and the task plans.
+
+`write_workbook` writes three sheets for a set of batches over a date range:
+
+  • Calendar: one row per batch and one column per date, holding the day
+    index, shaded like the app's calendar (core.calendar.style_calendar):
+    yellow media change days, blue milestones, a red border on today.
+  • Tasks: every task due, date by date (as core.schedule.build_schedule).
+  • Compositions: per date, each protocol task with the batches doing it and
+    its component volumes for the day's default medium volume.
+
+The workbook is written with openpyxl in write-only mode, which streams rows
+to disk as they are appended. The calendar is computed a block of batches at a
+time and the schedule a month at a time, so memory stays flat for year-long
+exports of hundreds of batches. openpyxl is only imported when a workbook is
+written.
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from core.calendar import day_index_grid
+from core.registry import STYLE_MEDIA, STYLE_MILESTONE
+from core.rules import default_volume_ml
+from core.schedule import SCHEDULE_COLUMNS, build_schedule
+from core.volumes import composition_volumes
+
+# Same colours as core.calendar.STYLE_CSS
+FILL_COLORS = {STYLE_MEDIA: "FFF3B0", STYLE_MILESTONE: "ADD8E6"}
+TODAY_COLOR = "FF0000"
+
+TASK_SHEET_COLUMNS = SCHEDULE_COLUMNS[:4] + ["protocol"] + SCHEDULE_COLUMNS[4:]
+COMPOSITION_COLUMNS = ["date", "protocol", "day", "task_no", "task", "batches", "total_ml", "component", "volume"]
+
+# Batches per block of calendar rows, days per block of schedule rows
+CALENDAR_BLOCK_ROWS = 256
+SCHEDULE_BLOCK_DAYS = 31
+
+
+def _calendar_header(dates):
+    """The three header rows of make_calendar's columns (Year, Month, Day), after the batch columns."""
+    lead = [["", "", ""], ["", "", ""], ["Batch", "Cell", "Protocol"]]
+    years = [str(d.year) for d in dates]
+    months = [d.strftime("%b") for d in dates]
+    days = [d.strftime("%a %d") for d in dates]
+    return [lead[0] + years, lead[1] + months, lead[2] + days]
+
+
+def _calendar_rows(batches, registry, dates, length):
+    """Calendar rows a block of batches at a time: (batch_id, cell, version, day indices, style classes)."""
+    ordered = batches.sort_values("batch_id", kind="stable").reset_index(drop=True)
+    versions = registry.versions_of(ordered)
+    cells = ordered["cell"].astype(object).where(ordered["cell"].notna(), "") if "cell" in ordered else None
+    for first in range(0, len(ordered), CALENDAR_BLOCK_ROWS):
+        block = ordered.iloc[first:first + CALENDAR_BLOCK_ROWS]
+        block_versions = versions[first:first + CALENDAR_BLOCK_ROWS]
+        days = day_index_grid(block, dates, length)
+        styles = registry.lookup("style", block_versions, days)
+        ids = block["batch_id"].tolist()
+        names = cells.iloc[first:first + CALENDAR_BLOCK_ROWS].tolist() if cells is not None else [""] * len(block)
+        for i, (bid, cell, version) in enumerate(zip(ids, names, block_versions)):
+            yield bid, cell, version, days[i], styles[i]
+
+
+def _schedule_blocks(batches, registry, start, end):
+    """Tasks due from `start` to `end` with their protocol version, one date-sorted frame per block of days."""
+    groups = list(registry.groups(batches))
+    tasks = {protocol.version: protocol.tasks() for protocol, _ in groups}
+    first = start
+    while first <= end:
+        last = min(first + timedelta(days=SCHEDULE_BLOCK_DAYS - 1), end)
+        parts = [build_schedule(group, protocol.days, first, last, tasks[protocol.version]).assign(protocol=protocol.version)
+                 for protocol, group in groups]
+        parts = [p for p in parts if not p.empty]
+        if parts:
+            block = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+            yield block.sort_values(["date", "username", "batch_id", "task_no"], kind="stable")
+        first = last + timedelta(days=1)
+
+
+def _compositions(block, registry, cache):
+    """Composition rows of one schedule block: per date and protocol task, its batches and component volumes."""
+    grouped = block.groupby(["date", "protocol", "day", "task_no"], sort=True, observed=True)
+    for (date, version, day, task_no), rows in grouped:
+        key = (version, int(day), int(task_no))
+        if key not in cache:
+            entries = registry.get(version).on("entries", int(day))
+            entry = entries[int(task_no) - 1] if int(task_no) <= len(entries) else {}
+            total = default_volume_ml(int(day))
+            cache[key] = (entry.get("task", ""), total, composition_volumes(entry, total))
+        task, total, components = cache[key]
+        batches = ", ".join(str(b) for b in rows["batch_id"])
+        for comp in components:
+            yield [date, version, int(day), int(task_no), task, batches, total, comp["Component"], comp["Volume"]]
+
+
+def write_workbook(f, batches: pd.DataFrame, registry, start, end, today=None, length=22):
+    """
+    Write the Calendar, Tasks and Compositions sheets for `batches` (info rows:
+    batch_id, start_date, optional end_date, cell, username, protocol) from
+    `start` to `end` (inclusive dates) to `f`, a path or binary file object.
+    `today`'s column gets the red border when it is in range. Batches on
+    unknown protocol versions have day indices but no tasks or shading; rows
+    without a batch id are left out.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Border, Font, PatternFill, Side
+    from openpyxl.utils import get_column_letter
+
+    # Rows without a batch id cannot be told apart in any of the sheets
+    ids = pd.to_numeric(batches["batch_id"], errors="coerce")
+    batches = batches[ids.notna()].assign(batch_id=ids[ids.notna()].astype("int64"))
+    dates = pd.date_range(pd.Timestamp(start), pd.Timestamp(end), freq="D").date
+    today_col = next((i for i, d in enumerate(dates) if d == today), None)
+    wb = Workbook(write_only=True)
+    cal_ws = wb.create_sheet("Calendar")
+    task_ws = wb.create_sheet("Tasks")
+    comp_ws = wb.create_sheet("Compositions")
+
+    # Style objects are made once; openpyxl shares identical styles between cells anyway
+    bold = Font(bold=True)
+    fills = {style: PatternFill("solid", start_color=color, end_color=color) for style, color in FILL_COLORS.items()}
+    red = Side(style="thick", color=TODAY_COLOR)
+    today_border = Border(left=red, right=red, top=red, bottom=red)
+
+    def cell(ws, value, style=0, today_column=False, font=None):
+        c = WriteOnlyCell(ws, value=value)
+        if style in fills:
+            c.fill = fills[style]
+        if today_column:
+            c.border = today_border
+        if font is not None:
+            c.font = font
+        return c
+
+    # ---------------------- CALENDAR ----------------------
+    cal_ws.freeze_panes = "D4"
+    cal_ws.column_dimensions["A"].width = 8
+    cal_ws.column_dimensions["B"].width = 14
+    cal_ws.column_dimensions["C"].width = 22
+    for i in range(len(dates)):
+        cal_ws.column_dimensions[get_column_letter(4 + i)].width = 7
+    for header in _calendar_header(dates):
+        cal_ws.append([cell(cal_ws, v, font=bold, today_column=(i - 3 == today_col)) for i, v in enumerate(header)])
+    for bid, name, version, days, styles in _calendar_rows(batches, registry, dates, length):
+        row = [bid, name, version]
+        for i, (day, style) in enumerate(zip(days.tolist(), styles.tolist())):
+            value = None if day != day else int(day)
+            if style in fills or i == today_col:
+                row.append(cell(cal_ws, value, style, i == today_col))
+            else:
+                row.append(value)
+        cal_ws.append(row)
+
+    # ---------------------- TASKS & COMPOSITIONS ----------------------
+    for ws, columns in ((task_ws, TASK_SHEET_COLUMNS), (comp_ws, COMPOSITION_COLUMNS)):
+        ws.freeze_panes = "A2"
+        ws.append([cell(ws, c, font=bold) for c in columns])
+    cache = {}
+    for block in _schedule_blocks(batches, registry, start, end):
+        # datetime.date values get openpyxl's yyyy-mm-dd format without a styled cell
+        block = block.assign(date=pd.to_datetime(block["date"]).dt.date)
+        for row in zip(*(block[c].tolist() for c in TASK_SHEET_COLUMNS)):
+            task_ws.append(row)
+        for row in _compositions(block, registry, cache):
+            comp_ws.append(row)
+
+    wb.save(f)
+    return f
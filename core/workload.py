@@ -0,0 +1,102 @@
+"""
+Lab workload per day, and the start dates that spread it best.
+
+A batch's workload is the fixed profile of its protocol version (weight per
+protocol day, see rules.task_weight) shifted to its start date. The existing load is a (batches × protocol days) grid of dates
+folded onto a date axis with one bincount; every candidate start date is then
+scored at once by gathering a (candidates × protocol days) window of that
+axis. Nothing loops over dates or batches in Python.
+"""
+import numpy as np
+import pandas as pd
+
+from core.rules import task_weight
+from core.schedule import task_table
+
+# Score = overlap + PEAK_WEIGHT * peak day load + weekend_weight * weekend work
+PEAK_WEIGHT = 2.0
+WEEKEND_WEIGHT = 1.0
+
+
+def workload_profile(protocol, weight=task_weight) -> np.ndarray:
+    """Total task weight of each protocol day (index = day) for a compiled protocol."""
+    tasks = task_table(protocol)
+    if tasks.empty:
+        return np.zeros(0)
+    weights = tasks["task"].map(weight).to_numpy(dtype="float64")
+    return np.bincount(tasks["day"].to_numpy(dtype="int64"), weights=weights)
+
+
+def _days(values):
+    return pd.to_datetime(pd.Series(values), errors="coerce").to_numpy().astype("datetime64[D]")
+
+
+def daily_load(batches: pd.DataFrame, profile, first, last) -> pd.Series:
+    """
+    Workload of `batches` on every date from `first` to `last`. `profile` is one
+    profile for all batches, or a (batches × days) array with each batch's own
+    (see ProtocolRegistry.rows). Tasks after a batch's end_date are left out;
+    rows without a start date add nothing.
+    """
+    profile = np.asarray(profile, dtype="float64")
+    first, last = np.datetime64(first, "D"), np.datetime64(last, "D")
+    n_dates = int((last - first).astype(int)) + 1
+    load = np.zeros(max(n_dates, 0))
+    if len(batches) and profile.shape[-1] and n_dates > 0:
+        starts = _days(batches["start_date"])
+        ends = _days(batches["end_date"]) if "end_date" in batches else np.full(len(starts), np.datetime64("NaT"), "datetime64[D]")
+        offsets = np.arange(profile.shape[-1])
+        # batches × protocol days grid of dates, as positions on the date axis
+        due = starts[:, None] + offsets[None, :].astype("timedelta64[D]")
+        pos = (due - first).astype("int64")
+        keep = ~np.isnat(due) & (pos >= 0) & (pos < n_dates)
+        keep &= np.isnat(ends)[:, None] | (due <= ends[:, None])
+        weights = np.broadcast_to(profile, due.shape)
+        load = np.bincount(pos[keep], weights=weights[keep], minlength=n_dates)
+    return pd.Series(load, index=pd.date_range(first, periods=max(n_dates, 0), freq="D"))
+
+
+def rank_start_dates(batches: pd.DataFrame, profile, first, last,
+                     peak_weight=PEAK_WEIGHT, weekend_weight=WEEKEND_WEIGHT, batch_profiles=None) -> pd.DataFrame:
+    """
+    Score every start date from `first` to `last` (inclusive) for one new batch
+    against the load of `batches`, lowest score first. Columns: start_date, score,
+    peak_load and peak_date (the new batch's busiest day including existing work),
+    overlap (existing work on the new batch's task days, weighted by its tasks) and
+    weekend_work (the new batch's own work on Saturdays / Sundays). `batch_profiles`
+    are the existing batches' own profiles (see daily_load), by default `profile`.
+    """
+    profile = np.asarray(profile, dtype="float64")
+    first = np.datetime64(first, "D")
+    n_cand = int((np.datetime64(last, "D") - first).astype(int)) + 1
+    if n_cand <= 0 or not len(profile):
+        return pd.DataFrame(columns=["start_date", "score", "peak_load", "peak_date", "overlap", "weekend_work"])
+    horizon_end = first + np.timedelta64(n_cand - 1 + len(profile) - 1, "D")
+    existing = daily_load(batches, profile if batch_profiles is None else batch_profiles,
+                          first, horizon_end).to_numpy()
+
+    # candidates × protocol days: positions of each candidate's task days on the date axis
+    window = np.arange(n_cand)[:, None] + np.arange(len(profile))[None, :]
+    around = existing[window]
+    total = around + profile[None, :]
+    # Only days the new batch actually works on count towards its peak
+    working = np.broadcast_to(profile > 0, total.shape)
+    peak_at = np.where(working, total, -np.inf).argmax(axis=1)
+    peak_load = total[np.arange(n_cand), peak_at]
+    overlap = around @ profile
+    epoch_days = (first + window.astype("timedelta64[D]")).view("int64")
+    # 1970-01-01 was a Thursday: (days + 3) % 7 gives Monday = 0 … Sunday = 6
+    weekend = ((epoch_days + 3) % 7) >= 5
+    weekend_work = (weekend * profile[None, :]).sum(axis=1)
+
+    score = overlap + peak_weight * peak_load + weekend_weight * weekend_work
+    starts = first + np.arange(n_cand).astype("timedelta64[D]")
+    out = pd.DataFrame({
+        "start_date": pd.to_datetime(starts),
+        "score": score,
+        "peak_load": peak_load,
+        "peak_date": pd.to_datetime(starts + peak_at.astype("timedelta64[D]")),
+        "overlap": overlap,
+        "weekend_work": weekend_work,
+    })
+    return out.sort_values(["score", "start_date"], kind="stable").reset_index(drop=True)
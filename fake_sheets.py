@@ -0,0 +1,205 @@
+"""
+In-process stand-in for the Google Sheets backend.
+
+Implements the subset of gspread's Spreadsheet / Worksheet API that the app
+uses, keeps every worksheet as a list of string rows, and sleeps for a
+configurable latency on every call so load tests see realistic round-trips.
+The app switches to it when DAN_FAKE_SHEETS=1 (see loadtest.py); it is never
+imported otherwise.
+"""
+import os
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from sheets import COUNT_COLUMNS, COUNT_PHASES, DATE_FORMAT
+
+ACCOUNTS_GID = 1000
+
+INFO_HEADER = [
+    "username", "batch_id", "cell", "start_date", "note",
+    "initial_plate_count", "replaced_plate_count", "end_date",
+]
+COUNTS_HEADER = ["username", "batch_id", "phase"] + COUNT_COLUMNS
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, gid, rows):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = gid
+        self._rows = [list(map(str, r)) for r in rows]
+
+    def _call(self):
+        self.spreadsheet._round_trip()
+
+    def get_all_values(self, **kwargs):
+        self._call()
+        with self.spreadsheet._lock:
+            return [list(r) for r in self._rows]
+
+    def get_all_records(self, **kwargs):
+        values = self.get_all_values()
+        if not values:
+            return []
+        header = values[0]
+        return [dict(zip(header, r)) for r in values[1:]]
+
+    def get_values(self, range_name=None, **kwargs):
+        # Whole sheet, or a range of whole rows ("5:9"): the forms the app uses
+        if range_name is None:
+            return self.get_all_values()
+        first, last = (int(r) for r in range_name.split(":"))
+        self._call()
+        with self.spreadsheet._lock:
+            rows = [list(r) for r in self._rows[first - 1:last]]
+        # gspread drops trailing empty rows
+        while rows and not any(rows[-1]):
+            rows.pop()
+        return rows
+
+    def row_values(self, row, **kwargs):
+        self._call()
+        with self.spreadsheet._lock:
+            values = self._rows[row - 1] if row <= len(self._rows) else []
+            # gspread drops trailing empty cells
+            while values and values[-1] == "":
+                values = values[:-1]
+            return list(values)
+
+    @property
+    def col_count(self):
+        with self.spreadsheet._lock:
+            return max((len(r) for r in self._rows), default=0)
+
+    def add_cols(self, cols):
+        self._call()
+        with self.spreadsheet._lock:
+            for r in self._rows:
+                r.extend([""] * cols)
+
+    def update_cell(self, row, col, value):
+        self._call()
+        with self.spreadsheet._lock:
+            while len(self._rows) < row:
+                self._rows.append([])
+            cells = self._rows[row - 1]
+            cells.extend([""] * (col - len(cells)))
+            cells[col - 1] = "" if value is None else str(value)
+
+    def append_row(self, values, **kwargs):
+        self.append_rows([values])
+
+    def append_rows(self, values, **kwargs):
+        self._call()
+        with self.spreadsheet._lock:
+            self._rows.extend(["" if v is None else str(v) for v in row] for row in values)
+
+    def update(self, values=None, range_name=None, **kwargs):
+        # Only the whole-sheet form `ws.update(rows)` is used by the app
+        self._call()
+        with self.spreadsheet._lock:
+            self._rows = [["" if v is None else str(v) for v in row] for row in (values or [])]
+
+    def delete_rows(self, start_index, end_index=None):
+        # 1-based and inclusive, like gspread
+        self._call()
+        with self.spreadsheet._lock:
+            del self._rows[start_index - 1:(end_index or start_index)]
+
+    def clear(self):
+        self._call()
+        with self.spreadsheet._lock:
+            self._rows = []
+
+
+class FakeSpreadsheet:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._sheets = {}
+        self._add("info", 1, [INFO_HEADER])
+        self._add("cell_counts", 2, [COUNTS_HEADER])
+        self._add("accounts", ACCOUNTS_GID, [["username", "password"]])
+
+    def _round_trip(self):
+        with self._lock:
+            self.calls += 1
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _add(self, title, gid, rows):
+        ws = FakeWorksheet(self, title, gid, rows)
+        self._sheets[title] = ws
+        return ws
+
+    def add_worksheet(self, title, rows=1000, cols=26, index=None):
+        self._round_trip()
+        with self._lock:
+            gid = max(ws.id for ws in self._sheets.values()) + 1
+        return self._add(title, gid, [])
+
+    def worksheet(self, title):
+        self._round_trip()
+        return self._sheets[title]
+
+    def worksheets(self):
+        self._round_trip()
+        return list(self._sheets.values())
+
+    def seed(self, users=10, batches_per_user=5, password="pw", today=None, rng=None):
+        """
+        Fill the sheets with `users` accounts (user0, user1, ...) and, for each, batches
+        started every few days over the last month, plus Day 15 counts where due.
+        """
+        rng = rng or random.Random(0)
+        today = today or date.today()
+        accounts = self._sheets["accounts"]
+        info = self._sheets["info"]
+        counts = self._sheets["cell_counts"]
+        for u in range(users):
+            user = f"user{u}"
+            accounts._rows.append([user, password])
+            for b in range(1, batches_per_user + 1):
+                start = today - timedelta(days=rng.randint(0, 30))
+                info._rows.append([
+                    user, str(b), rng.choice(["H9", "KOLF2.1J", "PD-iPSC"]),
+                    start.strftime(DATE_FORMAT), rng.choice(["", "coating ok", "lot change"]),
+                    str(rng.randint(1, 4)), str(rng.randint(0, 4)),
+                    (start + timedelta(days=21)).strftime(DATE_FORMAT),
+                ])
+                if (today - start).days >= 15:
+                    counts._rows.append(
+                        [user, str(b), COUNT_PHASES[0]]
+                        + [str(rng.randint(1, 9) * 10 ** 5) for _ in range(3)]
+                        + [""] * (len(COUNT_COLUMNS) - 3)
+                    )
+        return self
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_spreadsheet():
+    """The process-wide fake, created on first use with DAN_FAKE_LATENCY_MS / DAN_FAKE_JITTER_MS."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = FakeSpreadsheet(
+                latency_ms=float(os.environ.get("DAN_FAKE_LATENCY_MS", 0)),
+                jitter_ms=float(os.environ.get("DAN_FAKE_JITTER_MS", 0)),
+            )
+        return _shared
+
+
+def reset_shared(**kwargs):
+    """Replace the process-wide fake (used by the load-test harness between runs)."""
+    global _shared
+    with _shared_lock:
+        _shared = FakeSpreadsheet(**kwargs)
+        return _shared
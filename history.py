@@ -0,0 +1,342 @@
+"""
+SQLite index of every batch ever run, for the History view.
+
+The hot `info` sheet only holds batches in flight and `info_archive` grows with
+years of lab history, so the History view does not filter DataFrames: both
+sheets are mirrored into one SQLite table with B-tree indexes on cell,
+start_date and username, and each page is a single indexed query that returns
+only the rows on screen.
+
+Notes and cell names also go into an FTS5 inverted index (kept in step with the
+table by triggers), so keyword search is ranked by BM25 and never scans notes.
+
+Each batch's outcome (how far it was counted, and its Day 15 → Day 21
+expansion; see core.counts.batch_outcomes) is kept in a small table keyed by
+(username, batch_id), rewritten whenever the yields change, so a page can be
+filtered by outcome in the same query.
+
+Mirroring is incremental. Every row carries a hash of its decoded values; a
+sync only deletes rows whose hash left the sheet and inserts the new ones, and
+a saved batch is written straight in with `replace_batch()`, so search sees it
+before the sheet is read again. A sheet whose fingerprint is unchanged is not
+looked at row by row at all, and a restart reuses the file on disk.
+
+A batch present in both sheets (an interrupted archive move) is shown once,
+from the hot sheet. Nothing here imports Streamlit.
+"""
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date
+
+import pandas as pd
+
+from core.counts import OUTCOMES
+from sheets import INFO_SCHEMA, decode_sheet
+
+HISTORY_FILE = "history.sqlite"
+
+# Bump when the schema changes: the index is derived data and is rebuilt from the sheets
+SCHEMA_VERSION = 4
+
+_SCHEMA = """
+CREATE TABLE batches (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    username TEXT NOT NULL,
+    batch_id INTEGER,
+    cell TEXT NOT NULL,
+    start_date TEXT,
+    end_date TEXT,
+    note TEXT NOT NULL,
+    initial_plate_count TEXT NOT NULL,
+    replaced_plate_count TEXT NOT NULL,
+    row_hash TEXT NOT NULL,
+    shadowed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX batches_cell ON batches (cell, start_date);
+CREATE INDEX batches_start ON batches (start_date);
+CREATE INDEX batches_user ON batches (username, start_date);
+CREATE INDEX batches_key ON batches (username, batch_id, source);
+CREATE TABLE sources (name TEXT PRIMARY KEY, fingerprint TEXT NOT NULL);
+CREATE TABLE outcomes (
+    username TEXT NOT NULL,
+    batch_id INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    expansion REAL,
+    PRIMARY KEY (username, batch_id)
+);
+
+CREATE VIRTUAL TABLE notes_fts USING fts5(
+    cell, note, content='batches', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER batches_ai AFTER INSERT ON batches BEGIN
+    INSERT INTO notes_fts (rowid, cell, note) VALUES (new.id, new.cell, new.note);
+END;
+CREATE TRIGGER batches_ad AFTER DELETE ON batches BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, cell, note) VALUES ('delete', old.id, old.cell, old.note);
+END;
+"""
+
+COLUMNS = ["username", "batch_id", "cell", "start_date", "end_date", "note",
+           "initial_plate_count", "replaced_plate_count"]
+
+# Outcome of a batch with no row in `outcomes`
+NOT_COUNTED = OUTCOMES[-1]
+OUTCOMES_SOURCE = "outcomes"
+
+# A hit in the cell name counts for more than one in free-text notes
+_BM25 = "bm25(notes_fts, 2.0, 1.0)"
+
+# An archived row is hidden while the same batch is still in the hot sheet;
+# worked out once per write (through the key index) rather than in every query
+_MARK_SHADOWED = [
+    "UPDATE batches SET shadowed = 0 WHERE shadowed = 1",
+    """UPDATE batches SET shadowed = 1 WHERE source != 'info' AND (username, batch_id) IN (
+        SELECT username, batch_id FROM batches WHERE source = 'info')""",
+]
+
+
+def match_expression(text):
+    """FTS5 query for free text: every word must appear, each as a prefix ("contam" finds "contamination")."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+@dataclass
+class HistoryQuery:
+    """Filters for one History page. Empty lists / None mean "any"."""
+    users: list = field(default_factory=list)
+    cells: list = field(default_factory=list)
+    start_from: date = None
+    start_to: date = None
+    text: str = ""
+    outcomes: list = field(default_factory=list)
+
+    @property
+    def match(self):
+        return match_expression(self.text)
+
+    def tables(self, with_outcomes=False):
+        """
+        FROM clause: joined with the full-text index only when searching. CROSS JOIN
+        makes SQLite walk the (selective) term postings first and look batches up by id.
+        Outcomes are joined (by primary key) when filtered on or `with_outcomes`.
+        """
+        tables = "notes_fts CROSS JOIN batches b ON b.id = notes_fts.rowid" if self.match else "batches b"
+        if with_outcomes or self.outcomes:
+            tables += " LEFT JOIN outcomes o ON o.username = b.username AND o.batch_id = b.batch_id"
+        return tables
+
+    def where(self):
+        clauses, params = ["b.shadowed = 0"], []
+        if self.match:
+            clauses.append("notes_fts MATCH ?")
+            params.append(self.match)
+        for column, values in (("username", self.users), ("cell", self.cells)):
+            if values:
+                clauses.append(f"b.{column} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+        if self.outcomes:
+            clauses.append(f"COALESCE(o.outcome, ?) IN ({','.join('?' * len(self.outcomes))})")
+            params.extend([NOT_COUNTED, *self.outcomes])
+        if self.start_from is not None:
+            clauses.append("b.start_date >= ?")
+            params.append(self.start_from.isoformat())
+        if self.start_to is not None:
+            clauses.append("b.start_date <= ?")
+            params.append(self.start_to.isoformat())
+        return " AND ".join(clauses), params
+
+
+def row_hashes(df: pd.DataFrame) -> list:
+    """Hash of each row's decoded values, as hex strings."""
+    if df.empty:
+        return []
+    hashed = pd.util.hash_pandas_object(df[COLUMNS].astype(str), index=False)
+    return [f"{h:016x}" for h in hashed.tolist()]
+
+
+def fingerprint(hashes) -> str:
+    """Order-insensitive fingerprint of a whole sheet from its row hashes."""
+    return f"{len(hashes)}:{sum(int(h, 16) for h in hashes) & 0xFFFFFFFFFFFFFFFF:x}"
+
+
+def _iso(values):
+    values = pd.Series(values)
+    return values.dt.strftime("%Y-%m-%d").astype(object).where(values.notna(), None).tolist()
+
+
+def _ints(values):
+    values = pd.Series(values, dtype="Int64")
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def _floats(values):
+    values = pd.Series(values, dtype="float64")
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def _texts(values):
+    return pd.Series(values).astype(object).fillna("").astype(str).tolist()
+
+
+def _insert(con, name, df, hashes):
+    rows = zip(
+        [name] * len(df), _texts(df["username"]), _ints(df["batch_id"]), _texts(df["cell"]),
+        _iso(df["start_date"]), _iso(df["end_date"]), _texts(df["note"]),
+        _texts(df["initial_plate_count"]), _texts(df["replaced_plate_count"]), hashes,
+    )
+    con.executemany(
+        f"INSERT INTO batches (source, {', '.join(COLUMNS)}, row_hash) VALUES (?,?,?,?,?,?,?,?,?,?)", rows
+    )
+
+
+class HistoryIndex:
+    """The batches of every mirrored sheet in one indexed SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._write_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            if con.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self._rebuild(con)
+
+    @staticmethod
+    def _rebuild(con):
+        """Drop an index written by another version and start empty; the next syncs refill it."""
+        for (table,) in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            # FTS5 shadow tables go with their virtual table
+            if not table.startswith("notes_fts_"):
+                con.execute(f"DROP TABLE IF EXISTS {table}")
+        con.executescript(_SCHEMA)
+        con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call: cheap, and safe across threads
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def sources(self):
+        with self._connect() as con:
+            return dict(con.execute("SELECT name, fingerprint FROM sources"))
+
+    def sync(self, name, df: pd.DataFrame):
+        """
+        Mirror the decoded info-like frame of sheet `name`, touching only the rows
+        that changed. Returns the number of rows inserted plus deleted.
+        """
+        hashes = row_hashes(df)
+        stamp = fingerprint(hashes)
+        with self._write_lock:
+            if self.sources().get(name) == stamp:
+                return 0
+            with self._connect() as con:
+                # Rows are matched by hash as a multiset, so duplicated sheet rows stay duplicated
+                wanted = Counter(hashes)
+                stale = []
+                for row_id, row_hash in con.execute("SELECT id, row_hash FROM batches WHERE source = ?", (name,)):
+                    if wanted[row_hash] > 0:
+                        wanted[row_hash] -= 1
+                    else:
+                        stale.append((row_id,))
+                new = []
+                for i, h in enumerate(hashes):
+                    if wanted[h] > 0:
+                        wanted[h] -= 1
+                        new.append(i)
+                con.executemany("DELETE FROM batches WHERE id = ?", stale)
+                _insert(con, name, df.iloc[new], [hashes[i] for i in new])
+                for statement in _MARK_SHADOWED:
+                    con.execute(statement)
+                con.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (name, stamp))
+        return len(stale) + len(new)
+
+    def replace_batch(self, username, batch_id, row, source="info"):
+        """
+        Index a batch that was just saved; `row` is its info row as written to the
+        sheet `source`. Earlier copies from that sheet are dropped; a copy indexed
+        from another sheet (the archive) stays, shadowed while the hot copy exists,
+        until a sync of its own sheet finds it gone.
+        """
+        df = decode_sheet("info", [list(INFO_SCHEMA), [str(v) for v in row]])
+        with self._write_lock, self._connect() as con:
+            con.execute(
+                "DELETE FROM batches WHERE username = ? AND batch_id = ? AND source = ?",
+                (username, int(batch_id), source),
+            )
+            _insert(con, source, df, row_hashes(df))
+            for statement in _MARK_SHADOWED:
+                con.execute(statement)
+
+    def sync_outcomes(self, outcomes: pd.DataFrame):
+        """
+        Replace the outcome table with `outcomes` (as from core.counts.batch_outcomes),
+        unless it is unchanged since the last call. Returns the number of rows written.
+        """
+        outcomes = outcomes.dropna(subset=["batch_id"]).drop_duplicates(["username", "batch_id"])
+        hashed = pd.util.hash_pandas_object(outcomes.astype(str), index=False)
+        stamp = fingerprint([f"{h:016x}" for h in hashed.tolist()])
+        rows = zip(
+            _texts(outcomes["username"]), _ints(outcomes["batch_id"]), _texts(outcomes["outcome"]),
+            _floats(outcomes["expansion"]),
+        )
+        with self._write_lock:
+            if self.sources().get(OUTCOMES_SOURCE) == stamp:
+                return 0
+            with self._connect() as con:
+                con.execute("DELETE FROM outcomes")
+                con.executemany("INSERT INTO outcomes VALUES (?, ?, ?, ?)", rows)
+                con.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (OUTCOMES_SOURCE, stamp))
+        return len(outcomes)
+
+    def distinct(self, column):
+        """Sorted distinct non-empty values of `username` or `cell` (served from their index)."""
+        if column not in ("username", "cell"):
+            raise ValueError(column)
+        with self._connect() as con:
+            return [v for (v,) in con.execute(f"SELECT DISTINCT {column} FROM batches ORDER BY 1") if v]
+
+    def count(self, query: HistoryQuery):
+        where, params = query.where()
+        with self._connect() as con:
+            return con.execute(f"SELECT COUNT(*) FROM {query.tables()} WHERE {where}", params).fetchone()[0]
+
+    def page(self, query: HistoryQuery, page=0, page_size=25) -> pd.DataFrame:
+        """
+        Page `page` (0-based) of the matching batches with their outcome and
+        expansion: best keyword matches first when searching (`snippet` shows the
+        note around them), else newest first.
+        """
+        where, params = query.where()
+        columns = [f"b.{c}" for c in COLUMNS] + ["b.source", "COALESCE(o.outcome, ?)", "o.expansion"]
+        if query.match:
+            columns.append("snippet(notes_fts, 1, '[', ']', '…', 12)")
+            order = f"{_BM25}, b.start_date DESC"
+        else:
+            columns.append("''")
+            order = "b.start_date DESC, b.username, b.batch_id"
+        sql = (
+            f"SELECT {', '.join(columns)} FROM {query.tables(with_outcomes=True)} WHERE {where} "
+            f"ORDER BY {order} LIMIT ? OFFSET ?"
+        )
+        with self._connect() as con:
+            rows = con.execute(sql, [NOT_COUNTED] + params + [int(page_size), int(page) * int(page_size)]).fetchall()
+        df = pd.DataFrame(rows, columns=COLUMNS + ["source", "outcome", "expansion", "snippet"])
+        for col in ("start_date", "end_date"):
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        df["batch_id"] = df["batch_id"].astype("Int64")
+        df["expansion"] = df["expansion"].astype("float64")
+        return df
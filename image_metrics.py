@@ -0,0 +1,166 @@
+"""
+Quantitative metrics of microscope images: confluence, focus and brightness.
+
+Each image is decoded straight to a small grayscale array (Pillow's draft mode
+lets the JPEG decoder scale down while decoding) of at most ANALYSIS_SIZE
+pixels a side, so every metric costs a few whole-array NumPy operations:
+
+  • confluence: fraction of the field covered by cells. Cells are textured
+    where the background is flat, so a pixel is a cell pixel when the local
+    standard deviation over a WINDOW × WINDOW box (from integral images) is
+    above the fixed level CELL_TEXTURE. The level is absolute, not fitted to
+    each image: a fitted split such as Otsu's always cuts the field in two, so
+    a fully confluent dish would read as half empty.
+  • focus: variance of the Laplacian over the cell pixels, × 1000. Higher is
+    sharper; since every image is measured at the same size, scores compare
+    across uploads and dishes of different confluence.
+  • intensity: mean gray level, 0–1.
+
+ImageAnalyzer measures a batch of images on a process pool, a chunk of images
+per task, and keeps the results by content hash, so re-running the viewer or
+uploading the same files again costs only the hashing. Nothing here imports
+Streamlit; Pillow is imported when an image is decoded.
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from montage import content_hash
+
+ANALYSIS_SIZE = 512
+WINDOW = 7
+# Least local standard deviation counted as cells (≈ 2.5 gray levels at ANALYSIS_SIZE, where
+# downscaling has already averaged most camera noise away, while even blurred cells stay above it)
+CELL_TEXTURE = 0.01
+# Cell pixels needed to score focus on the cells alone, else the whole field is used
+MIN_FOCUS_PIXELS = 500
+METRICS = ["confluence", "focus", "intensity"]
+
+# Fewer uncached images than this are measured in the calling thread: not worth the IPC
+POOL_MIN_IMAGES = 8
+# Images per pool task
+CHUNK_IMAGES = 8
+# Results kept per process (a few hundred bytes each)
+CACHE_ENTRIES = 50_000
+
+
+def grayscale(data: bytes, size=ANALYSIS_SIZE) -> np.ndarray:
+    """An image's bytes as a float32 array in 0–1, shrunk to fit size × size."""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    img.draft("L", (size, size))
+    img = img.convert("L")
+    img.thumbnail((size, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+
+def box_mean(a: np.ndarray, k=WINDOW) -> np.ndarray:
+    """Mean over the k × k box around every pixel (edges reflected), from one integral image."""
+    padded = np.pad(a.astype(np.float64), k // 2, mode="reflect")
+    integral = np.pad(padded.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    sums = integral[k:, k:] - integral[:-k, k:] - integral[k:, :-k] + integral[:-k, :-k]
+    return sums / (k * k)
+
+
+def measure(gray: np.ndarray) -> dict:
+    """METRICS of one grayscale array (see the module docstring)."""
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return {m: np.nan for m in METRICS}
+    mean = box_mean(gray)
+    local_std = np.sqrt(np.maximum(box_mean(gray * gray) - mean * mean, 0.0))
+    cells = local_std > CELL_TEXTURE
+    laplacian = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]) - 4 * gray[1:-1, 1:-1]
+    # Sharpness of the cells themselves, so a sparse dish does not read as blurred
+    inside = cells[1:-1, 1:-1]
+    region = laplacian[inside] if inside.sum() >= MIN_FOCUS_PIXELS else laplacian
+    return {"confluence": float(cells.mean()), "focus": float(region.var() * 1000), "intensity": float(gray.mean())}
+
+
+def measure_bytes(data: bytes) -> dict:
+    """METRICS of an image's bytes; NaN for files that are not readable images."""
+    from PIL import UnidentifiedImageError
+
+    try:
+        return measure(grayscale(data))
+    except (UnidentifiedImageError, OSError, ValueError):
+        return {m: np.nan for m in METRICS}
+
+
+def _measure_chunk(chunk):
+    """Pool task: METRICS of each image in `chunk` (a list of bytes)."""
+    return [measure_bytes(data) for data in chunk]
+
+
+class ImageAnalyzer:
+    """
+    METRICS of uploaded images, measured on a pool of `workers` processes
+    (started on first use, spawned rather than forked from the threaded
+    server) and cached by content hash. Thread-safe.
+    """
+
+    def __init__(self, workers=None, max_entries=CACHE_ENTRIES):
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._results = OrderedDict()  # content hash -> metrics dict
+        self._pool = None
+
+    def _executor(self):
+        # multiprocessing is only imported once a batch is big enough for the pool
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _measure(self, todo):
+        """Metrics of every image in `todo` ({hash: bytes}), on the pool when there are enough of them."""
+        items = list(todo.items())
+        chunks = [[data for _, data in items[i:i + CHUNK_IMAGES]] for i in range(0, len(items), CHUNK_IMAGES)]
+        if len(items) >= POOL_MIN_IMAGES and self.workers > 1:
+            from concurrent.futures.process import BrokenProcessPool
+
+            try:
+                results = [m for chunk in self._executor().map(_measure_chunk, chunks) for m in chunk]
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory): start a fresh pool next time, measure here now
+                with self._lock:
+                    self._pool = None
+                results = [m for chunk in chunks for m in _measure_chunk(chunk)]
+        else:
+            results = [m for chunk in chunks for m in _measure_chunk(chunk)]
+        return {h: m for (h, _), m in zip(items, results)}
+
+    def analyze(self, images) -> pd.DataFrame:
+        """
+        One row per image of `images` ([(name, bytes)]): name, hash, METRICS and
+        whether the result came from the cache. Only images not measured before
+        are decoded.
+        """
+        hashes = [content_hash(data) for _, data in images]
+        with self._lock:
+            todo = {h: data for h, (_, data) in zip(hashes, images) if h not in self._results}
+        measured = self._measure(todo) if todo else {}
+        with self._lock:
+            self._results.update(measured)
+            rows = []
+            for (name, _), h in zip(images, hashes):
+                metrics = self._results[h]
+                self._results.move_to_end(h)
+                rows.append({"name": name, "hash": h, **metrics, "cached": h not in measured})
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return pd.DataFrame(rows, columns=["name", "hash", *METRICS, "cached"])
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,135 @@
+"""
+Import-time budget for the app's own modules, measured with `python -X importtime`.
+
+Streamlit re-executes streamlit_app.py on every rerun but imports modules once
+per server process, so what matters is (a) how long our modules take to import
+on a cold start and (b) that no view drags in the heavy dependencies of another.
+Each module is imported in a fresh interpreter after the libraries every run
+pays for anyway (streamlit, pandas, pyarrow) and after its own preloads; its
+cumulative import time is compared with the budget below, and the modules it
+newly imports must not include any of LAZY_ONLY. The STREAMLIT_FREE modules
+must import without pulling in Streamlit at all.
+
+    python import_budget.py            # check, exit 1 when over budget
+    python import_budget.py --runs 5   # median of 5 cold imports per module
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+BASELINE = ["streamlit", "pandas", "pyarrow"]
+
+# module -> (budget in ms, modules imported before it)
+BUDGETS = {
+    "core": (50, []),
+    "common": (50, []),
+    "views": (10, ["common"]),
+    "views.calendar": (10, ["common", "views"]),
+    "views.tasks": (10, ["common", "views"]),
+    "views.batch_manager": (10, ["common", "views"]),
+    "views.image_viewer": (10, ["common", "views"]),
+    "views.history": (10, ["common", "views"]),
+    "views.reagents": (10, ["common", "views"]),
+    "views.counts": (10, ["common", "views"]),
+    "views.bulk": (10, ["common", "views"]),
+    "views.admin": (10, ["common", "views"]),
+    "views.debug": (10, ["common", "views"]),
+}
+
+# Only ever imported inside the function that needs them
+LAZY_ONLY = ["PIL", "gspread", "oauth2client", "streamlit_sortables", "openpyxl"]
+
+# Usable from scripts and cron jobs: must import without Streamlit
+STREAMLIT_FREE = ["core", "sheets", "prefetch", "archive", "history", "schedule_export", "bulk", "montage", "image_metrics"]
+
+_PROBE = """
+import sys
+{preload}
+_before = set(sys.modules)
+import {module}
+print("\\n".join(sorted(set(sys.modules) - _before)))
+"""
+
+
+def measure(module, preload, baseline=BASELINE):
+    """(cumulative import time of `module` in ms, modules it newly imported)."""
+    code = _PROBE.format(
+        preload="\n".join(f"import {m}" for m in baseline + preload),
+        module=module,
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative_us = int(parts[1])
+    new_modules = proc.stdout.split()
+    return (cumulative_us or 0) / 1000, new_modules
+
+
+def check(runs=3):
+    """
+    Rows of {"module", "ms", "budget_ms", "lazy_violations", "ok"}; the
+    STREAMLIT_FREE rows only check that Streamlit is not imported (ms is None).
+    """
+    rows = []
+    for module, (budget_ms, preload) in BUDGETS.items():
+        times = []
+        violations = set()
+        for _ in range(runs):
+            ms, new_modules = measure(module, preload)
+            times.append(ms)
+            violations |= {m for m in new_modules if m.split(".")[0] in LAZY_ONLY}
+        ms = statistics.median(times)
+        rows.append({
+            "module": module,
+            "ms": ms,
+            "budget_ms": budget_ms,
+            "lazy_violations": sorted({m.split(".")[0] for m in violations}),
+            "ok": ms <= budget_ms and not violations,
+        })
+    for module in STREAMLIT_FREE:
+        _, new_modules = measure(module, [], baseline=["pandas"])
+        uses_streamlit = any(m.split(".")[0] == "streamlit" for m in new_modules)
+        rows.append({
+            "module": module,
+            "ms": None,
+            "budget_ms": None,
+            "lazy_violations": ["streamlit"] if uses_streamlit else [],
+            "ok": not uses_streamlit,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=3, help="cold imports per module (the median is used)")
+    args = parser.parse_args(argv)
+
+    rows = check(args.runs)
+    print(f"{'module':<24}{'ms':>9}{'budget':>9}  status")
+    for r in rows:
+        if r["ms"] is None:
+            status = "ok (no streamlit)" if r["ok"] else "IMPORTS STREAMLIT"
+            print(f"{r['module']:<24}{'-':>9}{'-':>9}  {status}")
+            continue
+        status = "ok" if r["ok"] else "OVER BUDGET" if r["ms"] > r["budget_ms"] else "EAGER IMPORT"
+        extra = f" ({', '.join(r['lazy_violations'])})" if r["lazy_violations"] else ""
+        print(f"{r['module']:<24}{r['ms']:>9.1f}{r['budget_ms']:>9}  {status}{extra}")
+    return 0 if all(r["ok"] for r in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
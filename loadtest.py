@@ -0,0 +1,302 @@
+"""
+Load-test harness: many simulated lab members driving streamlit_app.py headlessly.
+
+Every simulated session is a Streamlit AppTest running the real script against
+the in-process fake Sheets backend (fake_sheets.py, with configurable latency).
+A session logs in, switches through the views, saves a batch and runs the Image
+Viewer on generated images, repeated `--iterations` times. Sessions run
+`--concurrency` at a time inside this one process, like a single Streamlit
+server would run them.
+
+Reported per action and overall: p50 / p95 / p99 latency (wall clock around each
+AppTest run), throughput and Sheets API calls per action (from the perf records
+of the reruns the action caused; reruns cut short by st.stop, such as the login
+screen, are not recorded). Save a run with --out and compare a later one
+against it with --baseline.
+
+    python loadtest.py --sessions 20 --concurrency 4 --latency-ms 80 --out baseline.json
+    python loadtest.py --sessions 20 --concurrency 4 --latency-ms 80 --baseline baseline.json
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "streamlit_app.py")
+VIEWS = ["Calendar", "Tasks", "Batch Manager"]
+
+
+def configure_environment(args, workdir):
+    """Must run before perf / snapshot / fake_sheets are imported: they read these at import."""
+    os.environ["DAN_FAKE_SHEETS"] = "1"
+    os.environ["DAN_FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["DAN_FAKE_JITTER_MS"] = str(args.jitter_ms)
+    os.environ["DAN_SNAPSHOT_DIR"] = os.path.join(workdir, "snapshots")
+    os.environ["DAN_PROFILE_DIR"] = os.path.join(workdir, "profiles")
+    os.environ["DAN_PERF_LOG"] = ""
+    # The app resolves scheme.png and the protocol workbook relative to the repo
+    os.chdir(HERE)
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+
+
+def share_script_bytecode():
+    """
+    AppTest recompiles the script on every run, while a real server compiles it once
+    and shares the bytecode. Do the same here: it keeps compile time out of the
+    numbers, and concurrent compile() calls are not thread-safe on some CPython 3.11 builds.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    original = ScriptCache.get_bytecode
+    lock = threading.Lock()
+    compiled = {}
+
+    def get_bytecode(self, script_path):
+        with lock:
+            if script_path not in compiled:
+                compiled[script_path] = original(self, script_path)
+            return compiled[script_path]
+
+    ScriptCache.get_bytecode = get_bytecode
+
+
+def make_images(n, size=256, seed=0):
+    """`n` noisy JPEGs named like microscope exports: <batch>_D<day>_#<dish>_<i>.jpg."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    files = []
+    for i in range(n):
+        arr = rng.integers(0, 255, (size, size, 3), dtype=np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(arr).save(buf, format="JPEG", quality=80)
+        name = f"1_D{15 + i % 3}_#{1 + i % 2}_{i:03d}.jpg"
+        files.append((name, buf.getvalue(), "image/jpeg"))
+    return files
+
+
+class RunCollector:
+    """perf listener: keeps every finished rerun's record, grouped by user."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_user = defaultdict(list)
+
+    def __call__(self, record):
+        with self._lock:
+            self._by_user[record.get("user")].append(record)
+
+    def mark(self, user):
+        with self._lock:
+            return len(self._by_user[user])
+
+    def since(self, user, mark):
+        with self._lock:
+            return list(self._by_user[user][mark:])
+
+
+def click(at, label):
+    next(b for b in at.button if b.label == label).click().run()
+
+
+def install_secrets(secrets):
+    """
+    Install process-wide secrets once. Per-AppTest secrets are swapped in and out of the
+    global st.secrets around every run, which races when sessions run concurrently.
+    """
+    import streamlit as st
+    from streamlit.runtime.secrets import Secrets
+
+    shared = Secrets()
+    shared._secrets = dict(secrets)
+    st.secrets = shared
+
+
+def simulate_session(k, args, images, collector):
+    from streamlit.testing.v1 import AppTest
+
+    user = f"user{k}"
+    at = AppTest.from_file(APP, default_timeout=args.timeout)
+    results = []
+
+    def act(name, step):
+        if args.think_ms:
+            # The user reads the page before clicking on (idle time the prefetcher can use)
+            time.sleep(args.think_ms / 1000)
+        mark = collector.mark(user)
+        t0 = time.perf_counter()
+        error = None
+        try:
+            step()
+            if at.exception:
+                error = at.exception[0].value
+        except Exception as e:  # a failing step is a result, not a crash of the harness
+            error = f"{type(e).__name__}: {e}"
+        wall_ms = (time.perf_counter() - t0) * 1000
+        runs = collector.since(user, mark)
+        results.append({
+            "session": k,
+            "action": name,
+            "wall_ms": wall_ms,
+            "server_ms": sum(r["total_ms"] for r in runs),
+            "reruns": len(runs),
+            "api_calls": sum(r.get("api_calls", 0) for r in runs),
+            "error": error,
+        })
+
+    def login():
+        at.text_input(key="top_login_user").input(user)
+        at.text_input(key="top_login_pass").input("pw")
+        click(at, "Login")
+
+    def save_batch():
+        click(at, "Batch Manager")
+        at.text_input(key="new_cell").input("LT-cell")
+        at.text_input(key="new_initial_plate_count").input("2")
+        click(at, "Save New Batch")
+
+    def run_image_viewer():
+        at.number_input(key="img_setup_bid").set_value(1)
+        at.get("file_uploader")[0].set_value(images)
+        click(at, "Run")
+
+    act("open", at.run)
+    act("login", login)
+    for _ in range(args.iterations):
+        for view in VIEWS:
+            act(f"view:{view}", lambda v=view: click(at, v))
+        act("save_batch", save_batch)
+        act("view:Image Viewer", lambda: click(at, "Image Viewer"))
+        if images:
+            act("image_viewer_run", run_image_viewer)
+    return results
+
+
+def percentile(values, q):
+    from perf import percentile as _percentile
+    return _percentile(values, q)
+
+
+def summarize(results, elapsed_s, backend_calls):
+    by_action = defaultdict(list)
+    for r in results:
+        by_action[r["action"]].append(r)
+
+    def stats(rows):
+        wall = [r["wall_ms"] for r in rows]
+        return {
+            "n": len(rows),
+            "p50_ms": percentile(wall, 50),
+            "p95_ms": percentile(wall, 95),
+            "p99_ms": percentile(wall, 99),
+            "server_ms_mean": sum(r["server_ms"] for r in rows) / len(rows),
+            "api_calls_mean": sum(r["api_calls"] for r in rows) / len(rows),
+            "errors": sum(1 for r in rows if r["error"]),
+        }
+
+    overall = stats(results) if results else {}
+    overall.update({
+        "elapsed_s": elapsed_s,
+        "throughput_actions_per_s": len(results) / elapsed_s if elapsed_s else None,
+        "backend_calls": backend_calls,
+    })
+    return {"overall": overall, "actions": {a: stats(rows) for a, rows in sorted(by_action.items())}}
+
+
+def _fmt(v, nd=1):
+    return "-" if v is None else f"{v:.{nd}f}"
+
+
+def print_report(summary, baseline=None):
+    head = f"{'action':<22}{'n':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'api/act':>9}{'err':>5}"
+    if baseline:
+        head += f"{'Δp50':>9}{'Δp99':>9}"
+    print(head)
+    rows = list(summary["actions"].items()) + [("ALL", summary["overall"])]
+    base_rows = dict(baseline["actions"], ALL=baseline["overall"]) if baseline else {}
+    for name, s in rows:
+        line = (f"{name:<22}{s['n']:>5}{_fmt(s['p50_ms']):>9}{_fmt(s['p95_ms']):>9}"
+                f"{_fmt(s['p99_ms']):>9}{_fmt(s['api_calls_mean'], 2):>9}{s['errors']:>5}")
+        if baseline:
+            b = base_rows.get(name)
+            for key in ("p50_ms", "p99_ms"):
+                if b and b.get(key):
+                    line += f"{(s[key] - b[key]) / b[key] * 100:>+8.0f}%"
+                else:
+                    line += f"{'-':>9}"
+        print(line)
+    o = summary["overall"]
+    print(f"\n{o['n']} actions in {o['elapsed_s']:.1f}s -> "
+          f"{_fmt(o['throughput_actions_per_s'], 2)} actions/s, {o['backend_calls']} backend calls")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=10, help="simulated users")
+    parser.add_argument("--concurrency", type=int, default=4, help="sessions running at once")
+    parser.add_argument("--iterations", type=int, default=2, help="view/save/image rounds per session")
+    parser.add_argument("--batches", type=int, default=8, help="seeded batches per user")
+    parser.add_argument("--images", type=int, default=12, help="images uploaded to the Image Viewer (0 skips it)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake Sheets latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="extra random latency per call")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause before every action (not timed)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-rerun timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the summary (and raw results) as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier --out run to compare against")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="dan-loadtest-")
+    configure_environment(args, workdir)
+    import fake_sheets
+    import perf
+
+    backend = fake_sheets.reset_shared(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    backend.seed(users=args.sessions, batches_per_user=args.batches, rng=random.Random(args.seed))
+    images = make_images(args.images, seed=args.seed) if args.images else []
+    share_script_bytecode()
+    install_secrets({
+        "SHEET_ID": "fake",
+        "GSPREAD_CRED": {"type": "service_account"},
+        "GID_ACCOUNTS": fake_sheets.ACCOUNTS_GID,
+    })
+    collector = RunCollector()
+    perf.add_listener(collector)
+
+    t0 = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [
+            pool.submit(simulate_session, k, args, images, collector)
+            for k in range(args.sessions)
+        ]
+        for f in futures:
+            results.extend(f.result())
+    elapsed = time.perf_counter() - t0
+    perf.remove_listener(collector)
+
+    summary = summarize(results, elapsed, backend.calls)
+    summary["config"] = {k: v for k, v in vars(args).items() if k not in ("out", "baseline")}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(summary, baseline)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(dict(summary, results=results), f, indent=2, default=str)
+    return 1 if summary["overall"].get("errors") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
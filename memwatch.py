@@ -0,0 +1,178 @@
+"""
+Per-session memory accounting.
+
+Streamlit keeps one `st.session_state` per browser session, and nothing in the
+process says which session is holding what. Each session therefore reports a
+size estimate of its own entries into a process-wide SessionMemoryRegistry at
+the end of a run; the admin view reads the registry, and sessions that go over
+their cap (or are picked when the whole process is over budget) drop their
+evictable artifacts on their next run.
+
+Sizes are estimates: pandas' deep `memory_usage`, buffer lengths for bytes,
+arrays and uploads, pixel buffers for images and `sys.getsizeof` otherwise.
+`tracemalloc_top()` gives exact allocation sites when tracing is switched on.
+"""
+import io
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+MB = 1024 * 1024
+
+
+def estimate_size(obj, _depth=0):
+    """Approximate bytes retained by `obj`, recursing a few levels into containers."""
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return len(obj)
+    if isinstance(obj, io.BytesIO):
+        # includes Streamlit's UploadedFile
+        return len(obj.getbuffer())
+    if isinstance(obj, str):
+        return sys.getsizeof(obj)
+    if type(obj).__name__ == "Styler" and hasattr(obj, "data"):
+        # the styled frame plus roughly as much again for the computed styles
+        return 2 * estimate_size(obj.data, _depth + 1)
+    if hasattr(obj, "size") and hasattr(obj, "mode") and hasattr(obj, "getbands"):
+        # PIL image: decoded pixel buffer
+        width, height = obj.size
+        return width * height * len(obj.getbands())
+    if _depth < 4:
+        if isinstance(obj, dict):
+            return sys.getsizeof(obj) + sum(
+                estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in obj.items()
+            )
+        if isinstance(obj, (list, tuple, set, frozenset)):
+            return sys.getsizeof(obj) + sum(estimate_size(v, _depth + 1) for v in obj)
+    return sys.getsizeof(obj)
+
+
+def entry_sizes(mapping):
+    """{key: estimated bytes} for every entry of a dict-like (e.g. st.session_state)."""
+    sizes = {}
+    for key in list(mapping.keys()):
+        try:
+            sizes[str(key)] = estimate_size(mapping[key])
+        except Exception:
+            sizes[str(key)] = 0
+    return sizes
+
+
+def plan_eviction(sizes, evictable, cap_bytes):
+    """
+    Keys to drop, largest first, until the total fits under `cap_bytes`.
+    Only keys for which `evictable(key)` is true are considered.
+    """
+    total = sum(sizes.values())
+    plan = []
+    for key, size in sorted(sizes.items(), key=lambda kv: kv[1], reverse=True):
+        if total <= cap_bytes:
+            break
+        if size and evictable(key):
+            plan.append(key)
+            total -= size
+    return plan
+
+
+def process_rss_bytes():
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource  # Unix only, hence the late import
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def tracemalloc_top(limit=15):
+    """Top allocation sites by size, or None if tracemalloc is not tracing."""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    rows = []
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        rows.append({
+            "location": f"{frame.filename}:{frame.lineno}",
+            "size_kb": round(stat.size / 1024, 1),
+            "blocks": stat.count,
+        })
+    return rows
+
+
+class SessionMemoryRegistry:
+    """Process-wide table of the latest memory report from every session."""
+
+    def __init__(self, top_keys=10):
+        self.top_keys = top_keys
+        self._lock = threading.Lock()
+        self._sessions = {}        # session_id -> report dict
+        self._evict_requests = set()
+
+    def report(self, session_id, user, sizes):
+        top = sorted(sizes.items(), key=lambda kv: kv[1], reverse=True)[: self.top_keys]
+        with self._lock:
+            self._sessions[session_id] = {
+                "session": session_id,
+                "user": user,
+                "bytes": int(sum(sizes.values())),
+                "top": dict(top),
+                "updated": time.time(),
+            }
+
+    def sessions(self, max_age=3600):
+        """Reports newer than `max_age` seconds, largest first. Older ones are pruned."""
+        cutoff = time.time() - max_age
+        with self._lock:
+            for sid in [s for s, r in self._sessions.items() if r["updated"] < cutoff]:
+                del self._sessions[sid]
+                self._evict_requests.discard(sid)
+            reports = list(self._sessions.values())
+        return sorted(reports, key=lambda r: r["bytes"], reverse=True)
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(r["bytes"] for r in self._sessions.values())
+
+    def request_eviction(self, session_id):
+        """Ask a session to drop its evictable artifacts on its next run."""
+        with self._lock:
+            self._evict_requests.add(session_id)
+
+    def take_eviction(self, session_id):
+        with self._lock:
+            if session_id in self._evict_requests:
+                self._evict_requests.discard(session_id)
+                return True
+            return False
+
+    def enforce_process_cap(self, process_bytes, cap_bytes):
+        """
+        When the process is over `cap_bytes`, flag the largest sessions for eviction
+        until their reported usage covers the overshoot. Returns the flagged session ids.
+        """
+        overshoot = process_bytes - cap_bytes
+        flagged = []
+        if overshoot <= 0:
+            return flagged
+        for rep in self.sessions():
+            if overshoot <= 0:
+                break
+            self.request_eviction(rep["session"])
+            flagged.append(rep["session"])
+            overshoot -= rep["bytes"]
+        return flagged
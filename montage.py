@@ -0,0 +1,162 @@
+"""
+Contact-sheet montages: a dish's or a day's images composed into one JPEG.
+
+The Image Viewer's grid sends every image as its own element, each with its
+full-size payload. A montage is decoded, downscaled and pasted into a single
+pre-sized canvas on the server instead, optionally with each file name burned
+in under its tile, and sent as one compressed image: a day of 100 uploads is
+one transfer and one element for the browser to lay out.
+
+Montages are keyed by the content hashes of their images plus the layout, so
+re-running the viewer or another session uploading the same files reuses the
+cached JPEG; file names are part of the key only when they are burned in.
+JPEG decoding uses Pillow's draft mode, which lets the decoder scale down by
+up to 8× while decoding. Nothing here imports Streamlit; Pillow is imported
+when a montage is first composed.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+MONTAGE_WIDTH = 1600
+TILE_ASPECT = 3 / 4          # tile height / width when the first image can't be read
+CAPTION_HEIGHT = 22
+GAP = 4
+BACKGROUND = (24, 24, 24)
+CAPTION_COLOR = (235, 235, 235)
+JPEG_QUALITY = 85
+
+# Decoding threads per montage (Pillow releases the GIL while decoding and resizing)
+DECODE_WORKERS = 4
+# Total size of the cached JPEGs kept per process
+CACHE_BYTES = 64 * 1024 * 1024
+
+
+def content_hash(data: bytes) -> str:
+    """Hex digest identifying an image by its bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+@dataclass(frozen=True)
+class Montage:
+    """A composed JPEG, its pixel size and the number of images in it."""
+    jpeg: bytes
+    width: int
+    height: int
+    count: int
+
+
+def montage_key(hashes, names, columns, width, captions):
+    """Cache key of a montage: its images' content hashes and the layout (names only matter when burned in)."""
+    parts = [f"{columns}:{width}:{int(captions)}", *hashes]
+    if captions:
+        parts += names
+    return hashlib.blake2b("\n".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _tile(data, box):
+    """An image's bytes decoded and shrunk to fit `box` (w, h), as RGB, or None if unreadable."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        # JPEG only: decode at the smallest DCT scale that still covers the box
+        img.draft("RGB", box)
+        img = img.convert("RGB")
+        img.thumbnail(box, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        return img
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+
+
+def _tile_height(first, tile_w):
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        w, h = Image.open(io.BytesIO(first)).size
+        return max(1, round(tile_w * h / w))
+    except (UnidentifiedImageError, OSError, ValueError, ZeroDivisionError):
+        return max(1, round(tile_w * TILE_ASPECT))
+
+
+def _caption_font():
+    """Pillow's built-in font at caption size (Pillow ≥ 10.1), else its fixed-size bitmap font."""
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.load_default(size=CAPTION_HEIGHT - 8)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def compose(images, columns, width=MONTAGE_WIDTH, captions=True, quality=JPEG_QUALITY) -> Montage:
+    """
+    One JPEG of `images` ([(name, bytes)], in order) on a grid `columns` wide,
+    `width` pixels across. Tiles take the first image's aspect ratio; each
+    image is shrunk to fit its tile and centred. With `captions`, the file
+    name is drawn under each tile. Unreadable images leave an empty tile.
+    """
+    from PIL import Image, ImageDraw
+
+    # Tiles keep the size they have in a full row, as in the viewer's grid, even when there are fewer images
+    columns = max(1, int(columns))
+    tile_w = max(1, (width - GAP * (columns - 1)) // columns)
+    tile_h = _tile_height(images[0][1], tile_w) if images else 1
+    cell_h = tile_h + (CAPTION_HEIGHT if captions else 0)
+    rows = -(-len(images) // columns)
+    canvas = Image.new("RGB", (columns * tile_w + GAP * (columns - 1), max(1, rows * cell_h + GAP * (rows - 1))), BACKGROUND)
+
+    with ThreadPoolExecutor(max_workers=min(DECODE_WORKERS, max(1, len(images)))) as pool:
+        tiles = list(pool.map(lambda item: _tile(item[1], (tile_w, tile_h)), images))
+
+    draw = ImageDraw.Draw(canvas) if captions else None
+    font = _caption_font() if captions else None
+    for i, ((name, _), tile) in enumerate(zip(images, tiles)):
+        left = (i % columns) * (tile_w + GAP)
+        top = (i // columns) * (cell_h + GAP)
+        if tile is not None:
+            canvas.paste(tile, (left + (tile_w - tile.width) // 2, top + (tile_h - tile.height) // 2))
+        if draw is not None:
+            text = name
+            # Trim long names from the left: the day / dish suffix is the informative part
+            while len(text) > 4 and draw.textlength(text, font=font) > tile_w - 6:
+                text = "…" + text[2:]
+            draw.text((left + 3, top + tile_h + 3), text, fill=CAPTION_COLOR, font=font)
+
+    out = io.BytesIO()
+    canvas.save(out, format="JPEG", quality=quality, optimize=True)
+    return Montage(jpeg=out.getvalue(), width=canvas.width, height=canvas.height, count=len(images))
+
+
+class MontageCache:
+    """Composed montages by montage_key, least recently used dropped beyond `max_bytes`. Thread-safe."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._bytes = 0
+
+    def get(self, images, columns, width=MONTAGE_WIDTH, captions=True):
+        """(Montage of `images` as from compose, whether it came from the cache)."""
+        key = montage_key([content_hash(data) for _, data in images], [name for name, _ in images], columns, width, captions)
+        with self._lock:
+            found = self._items.get(key)
+            if found is not None:
+                self._items.move_to_end(key)
+                return found, True
+        montage = compose(images, columns, width, captions)
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = montage
+                self._bytes += len(montage.jpeg)
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, dropped = self._items.popitem(last=False)
+                self._bytes -= len(dropped.jpeg)
+        return montage, False
+
+    def nbytes(self):
+        return self._bytes
@@ -0,0 +1,272 @@
+"""
+Lightweight rerun timing.
+
+A RunTimer collects named wall-clock spans and Google Sheets API call counts
+for one script run; `end_run()` appends the result as one line of JSONL so p50 /
+p99 rerun latency can be tracked over time. A record's `run` says what ran:
+"full" for the whole script, "fragment" for a fragment rerun (views.fragment).
+
+The active timer is thread-local. Streamlit executes a session's script run in
+its own thread, so work done by background threads (snapshot refreshes) is not
+charged to whichever rerun happens to be in flight, and the helpers below are
+no-ops outside a run.
+
+`start_profile()` / `stop_profile()` additionally capture a full cProfile of
+one run in the same thread and save it as a standard .prof file.
+"""
+import cProfile
+import json
+import math
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+PERF_LOG = os.environ.get("DAN_PERF_LOG", "perf_log.jsonl")
+PROFILE_DIR = os.environ.get("DAN_PROFILE_DIR", "profiles")
+
+_local = threading.local()
+_listeners = []
+
+
+class RunTimer:
+    def __init__(self, **meta):
+        self.meta = dict(meta)
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._depth = 0
+        self.spans = []       # [{"name", "ms", "depth", ...attrs}], in completion order
+        self.api_calls = {}   # method name -> count
+
+    @contextmanager
+    def span(self, name, **attrs):
+        t0 = time.perf_counter()
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            ms = (time.perf_counter() - t0) * 1000
+            self.spans.append({"name": name, "ms": round(ms, 3), "depth": self._depth, **attrs})
+
+    def count_api(self, method, n=1):
+        self.api_calls[method] = self.api_calls.get(method, 0) + n
+
+    def api_total(self):
+        return sum(self.api_calls.values())
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self._t0) * 1000
+
+    def record(self):
+        return {
+            "ts": round(self.started_at, 3),
+            **self.meta,
+            "total_ms": round(self.elapsed_ms(), 3),
+            "api_calls": self.api_total(),
+            "api_by_method": dict(self.api_calls),
+            "spans": list(self.spans),
+        }
+
+
+def begin_run(**meta):
+    """Start timing a new script run in this thread, replacing any unfinished timer."""
+    stale = getattr(_local, "profiler", None)
+    if stale is not None:
+        # The previous run stopped early (st.stop) while being profiled
+        stale.disable()
+        _local.profiler = None
+    _local.timer = RunTimer(**meta)
+    return _local.timer
+
+
+def current():
+    return getattr(_local, "timer", None)
+
+
+def set_meta(**meta):
+    timer = current()
+    if timer is not None:
+        timer.meta.update(meta)
+
+
+def end_run(log_path=PERF_LOG):
+    """Finish the current run and append its record to `log_path` (skipped if falsy)."""
+    timer = current()
+    _local.timer = None
+    if timer is None:
+        return None
+    rec = timer.record()
+    for listener in list(_listeners):
+        listener(rec)
+    if log_path:
+        try:
+            append_jsonl(log_path, rec)
+        except OSError:
+            pass
+    return rec
+
+
+def add_listener(func):
+    """Call `func(record)` for every finished run in this process (used by loadtest.py)."""
+    _listeners.append(func)
+
+
+def remove_listener(func):
+    if func in _listeners:
+        _listeners.remove(func)
+
+
+@contextmanager
+def span(name, **attrs):
+    timer = current()
+    if timer is None:
+        yield
+    else:
+        with timer.span(name, **attrs):
+            yield
+
+
+def timed(name):
+    """Decorator form of `span`."""
+    def deco(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def count_api(method, n=1):
+    timer = current()
+    if timer is not None:
+        timer.count_api(method, n)
+
+
+class CountingWorksheet:
+    """
+    Transparent proxy around a gspread Worksheet that counts every method call
+    that reaches the Sheets API, charged to the current run.
+    """
+
+    API_METHODS = {
+        "get_all_values", "get_all_records", "get_values", "get", "batch_get",
+        "append_row", "append_rows", "update", "batch_update", "clear",
+        "delete_rows", "insert_row", "insert_rows", "update_cell", "cell", "row_values",
+        "col_values", "add_rows", "add_cols", "resize",
+    }
+
+    def __init__(self, ws):
+        object.__setattr__(self, "_ws", ws)
+
+    def __getattr__(self, name):
+        attr = getattr(self._ws, name)
+        if name in self.API_METHODS and callable(attr):
+            @wraps(attr)
+            def counted(*args, **kwargs):
+                count_api(name)
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+    def __repr__(self):
+        return f"CountingWorksheet({self._ws!r})"
+
+
+# ---------------------- PROFILING ----------------------
+
+def start_profile():
+    """Profile the rest of the current run. cProfile only sees the calling thread."""
+    prof = cProfile.Profile()
+    _local.profiler = prof
+    prof.enable()
+    return prof
+
+
+def stop_profile(directory=PROFILE_DIR, label="run"):
+    """
+    Stop the profiler started by `start_profile` and dump it as a pstats .prof file,
+    which snakeviz, tuna, gprof2dot or `python -m pstats` can open.
+    Returns the file path, or None if this run was not being profiled.
+    """
+    prof = getattr(_local, "profiler", None)
+    _local.profiler = None
+    if prof is None:
+        return None
+    prof.disable()
+    os.makedirs(directory, exist_ok=True)
+    safe_label = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(label))
+    path = os.path.join(directory, f"{safe_label}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+    prof.dump_stats(path)
+    return path
+
+
+def top_functions(path, n=25, sort="cumulative"):
+    """The `n` hottest functions of a saved profile as rows for a table."""
+    stats = pstats.Stats(path)
+    stats.sort_stats(sort)
+    rows = []
+    for func in stats.fcn_list[:n]:
+        _, ncalls, tottime, cumtime, _ = stats.stats[func]
+        filename, line, name = func
+        rows.append({
+            "function": name,
+            "location": f"{os.path.basename(filename)}:{line}",
+            "calls": ncalls,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3),
+        })
+    return rows
+
+
+# ---------------------- LOG ANALYSIS ----------------------
+
+def append_jsonl(path, record):
+    line = json.dumps(record, default=str, ensure_ascii=False)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def read_log(path=PERF_LOG, limit=None):
+    """Parsed records from a JSONL log (the last `limit` lines if given); bad lines are skipped."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return []
+    if limit:
+        lines = lines[-limit:]
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+
+def percentile(values, q):
+    """Nearest-rank percentile, q in [0, 100]. None for an empty input."""
+    vals = sorted(values)
+    if not vals:
+        return None
+    rank = max(1, min(len(vals), math.ceil(q / 100 * len(vals))))
+    return vals[rank - 1]
+
+
+def summarize(records, run=None):
+    """p50 / p99 rerun latency and mean API calls per run over `records` (only runs of kind `run` if given)."""
+    if run is not None:
+        records = [r for r in records if r.get("run", "full") == run]
+    totals = [r["total_ms"] for r in records if "total_ms" in r]
+    calls = [r.get("api_calls", 0) for r in records]
+    return {
+        "runs": len(totals),
+        "p50_ms": percentile(totals, 50),
+        "p99_ms": percentile(totals, 99),
+        "api_calls_mean": (sum(calls) / len(calls)) if calls else None,
+    }
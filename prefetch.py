@@ -0,0 +1,132 @@
+"""
+Background cache warming.
+
+After login, the views a user has not opened yet still need their data: the
+cell_counts sheet, the lookup indexes, the parsed protocol workbook and the
+view modules themselves. A Prefetcher runs such warm-up tasks one at a time on
+a daemon thread. The app submits them once a rerun has finished drawing, so
+they use the idle time while the user looks at the page, and the first click
+on another tab renders from warm caches.
+
+Sheets calls are metered by a TokenBucket shared with the foreground: every
+finished rerun's API calls are charged to it (Prefetcher.charge is a perf
+listener), and a task that needs the API waits until the bucket has room. The
+warm-up therefore never pushes the process past its Sheets quota.
+"""
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """`rate_per_minute` tokens per minute, holding at most `burst`."""
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else max(1.0, rate_per_minute / 6))
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def tokens(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def spend(self, n):
+        """Charge calls that were made anyway (foreground reruns). The balance may go negative."""
+        with self._lock:
+            self._refill()
+            self._tokens -= n
+
+    def take(self, n, timeout=None):
+        """
+        Wait until `n` tokens are available and take them. False on timeout.
+        A cost above the capacity waits for a full bucket and leaves it in debt.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        need = min(n, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= need:
+                    self._tokens -= n
+                    return True
+                wait = (need - self._tokens) / self.rate if self.rate > 0 else 1.0
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(min(wait, 1.0))
+
+
+class Prefetcher:
+    """
+    FIFO of warm-up tasks run on one daemon thread. A task is keyed: submitting a
+    key that is already queued or running is a no-op. Tasks must be idempotent
+    and cheap when their cache is already warm, since the app resubmits them.
+    """
+
+    def __init__(self, bucket, api_timeout=120):
+        self.bucket = bucket
+        self.api_timeout = api_timeout
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._queue = deque()      # (key, func, api_cost)
+        self._queued = set()
+        self._running = None
+        self._thread = None
+        self.stats = {"done": 0, "failed": 0, "skipped": 0}
+        self.last_error = None
+
+    def submit(self, key, func, api_cost=0):
+        with self._lock:
+            if key in self._queued or key == self._running:
+                return False
+            self._queue.append((key, func, api_cost))
+            self._queued.add(key)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name="prefetch", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        return True
+
+    def pending(self):
+        with self._lock:
+            keys = [k for k, _, _ in self._queue]
+            return ([self._running] if self._running else []) + keys
+
+    def charge(self, record):
+        """perf listener: foreground API calls count against the same budget."""
+        self.bucket.spend(record.get("api_calls", 0))
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._queue:
+                    # Nothing to do for a while: let the thread go, submit() restarts it
+                    if not self._wake.wait(timeout=60) and not self._queue:
+                        self._thread = None
+                        return
+                key, func, api_cost = self._queue.popleft()
+                self._queued.discard(key)
+                self._running = key
+            try:
+                if api_cost and not self.bucket.take(api_cost, timeout=self.api_timeout):
+                    self.stats["skipped"] += 1
+                    continue
+                func()
+                self.stats["done"] += 1
+            except Exception as e:
+                # A failed warm-up only means the view fetches on click, as before
+                self.stats["failed"] += 1
+                self.last_error = f"{key}: {type(e).__name__}: {e}"
+            finally:
+                with self._lock:
+                    self._running = None
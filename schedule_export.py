@@ -0,0 +1,133 @@
+"""
+Export every protocol task of every batch over a date range as CSV, iCalendar
+or a styled Excel workbook (calendar, tasks and compositions; see core.workbook).
+
+Runs without Streamlit or Google credentials. Batches come from a CSV export of
+the `info` worksheet (File → Download → CSV; dates as YYYY.MM.DD), or are
+generated with --synthetic to measure throughput. Each batch follows the
+protocol version in its `protocol` column (see core.registry).
+
+    python schedule_export.py --batches info.csv --from 2026-01-01 --to 2026-12-31 --out tasks.csv
+    python schedule_export.py --batches info.csv --user alice --out alice.ics
+    python schedule_export.py --batches info.csv --user alice --out alice.xlsx
+    python schedule_export.py --synthetic 5000 --out /dev/null --format csv
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from core.registry import PROTOCOL_DIR, ProtocolRegistry
+from core.schedule import SCHEDULE_COLUMNS, build_schedule, write_csv, write_ical
+from core.workbook import write_workbook
+from sheets import decode_sheet
+
+PROTOCOL_FILE = "DAP_protocol_extended.xlsx"
+
+# Output file extension -> format
+FORMATS = {".ics": "ics", ".ical": "ics", ".xlsx": "xlsx", ".csv": "csv"}
+
+
+def read_batches(path):
+    """Typed batches from a CSV export of the info worksheet (same decoding as the app)."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.reader(f))
+    return decode_sheet("info", rows)
+
+
+def synthetic_batches(n, first, last, seed=0):
+    """`n` batches over a handful of users, starting uniformly between `first` and `last`."""
+    rng = np.random.default_rng(seed)
+    span = max((last - first).days, 1)
+    starts = np.datetime64(first, "D") + rng.integers(0, span + 1, n).astype("timedelta64[D]")
+    return pd.DataFrame({
+        "username": [f"user{i % 25}" for i in range(n)],
+        "batch_id": np.arange(1, n + 1),
+        "cell": rng.choice(["H9", "KOLF2.1J", "PD-iPSC"], n),
+        "start_date": starts,
+        "end_date": starts + np.timedelta64(21, "D"),
+    })
+
+
+def versioned_schedule(batches, registry, start, end):
+    """build_schedule for batches on any mix of protocol versions, sorted by date."""
+    parts = [build_schedule(group, protocol.days, start, end, protocol.tasks())
+             for protocol, group in registry.groups(batches)]
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return pd.DataFrame(columns=SCHEDULE_COLUMNS)
+    schedule = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+    return schedule.sort_values(["date", "username", "batch_id", "task_no"], kind="stable").reset_index(drop=True)
+
+
+def _date(text):
+    return date.fromisoformat(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--batches", help="CSV export of the info worksheet")
+    source.add_argument("--synthetic", type=int, metavar="N", help="generate N batches instead")
+    parser.add_argument("--user", help="only this user's batches")
+    parser.add_argument("--from", dest="start", type=_date, default=date.today(), help="first date (YYYY-MM-DD, default today)")
+    parser.add_argument("--to", dest="end", type=_date, help="last date (default: one year after --from)")
+    parser.add_argument("--protocol", default=PROTOCOL_FILE, help="default protocol workbook")
+    parser.add_argument("--protocol-dir", default=PROTOCOL_DIR, help="workbooks of the other protocol versions")
+    parser.add_argument("--format", choices=["csv", "ics", "xlsx"], help="default: from the --out extension, else csv")
+    parser.add_argument("--out", default="-", help="output file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    end = args.end or args.start + timedelta(days=365)
+    fmt = args.format or FORMATS.get(os.path.splitext(args.out.lower())[1], "csv")
+
+    t0 = time.perf_counter()
+    registry = ProtocolRegistry(args.protocol, args.protocol_dir)
+    registry.get()  # compile the default version here, so it counts as load time
+    if args.batches:
+        batches = read_batches(args.batches)
+    else:
+        # spread over the range and the three weeks before it, so batches already running are included
+        batches = synthetic_batches(args.synthetic, args.start - timedelta(days=21), end)
+    if args.user:
+        batches = batches[batches["username"].astype(str) == args.user]
+    t1 = time.perf_counter()
+    missing = registry.missing(registry.versions_of(batches))
+    if missing:
+        print(f"No workbook for protocol version(s) {', '.join(missing)}: their batches are left out", file=sys.stderr)
+    if fmt == "xlsx":
+        # The workbook builds the schedule a month at a time while it writes
+        write_workbook(sys.stdout.buffer if args.out == "-" else args.out, batches, registry, args.start, end, today=date.today())
+        print(
+            f"{len(batches)} batches, {args.start} to {end} (load {(t1 - t0) * 1000:.0f} ms, "
+            f"write xlsx {(time.perf_counter() - t1) * 1000:.0f} ms)",
+            file=sys.stderr,
+        )
+        return 0
+    schedule = versioned_schedule(batches, registry, args.start, end)
+    t2 = time.perf_counter()
+
+    writer = write_ical if fmt == "ics" else write_csv
+    if args.out == "-":
+        writer(schedule, sys.stdout)
+    else:
+        with open(args.out, "w", encoding="utf-8", newline="") as f:
+            writer(schedule, f)
+    t3 = time.perf_counter()
+
+    print(
+        f"{len(schedule)} tasks for {len(batches)} batches, {args.start} to {end} "
+        f"(load {(t1 - t0) * 1000:.0f} ms, schedule {(t2 - t1) * 1000:.0f} ms, "
+        f"write {fmt} {(t3 - t2) * 1000:.0f} ms)",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Typed decoding of Google Sheets worksheets.
+
+`ws.get_all_values()` returns a worksheet as a plain list of rows (header first,
+every cell a string). Instead of building one dict per row with
+`get_all_records()` and letting pandas infer types, the rows are transposed once
+and every column is converted straight into a typed array using the schemas
+declared below.
+"""
+import numpy as np
+import pandas as pd
+
+from core.rules import COUNT_COLUMNS, COUNT_PHASES
+
+DATE_FORMAT = "%Y.%m.%d"
+
+# Column name -> kind. Kinds: "string", "category", "int" (nullable Int64), "date".
+# Columns present in the sheet but missing from a schema are decoded as "string".
+ACCOUNTS_SCHEMA = {
+    "username": "string",
+    "password": "string",
+}
+
+INFO_SCHEMA = {
+    "username": "category",
+    "batch_id": "int",
+    "cell": "category",
+    "start_date": "date",
+    "note": "string",
+    # Free text as typed in the Batch Manager; analytics parse them (core.counts.plate_counts)
+    "initial_plate_count": "string",
+    "replaced_plate_count": "string",
+    "end_date": "date",
+    # Protocol version the batch follows (see core.registry); blank = the default workbook
+    "protocol": "category",
+}
+
+CELL_COUNTS_SCHEMA = {
+    "username": "category",
+    "batch_id": "int",
+    "phase": "string",
+    **{c: "string" for c in COUNT_COLUMNS},
+}
+
+SCHEMAS = {
+    "accounts": ACCOUNTS_SCHEMA,
+    "info": INFO_SCHEMA,
+    "cell_counts": CELL_COUNTS_SCHEMA,
+    # Finished batches (see archive.py), same layout as their hot sheets
+    "info_archive": INFO_SCHEMA,
+    "cell_counts_archive": CELL_COUNTS_SCHEMA,
+}
+
+# Header cells renamed by position. The phase column of cell_counts has never
+# had a fixed header; the app has always read it as "the third column".
+POSITIONAL_NAMES = {
+    "cell_counts": {2: "phase"},
+    "cell_counts_archive": {2: "phase"},
+}
+
+
+def _as_string(col):
+    return pd.array(col, dtype="string")
+
+
+def _as_category(col):
+    # Category columns are lookup keys; stray whitespace would split them
+    return pd.Categorical([str(v).strip() for v in col])
+
+
+def _as_int(col):
+    vals = pd.to_numeric(pd.Series(col, dtype=object).str.strip(), errors="coerce").astype("float64")
+    # Anything that is not a whole number (e.g. "2.5", "n/a") is treated as missing
+    vals[vals != np.floor(vals)] = np.nan
+    return vals.astype("Int64").array
+
+
+def _as_date(col):
+    return pd.to_datetime(pd.Series(col, dtype=object), format=DATE_FORMAT, errors="coerce").array
+
+
+_DECODERS = {
+    "string": _as_string,
+    "category": _as_category,
+    "int": _as_int,
+    "date": _as_date,
+}
+
+
+def decode_values(values, schema, positional_names=None) -> pd.DataFrame:
+    """
+    Build a typed DataFrame from `get_all_values()` output.
+    Schema columns missing from the sheet are added empty, so callers can rely on them.
+    """
+    header = [str(h).strip() for h in values[0]] if values else []
+    for pos, name in (positional_names or {}).items():
+        if pos < len(header):
+            header[pos] = name
+    rows = values[1:] if values else []
+    width = len(header)
+    # get_all_values() pads rows to the sheet width; guard against ragged input anyway
+    rows = [r if len(r) == width else (list(r) + [""] * width)[:width] for r in rows]
+    columns = list(zip(*rows)) if rows else [()] * width
+
+    data = {}
+    for name, col in zip(header, columns):
+        if not name or name in data:
+            continue  # unnamed or duplicated header cell
+        data[name] = _DECODERS[schema.get(name, "string")](list(col))
+    for name, kind in schema.items():
+        if name not in data:
+            data[name] = _DECODERS[kind]([""] * len(rows))
+
+    order = list(schema) + [c for c in data if c not in schema]
+    return pd.DataFrame({c: data[c] for c in order})
+
+
+def decode_sheet(name, values) -> pd.DataFrame:
+    """Decode the worksheet `name` (a key of SCHEMAS)."""
+    return decode_values(values, SCHEMAS[name], POSITIONAL_NAMES.get(name))
+
+
+# Lookup keys for build_index()
+INFO_KEY = ("username", "batch_id")
+COUNTS_KEY = ("username", "batch_id", "phase")
+
+
+def build_index(df: pd.DataFrame, keys) -> dict:
+    """
+    Hash index from key tuples to row positions, e.g. ("alice", 12) -> 3.
+    Keys are plain Python values (str / int); rows with a missing key part are left out.
+    When a key repeats, the first row wins, matching the old `rec.iloc[0]` lookups.
+    """
+    parts = []
+    for k in keys:
+        col = df[k]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            col = col.astype(object)
+        parts.append(col.tolist())
+    index = {}
+    for pos, key in enumerate(zip(*parts)):
+        if any(v is pd.NA or v is None or v != v for v in key):
+            continue
+        index.setdefault(key, pos)
+    return index
+
+
+def ensure_header(ws, name, col):
+    """
+    Make header cell `col` (1-based) of worksheet `ws` read `name`, widening the
+    sheet if needed. Rows are written by position, so a different header already
+    in that cell is an error. Returns True when the cell was written.
+    """
+    header = [str(h).strip() for h in ws.row_values(1)]
+    if col <= len(header) and header[col - 1]:
+        if header[col - 1] != name:
+            raise ValueError(f"column {col} of '{ws.title}' is '{header[col - 1]}', expected '{name}'")
+        return False
+    if ws.col_count < col:
+        ws.add_cols(col - ws.col_count)
+    ws.update_cell(1, col, name)
+    return True
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Actual memory held by `df`, including string payloads and category tables."""
+    return int(df.memory_usage(index=True, deep=True).sum())
@@ -0,0 +1,241 @@
+"""
+Local columnar snapshots of the Google Sheets worksheets.
+
+Every worksheet the app reads (info, cell_counts and their archives) is kept
+as an Arrow IPC / Feather v2 file under SNAPSHOT_DIR. On a cold start the last
+good copy is memory-mapped straight from disk, so the first page renders
+without waiting for the Sheets API; a background thread then fetches the fresh
+copy, rewrites the snapshot and swaps it in. Sheets in MEMORY_ONLY (accounts,
+which holds passwords) are cached in memory but never written to disk.
+"""
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+SNAPSHOT_DIR = os.environ.get("DAN_SNAPSHOT_DIR", ".snapshots")
+
+# Sheets never persisted: their first read after a restart always goes to the API
+MEMORY_ONLY = frozenset({"accounts"})
+
+
+def snapshot_path(name, directory=SNAPSHOT_DIR):
+    return os.path.join(directory, f"{name}.arrow")
+
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast object columns holding mixed Python types (e.g. ints and '') to str."""
+    out = df.reset_index(drop=True)
+    out.columns = [str(c) for c in out.columns]
+    for col in out.columns:
+        if out[col].dtype == object:
+            kinds = {type(v) for v in out[col].dropna()}
+            if len(kinds) > 1:
+                out[col] = out[col].astype(str)
+    return out
+
+
+def save_snapshot(name, df: pd.DataFrame, directory=SNAPSHOT_DIR):
+    """Atomically write `df` as an uncompressed Feather file (uncompressed so it can be memory-mapped)."""
+    os.makedirs(directory, exist_ok=True)
+    path = snapshot_path(name, directory)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    table = pa.Table.from_pandas(_arrow_safe(df), preserve_index=False)
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+
+
+def load_snapshot(name, directory=SNAPSHOT_DIR):
+    """Memory-map the snapshot for `name`. Returns (df, mtime) or (None, None) if missing/unreadable."""
+    path = snapshot_path(name, directory)
+    try:
+        table = feather.read_table(path, memory_map=True)
+        return table.to_pandas(), os.path.getmtime(path)
+    except (FileNotFoundError, pa.ArrowInvalid, OSError):
+        return None, None
+
+
+def _same_frames(a, b):
+    if isinstance(b, tuple):
+        return isinstance(a, tuple) and len(a) == len(b) and all(x is y for x, y in zip(a, b))
+    return a is b
+
+
+class SnapshotStore:
+    """
+    Stale-while-revalidate cache of worksheet DataFrames backed by on-disk snapshots.
+
+    `get(name, fetch)` returns immediately from memory or from the snapshot on disk
+    and refreshes in a background thread once the copy is older than `ttl` seconds.
+    Only when neither exists (very first run) does it call `fetch` synchronously.
+    Sheets in `memory_only` skip the disk both ways.
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR, ttl=300, memory_only=MEMORY_ONLY):
+        self.directory = directory
+        self.ttl = ttl
+        self.memory_only = frozenset(memory_only)
+        self._lock = threading.Lock()
+        self._frames = {}      # name -> (df, fetched_at)
+        self._refreshing = {}  # name -> Thread
+        self._generation = {}  # name -> bumped on invalidate, so late background fetches are dropped
+        self._updates = 0      # background refreshes that swapped in a fresh frame
+        self._derived = {}     # (name, key) -> (frame it was built from, value)
+
+    def _load(self, name):
+        """The on-disk snapshot of `name`, as load_snapshot; never read for memory-only sheets."""
+        if name in self.memory_only:
+            # A copy written before the sheet was made memory-only must not linger
+            try:
+                os.remove(snapshot_path(name, self.directory))
+            except FileNotFoundError:
+                pass
+            return None, None
+        return load_snapshot(name, self.directory)
+
+    @property
+    def background_updates(self):
+        return self._updates
+
+    def get(self, name, fetch):
+        with self._lock:
+            entry = self._frames.get(name)
+        if entry is None:
+            df, mtime = self._load(name)
+            if df is None:
+                # A background warm-up may already be fetching it: wait instead of fetching twice
+                running = self._running(name)
+                if running is not None:
+                    running.join()
+                    with self._lock:
+                        entry = self._frames.get(name)
+                    if entry is not None:
+                        return entry[0]
+                return self.refresh(name, fetch)
+            entry = (df, mtime)
+            with self._lock:
+                self._frames.setdefault(name, entry)
+        df, fetched_at = entry
+        if time.time() - fetched_at > self.ttl:
+            self.refresh_async(name, fetch)
+        return df
+
+    def derived(self, name, df, key, build):
+        """
+        Memoise `build(df)` (an index, say) next to the cached frame. It is rebuilt
+        only when `name` has been replaced by a different frame object. For a value
+        built from several sheets, `name` and `df` are tuples: rebuilt when any changes.
+        """
+        with self._lock:
+            hit = self._derived.get((name, key))
+        if hit is not None and _same_frames(hit[0], df):
+            return hit[1]
+        value = build(df)
+        with self._lock:
+            self._derived[(name, key)] = (df, value)
+        return value
+
+    def refresh(self, name, fetch, generation=None):
+        """Fetch synchronously, persist the snapshot and swap it in. Returns the fetched frame."""
+        df = fetch()
+        with self._lock:
+            if generation is not None and generation != self._generation.get(name, 0):
+                return df
+            self._frames[name] = (df, time.time())
+        if name in self.memory_only:
+            return df
+        try:
+            save_snapshot(name, df, self.directory)
+        except (OSError, pa.ArrowException):
+            # A failed snapshot write only costs the next cold start; keep serving.
+            pass
+        return df
+
+    def has(self, name):
+        """True if `name` can be served without a Sheets call (in memory or on disk)."""
+        with self._lock:
+            if name in self._frames:
+                return True
+        return name not in self.memory_only and os.path.exists(snapshot_path(name, self.directory))
+
+    def warm(self, name, fetch):
+        """
+        Make sure `name` is in memory: load the snapshot, or else fetch it in the
+        background. Returns the fetch thread, or None when no fetch was needed.
+        Warm-ups do not count as background_updates, as nothing on screen is stale.
+        """
+        with self._lock:
+            if name in self._frames:
+                return None
+        df, mtime = self._load(name)
+        if df is not None:
+            with self._lock:
+                self._frames.setdefault(name, (df, mtime))
+            return None
+        return self.refresh_async(name, fetch, notify=False)
+
+    def _current(self, name, thread):
+        """True if `thread` is a live fetch whose result will be kept (no invalidate since it started)."""
+        return thread is not None and thread.is_alive() and thread.generation == self._generation.get(name, 0)
+
+    def _running(self, name):
+        with self._lock:
+            thread = self._refreshing.get(name)
+            return thread if self._current(name, thread) else None
+
+    def refresh_async(self, name, fetch, notify=True):
+        with self._lock:
+            running = self._refreshing.get(name)
+            if self._current(name, running):
+                return running
+            # A fetch from before an invalidate is left to finish; its result is dropped
+            generation = self._generation.get(name, 0)
+            thread = threading.Thread(
+                target=self._refresh_quietly, args=(name, fetch, generation, notify),
+                name=f"snapshot-refresh-{name}", daemon=True,
+            )
+            thread.notify = notify
+            thread.generation = generation
+            self._refreshing[name] = thread
+        thread.start()
+        return thread
+
+    def _refresh_quietly(self, name, fetch, generation, notify=True):
+        try:
+            self.refresh(name, fetch, generation)
+            with self._lock:
+                if notify and generation == self._generation.get(name, 0):
+                    self._updates += 1
+        except Exception:
+            # Keep serving the last good copy; the next stale read retries.
+            pass
+
+    def invalidate(self, name):
+        """Drop the in-memory copy after a write so the next `get` re-reads the sheet."""
+        with self._lock:
+            self._frames.pop(name, None)
+            for key in [k for k in self._derived if k[0] == name]:
+                del self._derived[key]
+            self._generation[name] = self._generation.get(name, 0) + 1
+        try:
+            os.remove(snapshot_path(name, self.directory))
+        except FileNotFoundError:
+            pass
+
+    def pending(self):
+        """
+        In-flight background refreshes whose result will be kept (warm-ups excluded:
+        nothing is waiting on them).
+        """
+        with self._lock:
+            return [t for name, t in self._refreshing.items() if self._current(name, t) and t.notify]
+
+    def wait(self, timeout=None):
+        """Block until in-flight background refreshes finish (or `timeout` seconds pass)."""
+        deadline = None if timeout is None else time.time() + timeout
+        for thread in self.pending():
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            thread.join(remaining)
@@ -0,0 +1,51 @@
+"""Shared fixtures. Tests import the app's modules from the repository root."""
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Snapshots, the perf log and profiles of app runs (see test_app.py) stay out of
+# the checkout; snapshot.py and perf.py read these when first imported
+_SCRATCH = tempfile.mkdtemp(prefix="dan-tests-")
+os.environ.setdefault("DAN_SNAPSHOT_DIR", os.path.join(_SCRATCH, "snapshots"))
+os.environ.setdefault("DAN_PROFILE_DIR", os.path.join(_SCRATCH, "profiles"))
+os.environ.setdefault("DAN_PERF_LOG", "")
+
+PROTOCOL_FILE = os.path.join(ROOT, "DAP_protocol_extended.xlsx")
+
+
+@pytest.fixture(scope="session")
+def protocol_rows():
+    """Rows of the default protocol workbook."""
+    return pd.read_excel(PROTOCOL_FILE, engine="openpyxl")
+
+
+@pytest.fixture(scope="session")
+def registry():
+    """The default workbook only: no variant directory."""
+    from core.registry import ProtocolRegistry
+
+    return ProtocolRegistry(PROTOCOL_FILE, directory=os.path.join(ROOT, "no-such-protocols"))
+
+
+@pytest.fixture
+def batches():
+    """Info rows spanning the awkward cases: running, finished early, not started, no start date."""
+    return pd.DataFrame({
+        "username": ["ann", "ann", "bob", "bob", "cid", "cid"],
+        "batch_id": pd.array([3, 1, 2, 7, 5, 9], dtype="Int64"),
+        "cell": ["H9", "H9", "iPSC", "iPSC", "H1", "H1"],
+        "start_date": pd.to_datetime(["2026-03-01", "2026-03-10", "2026-02-20", "2026-03-25", None, "2026-03-15"]),
+        "end_date": pd.to_datetime([None, "2026-03-18", None, None, None, "2026-03-15"]),
+    })
+
+
+@pytest.fixture
+def today():
+    return date(2026, 3, 14)
@@ -0,0 +1,138 @@
+"""The whole app driven headlessly (Streamlit AppTest) against the in-process fake Sheets backend."""
+import os
+import shutil
+import sys
+import time
+from datetime import date, timedelta
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import common
+import fake_sheets
+import perf
+import snapshot
+import views
+from conftest import ROOT
+from sheets import DATE_FORMAT
+
+APP = os.path.join(ROOT, "streamlit_app.py")
+VIEWS = ["Calendar", "Tasks", "Batch Manager", "Image Viewer", "History", "Reagents", "Cell Counts"]
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """A fresh fake spreadsheet with one account, "ann" / "pw", and no batches."""
+    monkeypatch.setenv("DAN_FAKE_SHEETS", "1")
+    # The app opens the protocol workbook and scheme.png relative to the repository
+    monkeypatch.chdir(ROOT)
+    st.cache_resource.clear()
+    shutil.rmtree(snapshot.SNAPSHOT_DIR, ignore_errors=True)
+    sheets = fake_sheets.reset_shared()
+    sheets.worksheet("accounts").append_row(["ann", "pw"])
+    yield sheets
+    st.cache_resource.clear()
+
+
+def add_batch(sheets, batch_id, start, username="ann"):
+    sheets.worksheet("info").append_row(
+        [username, batch_id, "H9", start.strftime(DATE_FORMAT), "", 2, "", ""]
+    )
+
+
+def login(username="ann", **query_params):
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.secrets["SHEET_ID"] = "fake"
+    at.secrets["GSPREAD_CRED"] = {"type": "service_account"}
+    at.secrets["GID_ACCOUNTS"] = fake_sheets.ACCOUNTS_GID
+    at.secrets["ADMIN_TOKEN"] = "admin-token"
+    # The fake backend has no quota: do not let the prefetcher wait for API budget
+    at.secrets["PREFETCH_API_PER_MINUTE"] = 6000
+    for key, value in query_params.items():
+        at.query_params[key] = value
+    at.run()
+    at.text_input(key="top_login_user").input(username)
+    at.text_input(key="top_login_pass").input("pw")
+    click(at, "Login")
+    assert not at.exception
+    return at
+
+
+def click(at, label):
+    next(b for b in at.button if b.label == label).click().run()
+
+
+def test_every_view_renders(backend):
+    today = date.today()
+    for batch_id, days_ago in ((1, 3), (2, 16), (3, 30)):
+        add_batch(backend, batch_id, today - timedelta(days=days_ago))
+    at = login()
+    for view in VIEWS:
+        click(at, view)
+        assert not at.exception, view
+        assert at.session_state["view"] == view
+
+
+def test_widget_inside_a_view_fragment(backend):
+    add_batch(backend, 1, date.today())
+    at = login()
+    click(at, "Tasks")
+    # Day 0's tasks carry compositions: each has its own nested volume fragment
+    volume = next(n for n in at.number_input if n.key.startswith("vol_"))
+    volume.set_value(30.0).run()
+    assert not at.exception
+    assert next(n for n in at.number_input if n.key == volume.key).value == 30.0
+    at.date_input(key="task_date").set_value(date.today() + timedelta(days=1)).run()
+    assert not at.exception and any("D1 ·" in m.value for m in at.markdown)
+
+
+def _profiles():
+    return set(os.listdir(perf.PROFILE_DIR)) if os.path.isdir(perf.PROFILE_DIR) else set()
+
+
+def test_profile_needs_the_admin_token(backend):
+    before = _profiles()
+    at = login(profile="wrong")
+    assert _profiles() == before
+
+    at = login()
+    at.query_params["profile"] = "admin-token"
+    click(at, "Tasks")
+    new = _profiles() - before
+    assert len(new) == 1 and new.pop().startswith("ann-Tasks-")
+    assert "profile" not in at.query_params  # one-shot: the next rerun is not profiled
+    at.run()
+    assert len(_profiles() - before) == 1
+
+
+def test_prefetch_warms_the_views_not_opened_yet(backend):
+    add_batch(backend, 1, date.today() - timedelta(days=16))
+    backend.worksheet("cell_counts").append_row(["ann", 1, "Day 15", "2e5"])
+    at = login()
+    prefetcher = common.get_prefetcher()
+    deadline = time.monotonic() + 30
+    while prefetcher.pending() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not prefetcher.pending() and prefetcher.stats["failed"] == 0, prefetcher.last_error
+    assert all(m in sys.modules for m in views.VIEWS.values() if m != "views.admin")
+    calls = backend.calls
+    for view in ("Cell Counts", "History", "Image Viewer"):
+        click(at, view)
+        assert not at.exception, view
+    assert backend.calls == calls  # drawn from warm caches, no Sheets call
+
+
+def test_tasks_draw_each_protocol_day_once(backend):
+    today = date.today()
+    for batch_id, days_ago in ((2, 2), (1, 2), (3, 4), (4, 40)):  # batch 4 is past the protocol
+        add_batch(backend, batch_id, today - timedelta(days=days_ago))
+    at = login()
+    click(at, "Tasks")
+    assert not at.exception
+    days = [m.value for m in at.markdown if m.value.startswith("### 🧪")]
+    assert [d.split(" ·")[0] for d in days] == ["### 🧪 D2", "### 🧪 D4"]
+    assert [m.value for m in at.markdown if m.value.startswith("**Batch")] == ["**Batches:** 1, 2", "**Batch:** 3"]
+    # One volume input per task of a day, not per batch
+    keys = [n.key for n in at.number_input if n.key.startswith("vol_")]
+    assert keys and len(keys) == len(set(keys)) and all("_d2_" in k or "_d4_" in k for k in keys)
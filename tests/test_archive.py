@@ -0,0 +1,132 @@
+"""Archive moves and row deletion on the in-process fake Sheets backend, including rows shifted by other writers."""
+from datetime import date
+
+import pytest
+
+from archive import (
+    ARCHIVES, SheetChangedError, archive_finished, delete_batch, delete_where, ensure_archive, key_selector,
+    row_ranges,
+)
+from fake_sheets import COUNTS_HEADER, INFO_HEADER, FakeSpreadsheet
+
+TODAY = date(2026, 3, 30)
+
+
+def _info(user, bid, start, end=""):
+    return [user, str(bid), "H9", start, "", "1", "0", end]
+
+
+def _counts(user, bid, phase="Day 15"):
+    return [user, str(bid), phase, "100000"] + [""] * (len(COUNTS_HEADER) - 4)
+
+
+@pytest.fixture
+def book():
+    sh = FakeSpreadsheet()
+    sh._sheets["info"]._rows += [
+        _info("ann", 1, "2026.01.05"),          # finished
+        _info("bob", 1, "2026.03.20"),          # running
+        _info("ann", 2, "2026.03.01", "2026.03.05"),  # ended early
+        _info("cid", 4, "2026.03.25"),
+        _info("ann", 3, "2026.03.28"),
+    ]
+    sh._sheets["cell_counts"]._rows += [_counts("ann", 1), _counts("bob", 1), _counts("ann", 1, "Day 21"), _counts("ann", 2)]
+    return sh
+
+
+def _sheets(sh):
+    hot = {name: sh._sheets[name] for name in ("info", "cell_counts")}
+    return {**hot, **{title: ensure_archive(sh, hot[name], title) for name, title in ARCHIVES.items()}}
+
+
+def _keys(ws):
+    return [(r[0], r[1]) for r in ws._rows[1:]]
+
+
+def test_row_ranges_bottom_up():
+    assert row_ranges([2, 3, 4, 7, 9, 10]) == [(9, 10), (7, 7), (2, 4)]
+    assert row_ranges([]) == []
+
+
+def test_archive_finished_moves_batches_and_counts(book):
+    ws = _sheets(book)
+    moved = archive_finished(ws, TODAY)
+    assert moved == {"info": 2, "cell_counts": 3}
+    assert _keys(ws["info"]) == [("bob", "1"), ("cid", "4"), ("ann", "3")]
+    assert _keys(ws["info_archive"]) == [("ann", "1"), ("ann", "2")]
+    assert _keys(ws["cell_counts"]) == [("bob", "1")]
+    assert ws["info_archive"]._rows[0] == INFO_HEADER
+    assert archive_finished(ws, TODAY) == {"info": 0, "cell_counts": 0}
+
+
+def test_delete_batch_only_touches_its_rows(book):
+    ws = book._sheets["cell_counts"]
+    assert delete_batch(ws, "cell_counts", "ann", 1) == 2
+    assert _keys(ws) == [("bob", "1"), ("ann", "2")]
+    assert delete_batch(ws, "cell_counts", "ann", 99) == 0
+
+
+class _ShiftingSheet:
+    """Wraps a fake worksheet; another writer deletes `victim` rows right after the first full read."""
+
+    def __init__(self, ws, victim):
+        self.ws, self.victim, self.reads = ws, victim, 0
+        self.title = ws.title
+
+    def get_all_values(self):
+        values = self.ws.get_all_values()
+        self.reads += 1
+        if self.reads == 1:
+            self.ws.delete_rows(self.victim)
+        return values
+
+    def __getattr__(self, name):
+        return getattr(self.ws, name)
+
+
+def test_delete_rereads_when_rows_shift(book):
+    """Row 2 vanishes between the read and the delete: the stale row numbers must not be used."""
+    ws = book._sheets["info"]
+    shifting = _ShiftingSheet(ws, victim=2)
+    assert delete_batch(shifting, "info", "cid", 4) == 1
+    assert shifting.reads == 2
+    # ann/1 went to the other writer; everything else but cid/4 is untouched
+    assert _keys(ws) == [("bob", "1"), ("ann", "2"), ("ann", "3")]
+
+
+def test_delete_gives_up_on_a_sheet_that_keeps_moving(book):
+    ws = book._sheets["info"]
+
+    class Always(_ShiftingSheet):
+        def get_all_values(self):
+            values = self.ws.get_all_values()
+            self.ws.append_rows([_info("zed", 9, "2026.03.01")])
+            self.ws._rows.insert(1, self.ws._rows.pop())
+            return values
+
+    before = len(ws._rows)
+    with pytest.raises(SheetChangedError):
+        delete_where(Always(ws, victim=None), key_selector("info", [("cid", 4)]), attempts=3)
+    # Nothing of anyone else's was deleted: only rows were added
+    assert ("cid", "4") in _keys(ws) and len(ws._rows) == before + 3
+
+
+def test_move_leaves_rows_edited_meanwhile(book):
+    """A finished batch re-saved by another process after the read is not deleted from the hot sheet."""
+    ws = _sheets(book)
+    info = ws["info"]
+
+    class Resave(_ShiftingSheet):
+        def get_all_values(self):
+            values = self.ws.get_all_values()
+            self.reads += 1
+            if self.reads == 2:
+                # ann/2 edited elsewhere: old row deleted, new one appended
+                del self.ws._rows[3]
+                self.ws._rows.append(_info("ann", 2, "2026.03.01", "2026.03.06"))
+            return values
+
+    ws["info"] = Resave(info, victim=None)
+    archive_finished(ws, TODAY)
+    assert ("ann", "2") in _keys(info)
+    assert info._rows[-1][7] == "2026.03.06"
@@ -0,0 +1,87 @@
+"""The append-only batch journal: saves, renames, concurrent writers and compaction."""
+import pandas as pd
+import pytest
+
+from batch_journal import COLUMNS, BatchJournal
+
+
+def _row(bid, cell="H9", start="2026-03-01", **extra):
+    return {"batch_id": bid, "cell": cell, "start_date": start, **extra}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "batches.csv")
+
+
+def test_put_and_frame(path):
+    journal = BatchJournal(path)
+    journal.put(_row(1))
+    journal.put(_row(2, initial_plate_count="3"))
+    df = journal.frame()
+    assert list(df.index) == ["1", "2"]
+    assert list(df.columns) == COLUMNS
+    assert df["initial_plate_count"].tolist() == [1, 3]
+    assert df["replaced_plate_count"].tolist() == [0, 0]
+    assert df["start_date"].iloc[0] == pd.Timestamp("2026-03-01")
+    assert "2" in journal and "9" not in journal
+
+
+def test_edit_and_rename_keep_position(path):
+    journal = BatchJournal(path)
+    for bid in (1, 2, 3):
+        journal.put(_row(bid))
+    journal.put(_row(2, cell="H1"), replaces=2)
+    journal.put(_row(20, cell="H1"), replaces=2)
+    df = journal.frame()
+    assert list(df.index) == ["1", "20", "3"]
+    assert df.loc["20", "cell"] == "H1"
+
+
+def test_two_writers_both_keep_their_change(path):
+    first, second = BatchJournal(path), BatchJournal(path)
+    first.put(_row(1))
+    second.put(_row(2))
+    first.refresh()
+    assert list(first.frame().index) == ["1", "2"]
+
+
+def test_partial_line_is_left_for_later(path):
+    journal = BatchJournal(path)
+    journal.put(_row(1))
+    with open(journal.journal_path, "ab") as f:
+        f.write(b'{"key": null, "row": {"batch_id": "2"')
+    journal.refresh()
+    assert list(journal.frame().index) == ["1"]
+    with open(journal.journal_path, "ab") as f:
+        f.write(b', "cell": "H9", "start_date": "2026-03-02"}}\n')
+    journal.refresh()
+    assert list(journal.frame().index) == ["1", "2"]
+
+
+def test_compaction_and_cold_start(path):
+    journal = BatchJournal(path, compact_every=3)
+    for bid in (1, 2, 3, 4):
+        journal.put(_row(bid))
+    assert journal._records == 1
+    assert len(pd.read_csv(path)) == 3
+    reopened = BatchJournal(path)
+    pd.testing.assert_frame_equal(reopened.frame(), journal.frame())
+    # A compaction by another instance is picked up on refresh
+    reopened.compact()
+    journal.refresh()
+    assert list(journal.frame().index) == ["1", "2", "3", "4"]
+
+
+def test_replaying_a_compacted_journal_changes_nothing(path):
+    journal = BatchJournal(path)
+    journal.put(_row(1))
+    journal.put(_row(1, cell="H1"), replaces=1)
+    with open(journal.journal_path, "rb") as f:
+        records = f.read()
+    journal.compact()
+    # Crash between writing the snapshot and emptying the journal
+    with open(journal.journal_path, "wb") as f:
+        f.write(records)
+    reopened = BatchJournal(path)
+    assert reopened.frame()["cell"].tolist() == ["H1"]
@@ -0,0 +1,126 @@
+"""Bulk import validation, writing, and the export → import round trip."""
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+import bulk
+from fake_sheets import COUNTS_HEADER, FakeSpreadsheet
+from sheets import COUNT_COLUMNS, INFO_SCHEMA, decode_sheet
+
+VERSIONS = ["DAP_protocol_extended", "slow"]
+
+
+def _csv(text):
+    return bulk.read_upload("import.csv", text.encode("utf-8"))
+
+
+def _plan(batches, counts=None, existing=(5,)):
+    return bulk.plan_import(batches, counts, "ann", set(existing), VERSIONS, VERSIONS[0])
+
+
+def _errors(plan):
+    return sorted(zip(plan.errors["table"], plan.errors["row"], plan.errors["column"]))
+
+
+BATCHES = """batch_id,cell,start_date,end_date,note,initial_plate_count,replaced_plate_count,protocol
+1,H9,2026.03.01,,first,2,3,
+2,H1,2026-03-04,2026-03-20,"a, quoted note",,2 (+1 spare),slow
+"""
+
+COUNTS = """batch_id,phase,A,B,C
+1,Day 15,"1,200,000",3e5,
+1,day21,4000000,,
+2,Banking,,,7
+"""
+
+
+def test_read_upload_kinds():
+    assert _csv(BATCHES)["cell_counts"] is None
+    assert _csv(COUNTS)["batches"] is None
+    with pytest.raises(ValueError):
+        bulk.read_upload("import.txt", b"x")
+    with pytest.raises(ValueError):
+        bulk.read_upload("import.zip", b"not a zip")
+
+
+def test_valid_plan_rows():
+    plan = _plan(_csv(BATCHES)["batches"], _csv(COUNTS)["cell_counts"])
+    assert plan.ok, plan.errors
+    info = decode_sheet("info", [list(INFO_SCHEMA), *[[str(v) for v in r] for r in plan.info_rows]])
+    assert info["batch_id"].tolist() == [1, 2]
+    assert info["end_date"].dt.strftime("%Y-%m-%d").tolist() == ["2026-03-22", "2026-03-20"]
+    assert info["protocol"].astype(str).tolist() == ["DAP_protocol_extended", "slow"]
+    assert info["replaced_plate_count"].tolist() == ["3", "2 (+1 spare)"]
+    assert [r[:4] for r in plan.count_rows] == [
+        ["ann", 1, "Day 15", "1,200,000"], ["ann", 1, "Day 21", "4000000"], ["ann", 2, "Banking", ""],
+    ]
+
+
+def test_every_problem_is_reported_with_its_row():
+    batches = _csv("""batch_id,cell,start_date,end_date,protocol
+1,H9,2026.03.01,2026.02.01,
+x,H9,2026.03.01,,
+3,H9,,,
+3,H9,2026.03.01,soon,
+5,H9,2026.03.01,,nope
+""")["batches"]
+    counts = _csv("""batch_id,phase,A
+1,Day 15,lots
+1,Day 15,10
+9,Day 15,10
+1,Day 99,10
+""")["cell_counts"]
+    plan = _plan(batches, counts)
+    assert not plan.ok and not plan.info_rows
+    assert _errors(plan) == [
+        ("batches", 2, "end_date"),       # before the start date
+        ("batches", 3, "batch_id"),       # not a number
+        ("batches", 4, "batch_id"),       # duplicated
+        ("batches", 4, "start_date"),     # missing
+        ("batches", 5, "batch_id"),
+        ("batches", 5, "end_date"),       # not a date
+        ("batches", 6, "batch_id"),       # already used
+        ("batches", 6, "protocol"),       # unknown version
+        ("cell_counts", 2, "A"),          # not a number
+        ("cell_counts", 2, "phase"),      # phase twice for batch 1
+        ("cell_counts", 3, "phase"),
+        ("cell_counts", 4, "batch_id"),   # not in this import
+        ("cell_counts", 5, "phase"),      # unknown phase
+    ]
+
+
+def test_missing_required_column():
+    plan = _plan(_csv("batch_id,cell\n1,H9\n")["batches"])
+    assert ("batches", 1, "start_date") in _errors(plan)
+
+
+def test_write_import_chunks_and_refuses_invalid_plans():
+    sh = FakeSpreadsheet()
+    info, counts = sh._sheets["info"], sh._sheets["cell_counts"]
+    rows = "\n".join(f"{i},H9,2026.03.01,,,,," for i in range(1, 8))
+    plan = _plan(_csv("batch_id,cell,start_date,end_date,note,initial_plate_count,replaced_plate_count,protocol\n" + rows)["batches"], existing=())
+    assert bulk.write_import(plan, info, counts, chunk_rows=3) == 3
+    assert len(info._rows) == 8
+    with pytest.raises(ValueError):
+        bulk.write_import(_plan(pd.DataFrame(columns=bulk.BATCH_FIELDS)), info, counts)
+
+
+def test_export_round_trip():
+    first = _plan(_csv(BATCHES)["batches"], _csv(COUNTS)["cell_counts"])
+    info = decode_sheet("info", [list(INFO_SCHEMA), *[[str(v) for v in r] for r in first.info_rows]])
+    counts = decode_sheet("cell_counts", [COUNTS_HEADER, *[[str(v) for v in r] for r in first.count_rows]])
+    # Half in the archive, plus another user's batch that must not be exported
+    other = info.iloc[:1].assign(username="bob")
+    batches, exported_counts = bulk.export_frames([info.iloc[1:], pd.concat([info.iloc[:1], other])], [counts], "ann")
+
+    data = bulk.write_export(batches, exported_counts, io.BytesIO(), chunk_rows=1).getvalue()
+    assert sorted(zipfile.ZipFile(io.BytesIO(data)).namelist()) == ["batches.csv", "cell_counts.csv"]
+    tables = bulk.read_upload("ann_batches.zip", data)
+    again = _plan(tables["batches"], tables["cell_counts"], existing=())
+    assert again.ok, again.errors
+    assert again.info_rows == first.info_rows
+    key = lambda r: (r[1], r[2])
+    assert sorted(again.count_rows, key=key) == sorted(first.count_rows, key=key)
+    assert set(COUNT_COLUMNS) <= set(tables["cell_counts"].columns)
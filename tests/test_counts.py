@@ -0,0 +1,89 @@
+"""Cell-count parsing and yield analytics."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.counts import EXPANSION, OUTCOMES, batch_outcomes, batch_yields, counts_long, parse_counts, plate_counts, yield_summary, yield_trend
+from fake_sheets import COUNTS_HEADER
+from sheets import COUNT_COLUMNS, decode_sheet
+
+
+def _counts(*rows):
+    """A decoded cell_counts frame from (user, batch, phase, {plate: text}) rows."""
+    values = [COUNTS_HEADER] + [
+        [u, str(b), phase] + [cells.get(c, "") for c in COUNT_COLUMNS] for u, b, phase, cells in rows
+    ]
+    return decode_sheet("cell_counts", values)
+
+
+def test_parse_counts():
+    got = parse_counts(["1,200,000", " 3e5 ", "2.5E6", "", "n/a", "-4", "1_000", ".5", None])
+    expected = [1.2e6, 3e5, 2.5e6, np.nan, np.nan, np.nan, 1000, 0.5, np.nan]
+    np.testing.assert_array_equal(got, expected)
+
+
+def test_plate_counts_whole_numbers_only():
+    got = plate_counts(pd.array(["2", " 3 ", "2.5", "two", "", None, "1,000"], dtype="string"))
+    np.testing.assert_array_equal(got, [2, 3, np.nan, np.nan, np.nan, np.nan, 1000])
+
+
+def test_counts_long_one_row_per_counted_plate():
+    long = counts_long(_counts(
+        ("ann", 1, "Day 15", {"A": "100", "B": "200", "3": "x"}),
+        ("ann", 1, "Day 15", {"A": "999"}),           # repeat: first row wins
+        ("ann", 1, "Day 21", {"C": "1e3"}),
+        ("bob", 2, "Other", {"A": "5"}),               # unknown phase
+    ))
+    assert list(zip(long["phase"].astype(str), long["plate"].astype(str), long["cells"])) == [
+        ("Day 15", "A", 100.0), ("Day 15", "B", 200.0), ("Day 21", "C", 1000.0),
+    ]
+    assert long["batch_id"].tolist() == [1, 1, 1]
+
+
+def test_counts_long_empty():
+    assert counts_long(_counts()).empty
+
+
+def test_batch_yields_and_expansion():
+    long = counts_long(_counts(
+        ("ann", 1, "Day 15", {"A": "100", "B": "100"}),
+        ("ann", 1, "Day 21", {"A": "500"}),
+        ("bob", 2, "Day 21", {"A": "50"}),
+    ))
+    info = pd.DataFrame({
+        "username": ["ann", "bob"], "batch_id": pd.array([1, 2], dtype="Int64"), "cell": ["H9", "H1"],
+        "start_date": pd.to_datetime(["2026-01-10", "2026-02-03"]),
+    })
+    yields = batch_yields(long, info).set_index("batch_id")
+    assert yields.loc[1, "Day 15 cells"] == 200 and yields.loc[1, "Day 15 plates"] == 2
+    assert yields.loc[1, EXPANSION] == pytest.approx(2.5)
+    assert np.isnan(yields.loc[2, EXPANSION])
+    assert yields.loc[2, "cell"] == "H1"
+    assert str(yields.loc[1, "month"]) == "2026-01"
+
+    summary = yield_summary(yields.reset_index()).set_index("cell")
+    assert summary.loc["H9", "batches"] == 1 and summary.loc["H1", "Day 15 n"] == 0
+    trend = yield_trend(yields.reset_index())
+    assert list(trend.columns) == ["H9"] and trend.loc[pd.Period("2026-01"), "H9"] == pytest.approx(2.5)
+
+
+def test_batch_yields_before_anything_is_counted():
+    info = pd.DataFrame({"username": ["ann"], "batch_id": pd.array([1], dtype="Int64"), "cell": ["H9"]})
+    yields = batch_yields(counts_long(_counts()), info)
+    assert yields.empty and {"Day 15 cells", "Day 21 plates", EXPANSION} <= set(yields.columns)
+    assert batch_outcomes(yields).empty
+
+
+def test_batch_outcomes_are_the_last_phase_counted():
+    long = counts_long(_counts(
+        ("ann", 1, "Day 15", {"A": "100"}),
+        ("ann", 1, "Day 21", {"A": "300"}),
+        ("ann", 2, "Day 15", {"A": "100"}),
+        ("ann", 3, "Banking", {"A": "10"}),
+        ("ann", 4, "Day 21", {"A": "n/a"}),  # nothing readable: not a counted batch
+    ))
+    info = pd.DataFrame({"username": ["ann"] * 4, "batch_id": pd.array([1, 2, 3, 4], dtype="Int64")})
+    outcomes = batch_outcomes(batch_yields(long, info)).set_index("batch_id")
+    assert outcomes["outcome"].to_dict() == {1: "Counted Day 21", 2: "Counted Day 15", 3: "Banked"}
+    assert outcomes.loc[1, "expansion"] == pytest.approx(3.0)
+    assert set(outcomes["outcome"]) <= set(OUTCOMES)
@@ -0,0 +1,105 @@
+"""The SQLite history mirror: incremental sync, search, shadowing, saved batches and outcomes."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from history import HistoryIndex, HistoryQuery, fingerprint, row_hashes
+from sheets import INFO_SCHEMA, decode_sheet
+
+HEADER = list(INFO_SCHEMA)
+
+
+def _row(user, bid, cell="H9", start="2026.03.01", note="", end=""):
+    return [user, str(bid), cell, start, note, "2", "1 spare", end, ""]
+
+
+def _frame(*rows):
+    return decode_sheet("info", [HEADER, *rows])
+
+
+@pytest.fixture
+def index(tmp_path):
+    return HistoryIndex(str(tmp_path / "history.sqlite"))
+
+
+def _found(index, **query):
+    page = index.page(HistoryQuery(**query), page_size=100)
+    return sorted(zip(page["username"], page["batch_id"].astype(int), page["source"]))
+
+
+def test_sync_is_incremental(index):
+    rows = [_row("ann", 1), _row("bob", 2, note="contamination on day 9")]
+    assert index.sync("info", _frame(*rows)) == 2
+    assert index.sync("info", _frame(*rows)) == 0
+    # One edited row: one delete and one insert
+    rows[1] = _row("bob", 2, note="clean")
+    assert index.sync("info", _frame(*rows)) == 2
+    assert index.count(HistoryQuery()) == 2
+
+
+def test_fingerprint_ignores_order():
+    df = _frame(_row("ann", 1), _row("bob", 2))
+    assert fingerprint(row_hashes(df)) == fingerprint(row_hashes(df.iloc[::-1]))
+
+
+def test_search_ranks_and_filters(index):
+    index.sync("info", _frame(
+        _row("ann", 1, note="contamination seen"),
+        _row("bob", 2, cell="contam-line", note=""),
+        _row("cid", 3, note="all fine"),
+    ))
+    assert {u for u, _, _ in _found(index, text="contam")} == {"ann", "bob"}
+    assert _found(index, text="contam", users=["ann"]) == [("ann", 1, "info")]
+    assert index.page(HistoryQuery(text="contam"))["username"].iloc[0] == "bob"  # cell hits weigh more
+
+
+def test_plate_counts_stay_text(index):
+    index.sync("info", _frame(_row("ann", 1)))
+    page = index.page(HistoryQuery())
+    assert page["replaced_plate_count"].tolist() == ["1 spare"]
+
+
+def test_archived_copy_is_shadowed_by_hot_copy(index):
+    index.sync("info_archive", _frame(_row("ann", 1, note="old")))
+    index.sync("info", _frame(_row("ann", 1, note="new")))
+    assert _found(index) == [("ann", 1, "info")]
+    index.sync("info", _frame())
+    assert _found(index) == [("ann", 1, "info_archive")]
+
+
+def test_replace_batch_keeps_the_archived_copy(index):
+    """Saving a hot batch must not drop the archive's copy: nothing would re-index it."""
+    archived = _frame(_row("ann", 1, note="archived"))
+    index.sync("info_archive", archived)
+    index.replace_batch("ann", 1, _row("ann", 1, note="edited"))
+    assert _found(index, text="edited") == [("ann", 1, "info")]
+    # The hot copy goes away: the archive's copy is found again, with no archive re-sync
+    index.sync("info", _frame())
+    assert index.sync("info_archive", archived) == 0
+    assert _found(index, text="archived") == [("ann", 1, "info_archive")]
+
+
+def test_replace_batch_replaces_hot_copies(index):
+    index.sync("info", _frame(_row("ann", 1, note="first"), _row("ann", 1, note="dup")))
+    index.replace_batch("ann", 1, _row("ann", 1, note="second"))
+    assert _found(index) == [("ann", 1, "info")]
+    assert index.page(HistoryQuery())["note"].tolist() == ["second"]
+
+
+def test_outcome_filter_and_columns(index):
+    index.sync("info", _frame(_row("ann", 1), _row("ann", 2), _row("bob", 1)))
+    outcomes = pd.DataFrame({
+        "username": ["ann", "bob", "zed"], "batch_id": pd.array([1, 1, 4], dtype="Int64"),
+        "outcome": ["Banked", "Counted Day 15", "Banked"], "expansion": [2.5, np.nan, 1.0],
+    })
+    assert index.sync_outcomes(outcomes) == 3
+    assert index.sync_outcomes(outcomes) == 0
+    assert _found(index, outcomes=["Banked"]) == [("ann", 1, "info")]
+    assert _found(index, outcomes=["Not counted", "Counted Day 15"]) == [("ann", 2, "info"), ("bob", 1, "info")]
+    assert index.count(HistoryQuery(outcomes=["Banked"], text="h9")) == 1
+    page = index.page(HistoryQuery(users=["ann"])).set_index("batch_id")
+    assert page.loc[1, "outcome"] == "Banked" and page.loc[1, "expansion"] == 2.5
+    assert page.loc[2, "outcome"] == "Not counted" and np.isnan(page.loc[2, "expansion"])
+    # A new yields table replaces the old one
+    index.sync_outcomes(outcomes.iloc[1:])
+    assert _found(index, outcomes=["Banked"]) == []
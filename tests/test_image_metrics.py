@@ -0,0 +1,64 @@
+"""Confluence, focus and intensity of synthetic fields, and the analyzer's cache."""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter
+
+import image_metrics
+from image_metrics import METRICS, ImageAnalyzer, measure_bytes
+
+
+def _field(coverage, texture=30, blur=0, noise=2, size=320, seed=0):
+    """JPEG bytes of a flat, noisy dish with textured cells over the left `coverage` of the field."""
+    rng = np.random.default_rng(seed)
+    background = 120 + rng.normal(0, noise, (size, size))
+    grain = np.asarray(Image.fromarray(rng.integers(0, 256, (size, size), dtype=np.uint8)).filter(ImageFilter.GaussianBlur(1.5)), dtype=float)
+    cells = (grain - grain.mean()) / grain.std() * texture
+    covered = np.arange(size) < round(coverage * size)
+    img = Image.fromarray(np.clip(background + cells * covered, 0, 255).astype(np.uint8))
+    if blur:
+        img = img.filter(ImageFilter.GaussianBlur(blur))
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("blur", [0, 2])
+@pytest.mark.parametrize("coverage", [0.0, 0.3, 0.7, 1.0])
+def test_confluence_follows_coverage(coverage, blur):
+    # The window's few pixels of halo around each cell edge are the only error
+    assert measure_bytes(_field(coverage, blur=blur))["confluence"] == pytest.approx(coverage, abs=0.04)
+
+
+@pytest.mark.parametrize("texture", [10, 60])
+def test_fully_confluent_field_is_not_split(texture):
+    assert measure_bytes(_field(1.0, texture=texture))["confluence"] > 0.97
+
+
+def test_focus_and_intensity():
+    sharp, blurred = measure_bytes(_field(0.5)), measure_bytes(_field(0.5, blur=2))
+    assert sharp["focus"] > 5 * blurred["focus"]
+    assert sharp["intensity"] == pytest.approx(120 / 255, abs=0.02)
+
+
+def test_unreadable_and_tiny_images_are_nan():
+    assert all(np.isnan(v) for v in measure_bytes(b"not an image").values())
+    out = io.BytesIO()
+    Image.new("L", (2, 2)).save(out, "PNG")
+    assert all(np.isnan(v) for v in measure_bytes(out.getvalue()).values())
+
+
+def test_analyzer_caches_by_content(monkeypatch):
+    calls = []
+    measure_chunk = image_metrics._measure_chunk
+    monkeypatch.setattr(image_metrics, "_measure_chunk", lambda chunk: calls.append(len(chunk)) or measure_chunk(chunk))
+    analyzer = ImageAnalyzer(workers=1, max_entries=2)
+    a, b, c = _field(0.2), _field(0.6), _field(0.9)
+    first = analyzer.analyze([("a.jpg", a), ("b.jpg", b), ("copy of a.jpg", a)])
+    assert calls == [2] and first["cached"].tolist() == [False, False, False]
+    assert first.loc[0, METRICS].tolist() == first.loc[2, METRICS].tolist()
+    again = analyzer.analyze([("b.jpg", b), ("c.jpg", c)])
+    assert calls == [2, 1] and again["cached"].tolist() == [True, False]
+    # Oldest result (a) was evicted at max_entries
+    assert analyzer.analyze([("a.jpg", a)])["cached"].tolist() == [False]
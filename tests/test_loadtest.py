@@ -0,0 +1,70 @@
+"""The fake Sheets backend and the load-test report."""
+import random
+import time
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import loadtest
+from fake_sheets import ACCOUNTS_GID, COUNTS_HEADER, INFO_HEADER, FakeSpreadsheet
+from sheets import COUNT_PHASES, decode_sheet
+
+
+def test_fake_worksheet_follows_gspread():
+    sheets = FakeSpreadsheet()
+    ws = sheets.add_worksheet("scratch")
+    ws.append_rows([["a", 1, None], ["b", "", ""], ["", "", ""]])
+    assert ws.get_all_values() == [["a", "1", ""], ["b", "", ""], ["", "", ""]]
+    assert ws.get_values("1:3") == [["a", "1", ""], ["b", "", ""]]  # trailing empty rows dropped
+    assert ws.row_values(2) == ["b"] and ws.row_values(9) == []
+    ws.update_cell(5, 2, "x")
+    assert ws.get_all_values()[4] == ["", "x"]
+    ws.delete_rows(2, 4)  # 1-based, inclusive
+    assert ws.get_all_values() == [["a", "1", ""], ["", "x"]]
+    ws.update([["h"], ["v"]])
+    assert ws.get_all_records() == [{"h": "v"}]
+    assert ws.id > ACCOUNTS_GID - 1 and sheets.worksheet("scratch") is ws
+    assert sheets.calls == 13  # one per API call, reads and writes alike
+
+
+def test_seed():
+    sheets = FakeSpreadsheet()
+    today = date(2026, 3, 14)
+    sheets.seed(users=3, batches_per_user=4, today=today, rng=random.Random(1))
+    accounts = sheets.worksheet("accounts").get_all_values()
+    assert accounts[1:] == [["user0", "pw"], ["user1", "pw"], ["user2", "pw"]]
+    info = decode_sheet("info", sheets.worksheet("info").get_all_values())
+    assert sheets.worksheet("info").get_all_values()[0] == INFO_HEADER
+    assert len(info) == 12 and info.groupby("username")["batch_id"].agg(list).tolist() == [[1, 2, 3, 4]] * 3
+    age = (pd.Timestamp(today) - info["start_date"]).dt.days
+    assert age.between(0, 30).all()
+    counts = decode_sheet("cell_counts", sheets.worksheet("cell_counts").get_all_values())
+    assert sheets.worksheet("cell_counts").get_all_values()[0] == COUNTS_HEADER
+    # Day 15 counts only for batches at least 15 days in
+    counted = info.assign(age=age).merge(counts[["username", "batch_id"]], on=["username", "batch_id"])
+    assert (counted["age"] >= 15).all() and len(counted) == (age >= 15).sum()
+    assert set(counts["phase"]) <= {COUNT_PHASES[0]}
+
+
+def test_latency_is_per_call():
+    sheets = FakeSpreadsheet(latency_ms=20)
+    t0 = time.perf_counter()
+    ws = sheets.worksheet("info")
+    ws.get_all_values()
+    ws.get_all_values()
+    assert time.perf_counter() - t0 >= 0.06  # worksheet() was a call too
+
+
+def test_summary_per_action():
+    results = [
+        {"action": "login", "wall_ms": ms, "server_ms": ms / 2, "api_calls": 2, "error": None}
+        for ms in (10, 20, 30, 40)
+    ] + [{"action": "save_batch", "wall_ms": 100, "server_ms": 80, "api_calls": 5, "error": "boom"}]
+    summary = loadtest.summarize(results, elapsed_s=2.0, backend_calls=13)
+    login = summary["actions"]["login"]
+    assert (login["n"], login["p50_ms"], login["api_calls_mean"], login["errors"]) == (4, 20, 2, 0)
+    assert login["server_ms_mean"] == pytest.approx(12.5)
+    overall = summary["overall"]
+    assert (overall["n"], overall["errors"], overall["backend_calls"]) == (5, 1, 13)
+    assert overall["throughput_actions_per_s"] == 2.5 and overall["p99_ms"] == 100
@@ -0,0 +1,55 @@
+"""Session memory estimates, the eviction plan and the process-wide registry."""
+import io
+
+import numpy as np
+import pandas as pd
+
+import memwatch
+from common import EVICTABLE_PREFIX, UPLOAD_KEY_PREFIX, is_evictable
+from memwatch import MB, SessionMemoryRegistry, entry_sizes, estimate_size, plan_eviction
+
+
+def test_estimate_size():
+    assert estimate_size(b"x" * 1000) == 1000
+    assert estimate_size(np.zeros(250, dtype="float32")) == 1000
+    assert estimate_size(io.BytesIO(b"x" * 500)) == 500
+    df = pd.DataFrame({"a": np.arange(1000)})
+    assert estimate_size(df) >= 8000
+    # Containers add up their items: an export kept as ((user, from, to), bytes)
+    assert estimate_size((("ann", 1, 2), b"x" * MB)) > MB
+
+
+def test_entry_sizes_survive_unsizeable_values():
+    class Broken:
+        def __sizeof__(self):
+            raise RuntimeError
+
+    sizes = entry_sizes({"ok": b"abc", "broken": Broken()})
+    assert sizes == {"ok": 3, "broken": 0}
+
+
+def test_plan_eviction_takes_largest_evictable_first():
+    sizes = {"login": 50, f"{EVICTABLE_PREFIX}xlsx_export": 300, f"{UPLOAD_KEY_PREFIX}_0": 200, f"{EVICTABLE_PREFIX}small": 10}
+    assert plan_eviction(sizes, is_evictable, 600) == []
+    assert plan_eviction(sizes, is_evictable, 300) == [f"{EVICTABLE_PREFIX}xlsx_export"]
+    assert plan_eviction(sizes, is_evictable, 0) == [
+        f"{EVICTABLE_PREFIX}xlsx_export", f"{UPLOAD_KEY_PREFIX}_0", f"{EVICTABLE_PREFIX}small",
+    ]
+    assert not is_evictable("login") and not is_evictable("hist_page")
+
+
+def test_registry_flags_the_largest_sessions_over_the_process_cap():
+    registry = SessionMemoryRegistry(top_keys=1)
+    registry.report("s1", "ann", {"a": 100, "b": 10})
+    registry.report("s2", "bob", {"a": 300})
+    registry.report("s3", "cid", {"a": 50})
+    assert [r["session"] for r in registry.sessions()] == ["s2", "s1", "s3"]
+    assert registry.sessions()[1]["top"] == {"a": 100} and registry.total_bytes() == 460
+    assert registry.enforce_process_cap(1000, 2000) == []
+    assert registry.enforce_process_cap(2350, 2000) == ["s2", "s1"]
+    assert registry.take_eviction("s1") and not registry.take_eviction("s1")
+    assert not registry.take_eviction("s3")
+
+
+def test_process_rss_is_positive():
+    assert memwatch.process_rss_bytes() > 0
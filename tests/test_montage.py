@@ -0,0 +1,77 @@
+"""Montage layout, caption fonts and the montage cache."""
+import io
+
+import pytest
+from PIL import Image, ImageFont
+
+import montage
+from montage import CAPTION_HEIGHT, GAP, MontageCache, compose, montage_key
+
+
+def _jpeg(color, size=(400, 300)):
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, "JPEG")
+    return out.getvalue()
+
+
+IMAGES = [(f"dish {i}.jpg", _jpeg((40 * i, 80, 120))) for i in range(5)]
+
+
+def test_compose_grid_size_and_tiles():
+    m = compose(IMAGES, columns=2, width=404, captions=False)
+    # Tiles are 200 wide with the first image's 4:3 aspect; three rows for five images
+    assert (m.width, m.height, m.count) == (404, 3 * 150 + 2 * GAP, 5)
+    img = Image.open(io.BytesIO(m.jpeg))
+    assert img.size == (m.width, m.height)
+    r, g, b = img.getpixel((300, 75))  # second tile
+    assert abs(r - 40) < 8 and abs(g - 80) < 8
+
+
+def test_unreadable_image_leaves_an_empty_tile():
+    m = compose([("a.jpg", _jpeg((200, 200, 200))), ("broken.jpg", b"not an image")], columns=2, width=404)
+    img = Image.open(io.BytesIO(m.jpeg))
+    assert m.height == 150 + CAPTION_HEIGHT
+    assert max(img.getpixel((300, 75))) < 40  # background
+
+
+def test_captions_fall_back_to_the_bitmap_font(monkeypatch):
+    """Pillow before 10.1 has no `size` argument to load_default."""
+    load_default = ImageFont.load_default
+
+    def old_load_default(*args, **kwargs):
+        if kwargs:
+            raise TypeError("load_default() got an unexpected keyword argument 'size'")
+        return load_default()
+
+    monkeypatch.setattr(ImageFont, "load_default", old_load_default)
+    assert compose(IMAGES[:2], columns=2, width=404).count == 2
+
+
+def test_key_ignores_names_without_captions():
+    hashes = ["a", "b"]
+    assert montage_key(hashes, ["x", "y"], 2, 800, False) == montage_key(hashes, ["p", "q"], 2, 800, False)
+    assert montage_key(hashes, ["x", "y"], 2, 800, True) != montage_key(hashes, ["p", "q"], 2, 800, True)
+    assert montage_key(hashes, [], 2, 800, False) != montage_key(hashes, [], 3, 800, False)
+
+
+def test_cache_reuses_and_drops_least_recent(monkeypatch):
+    calls = []
+    compose_once = montage.compose
+    monkeypatch.setattr(montage, "compose", lambda *a: calls.append(a) or compose_once(*a))
+    cache = MontageCache()
+    first, cached = cache.get(IMAGES[:2], 2, 404)
+    again, cached_again = cache.get(IMAGES[:2], 2, 404)
+    assert (cached, cached_again, len(calls)) == (False, True, 1) and again is first
+
+    # Room for one montage only: a second one drops the first
+    cache.max_bytes = cache.nbytes()
+    second, _ = cache.get(IMAGES[2:4], 2, 404)
+    assert cache.nbytes() == len(second.jpeg)
+    assert cache.get(IMAGES[:2], 2, 404)[1] is False  # evicted
+    assert len(calls) == 3
+
+
+@pytest.mark.parametrize("columns", [0, 1])
+def test_single_column(columns):
+    m = compose(IMAGES[:3], columns=columns, width=200, captions=False)
+    assert (m.width, m.height) == (200, 3 * 150 + 2 * GAP)
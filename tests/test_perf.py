@@ -0,0 +1,100 @@
+"""Rerun timers, API call counting, the JSONL log, fragment reruns and profiles."""
+import os
+
+import pytest
+
+import perf
+import views
+
+
+@pytest.fixture
+def log(tmp_path):
+    yield str(tmp_path / "perf.jsonl")
+    perf.end_run(log_path=None)
+
+
+class _Sheet:
+    def get_all_values(self):
+        return [["a"]]
+
+    title = "info"
+
+
+def test_run_records_spans_and_api_calls(log):
+    perf.begin_run(user="ann", run="full")
+    with perf.span("outer", rows=3):
+        with perf.span("inner"):
+            ws = perf.CountingWorksheet(_Sheet())
+            ws.get_all_values()
+            ws.get_all_values()
+            assert ws.title == "info"  # attributes pass through uncounted
+    rec = perf.end_run(log_path=log)
+    assert [(s["name"], s["depth"]) for s in rec["spans"]] == [("inner", 1), ("outer", 0)]
+    assert rec["spans"][1]["rows"] == 3
+    assert rec["api_calls"] == 2 and rec["api_by_method"] == {"get_all_values": 2}
+    assert perf.read_log(log) == [rec]
+    assert perf.current() is None
+
+
+def test_helpers_are_no_ops_outside_a_run(log):
+    assert perf.current() is None
+    with perf.span("nothing"):
+        perf.count_api("get")
+    assert perf.end_run(log_path=log) is None and perf.read_log(log) == []
+
+
+def test_summarize_by_run_kind():
+    records = [{"total_ms": ms, "api_calls": 1, "run": "full"} for ms in (10, 20, 30)]
+    records += [{"total_ms": 5, "api_calls": 0, "run": "fragment"}, {"total_ms": 40}]  # unlabelled: full
+    assert perf.summarize(records)["runs"] == 5
+    full = perf.summarize(records, "full")
+    assert (full["runs"], full["p50_ms"], full["p99_ms"]) == (4, 20, 40)
+    assert perf.summarize(records, "fragment")["api_calls_mean"] == 0
+    assert perf.percentile([], 50) is None
+
+
+def test_fragment_reruns_are_logged_as_their_own_runs(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)  # the default log is relative to the working directory
+    records = []
+    perf.add_listener(records.append)
+
+    def render(ctx):
+        with perf.span("render"):
+            perf.count_api("get_all_values")
+        return ctx
+
+    timed = views.time_fragment_reruns(render)
+    try:
+        # Inside a full run: charged to that run, nothing recorded separately
+        perf.begin_run(run="full")
+        assert timed("ctx") == "ctx"
+        assert perf.current().api_total() == 1 and records == []
+        perf.end_run()
+        # A fragment rerun opens and closes its own timer
+        monkeypatch.setattr(views, "is_fragment_rerun", lambda: True)
+        timed("ctx")
+    finally:
+        perf.remove_listener(records.append)
+    full, fragment = records
+    assert full["run"] == "full" and fragment["run"] == "fragment"
+    assert fragment["fragment"].endswith("<locals>.render")
+    assert fragment["api_calls"] == 1 and [s["name"] for s in fragment["spans"]] == ["render"]
+    assert perf.current() is None
+
+
+def _busy():
+    return sum(i * i for i in range(20000))
+
+
+def test_profile_of_one_run(tmp_path):
+    assert perf.stop_profile(str(tmp_path)) is None  # nothing was being profiled
+    perf.start_profile()
+    _busy()
+    path = perf.stop_profile(str(tmp_path), label="ann/Tasks view")
+    assert os.path.dirname(path) == str(tmp_path)
+    assert os.path.basename(path).startswith("ann_Tasks_view-") and path.endswith(".prof")
+    rows = perf.top_functions(path, n=50)
+    busy = next(r for r in rows if r["function"] == "_busy")
+    assert busy["location"].startswith("test_perf.py:") and busy["calls"] == 1
+    assert busy["cumtime_ms"] >= busy["tottime_ms"] >= 0
+    assert perf.stop_profile(str(tmp_path)) is None  # one-shot
@@ -0,0 +1,80 @@
+"""The Sheets API token bucket and the background warm-up queue."""
+import threading
+import time
+
+import pytest
+
+from prefetch import Prefetcher, TokenBucket
+
+
+def _drain(prefetcher, timeout=5):
+    deadline = time.monotonic() + timeout
+    while prefetcher.pending():
+        assert time.monotonic() < deadline, prefetcher.pending()
+        time.sleep(0.01)
+
+
+def test_bucket_refills_up_to_capacity(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("prefetch.time.monotonic", lambda: clock[0])
+    bucket = TokenBucket(60, burst=5)  # one token a second
+    assert bucket.tokens() == 5
+    assert bucket.take(3) and bucket.tokens() == 2
+    bucket.spend(4)  # foreground calls are charged even past empty
+    assert bucket.tokens() == -2
+    clock[0] += 3
+    assert bucket.tokens() == pytest.approx(1)
+    clock[0] += 60
+    assert bucket.tokens() == 5
+
+
+def test_take_waits_and_times_out():
+    bucket = TokenBucket(600, burst=1)  # ten tokens a second
+    assert bucket.take(1)
+    t0 = time.monotonic()
+    assert bucket.take(1)
+    assert time.monotonic() - t0 >= 0.05
+    slow = TokenBucket(1, burst=1)
+    slow.spend(1)
+    assert not slow.take(1, timeout=0.05)
+    # A cost above the capacity waits for a full bucket, then leaves it in debt
+    big = TokenBucket(60, burst=2)
+    assert big.take(5, timeout=0) and big.tokens() == pytest.approx(-3, abs=0.1)
+
+
+def test_prefetcher_runs_tasks_in_order_once_per_key():
+    release = threading.Event()
+    done = []
+    prefetcher = Prefetcher(TokenBucket(600))
+    assert prefetcher.submit("first", lambda: release.wait(5) and done.append("first"))
+    assert prefetcher.submit("second", lambda: done.append("second"))
+    assert not prefetcher.submit("second", lambda: done.append("duplicate"))
+    time.sleep(0.05)
+    assert not prefetcher.submit("first", lambda: done.append("while running"))
+    assert prefetcher.pending() == ["first", "second"]
+    release.set()
+    _drain(prefetcher)
+    assert done == ["first", "second"]
+    # Once finished, a key can be queued again
+    assert prefetcher.submit("first", lambda: done.append("again"))
+    _drain(prefetcher)
+    assert done[-1] == "again" and prefetcher.stats == {"done": 3, "failed": 0, "skipped": 0}
+
+
+def test_prefetcher_failures_and_api_budget():
+    prefetcher = Prefetcher(TokenBucket(60, burst=2), api_timeout=0.05)
+    ran = []
+    prefetcher.submit("boom", lambda: 1 / 0)
+    prefetcher.submit("cheap", lambda: ran.append("cheap"), api_cost=2)
+    prefetcher.submit("over budget", lambda: ran.append("over budget"), api_cost=1)
+    _drain(prefetcher)
+    assert ran == ["cheap"]
+    assert prefetcher.stats == {"done": 1, "failed": 1, "skipped": 1}
+    assert prefetcher.last_error.startswith("boom: ZeroDivisionError")
+
+
+def test_foreground_calls_are_charged():
+    prefetcher = Prefetcher(TokenBucket(60, burst=10))
+    prefetcher.charge({"api_calls": 7})
+    prefetcher.charge({"total_ms": 3})  # a record without API calls costs nothing
+    assert prefetcher.bucket.tokens() == pytest.approx(3, abs=0.1)
@@ -0,0 +1,78 @@
+"""The reagent forecast against a loop over batches, protocol days and components."""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.reagents import component_matrix, consumption_summary, forecast_consumption, forecast_groups
+from core.rules import ML_PER_PLATE, REPLATING_DAY, default_volume_ml
+
+
+def _forecast_per_row(batches, protocol, start, end):
+    out = {}
+    for _, b in batches.iterrows():
+        if pd.isna(b["start_date"]):
+            continue
+        for day, entries in protocol.items():
+            due = (b["start_date"] + pd.Timedelta(days=day)).date()
+            if not start <= due <= end or (pd.notna(b["end_date"]) and due > b["end_date"].date()):
+                continue
+            plates = b["replaced_plate_count"] if day >= REPLATING_DAY else b["initial_plate_count"]
+            try:
+                plates = int(str(plates).strip())
+                volume = (plates + 1) * ML_PER_PLATE
+            except ValueError:
+                volume = default_volume_ml(day)
+            for entry in entries:
+                for item in entry.get("composition", []):
+                    pct = pd.to_numeric(item.get("percentage"), errors="coerce")
+                    if pd.notna(pct):
+                        key = (pd.Timestamp(due), str(item["component"]).strip())
+                        out[key] = out.get(key, 0.0) + volume * float(pct) / 100
+    return out
+
+
+@pytest.fixture
+def planted(batches):
+    """Plate counts are free text in the info sheet: numbers, blanks and notes."""
+    return batches.assign(
+        initial_plate_count=pd.array(["2", "", "3 plates", "1", "4", " 2 "], dtype="string"),
+        replaced_plate_count=pd.array(["5", "1", "", "n/a", "0", "2.5"], dtype="string"),
+    )
+
+
+def test_forecast_matches_per_row(planted, registry, today):
+    protocol = registry.get().days
+    start, end = today - timedelta(days=20), today + timedelta(days=40)
+    daily = forecast_consumption(planted, protocol, start, end)
+    expected = _forecast_per_row(planted, protocol, start, end)
+    got = {(d, c): v for (d, c), v in daily.stack().items() if v}
+    assert got.keys() == expected.keys()
+    for key, value in expected.items():
+        assert got[key] == pytest.approx(value), key
+
+
+def test_component_matrix_fractions(registry):
+    protocol = registry.get().days
+    components, stocks, fractions = component_matrix(protocol)
+    assert fractions.shape == (max(protocol) + 1, len(components)) and len(stocks) == len(components)
+    assert (fractions >= 0).all() and fractions.sum() > 0
+
+
+def test_forecast_groups_add_up(planted, registry, today):
+    protocol = registry.get().days
+    start, end = today, today + timedelta(days=30)
+    whole = forecast_consumption(planted, protocol, start, end)
+    split = forecast_groups([(protocol, planted.iloc[:3]), (protocol, planted.iloc[3:])], start, end)
+    pd.testing.assert_frame_equal(split, whole)
+
+
+def test_empty_horizon_and_summary(planted, registry, today):
+    protocol = registry.get().days
+    empty = forecast_consumption(planted, protocol, today, today - timedelta(days=1))
+    assert empty.empty
+    daily = forecast_consumption(planted, protocol, today, today + timedelta(days=30))
+    summary = consumption_summary(daily, protocol)
+    assert np.allclose(summary["total_ml"], daily[summary["component"]].sum().to_numpy())
+    assert (summary["total_ml"] > 0).all()
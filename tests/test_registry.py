@@ -0,0 +1,69 @@
+"""Protocol versions: per-batch lookups across versions and recompiling on change."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.registry import FILL, NO_TASK, STYLE_MILESTONE, ProtocolRegistry, compile_version
+
+
+@pytest.fixture
+def versioned(tmp_path, protocol_rows):
+    """The default workbook plus a variant "slow" with every day shifted by two."""
+    directory = tmp_path / "protocols"
+    directory.mkdir()
+    protocol_rows.assign(day=protocol_rows["day"] + 2).to_excel(directory / "slow.xlsx", index=False)
+    default = tmp_path / "default.xlsx"
+    protocol_rows.to_excel(default, index=False)
+    return ProtocolRegistry(str(default), directory=str(directory))
+
+
+def test_versions_and_resolve(versioned):
+    assert versioned.versions() == ["default", "slow"]
+    assert versioned.resolve(None) == versioned.resolve("  ") == versioned.resolve(np.nan) == "default"
+    assert versioned.missing(["slow", "", "gone"]) == ["gone"]
+    with pytest.raises(KeyError):
+        versioned.get("gone")
+
+
+def test_lookup_matches_each_compiled_version(versioned):
+    versions = ["default", "slow", "gone", None]
+    days = np.array([[d for d in range(-1, 26)]] * len(versions), dtype="float64")
+    for field in ("task", "stage", "style", "weight"):
+        table = versioned.lookup(field, versions, days)
+        for row, version in enumerate(versions):
+            compiled = versioned.get(version) if version != "gone" else None
+            for col, day in enumerate(days[row]):
+                expected = compiled.on(field, int(day)) if compiled is not None else FILL[field]
+                assert table[row, col] == expected, (field, version, day)
+
+
+def test_variant_shifts_the_schedule(versioned):
+    default, slow = versioned.get(), versioned.get("slow")
+    assert slow.length == default.length + 2
+    assert slow.task[0] == NO_TASK
+    assert slow.on("style", 23) == default.on("style", 21) == STYLE_MILESTONE
+
+
+def test_groups_split_batches_by_version(versioned):
+    batches = pd.DataFrame({"batch_id": [1, 2, 3, 4], "protocol": ["slow", "", "gone", None]})
+    groups = {p.version: g["batch_id"].tolist() for p, g in versioned.groups(batches)}
+    assert groups == {"slow": [1], "default": [2, 4]}
+
+
+def test_recompiles_when_the_workbook_changes(versioned, protocol_rows):
+    path = os.path.join(versioned.directory, "slow.xlsx")
+    before = versioned.get("slow")
+    protocol_rows.assign(day=protocol_rows["day"] + 3).to_excel(path, index=False)
+    os.utime(path, (os.path.getmtime(path) + 5, os.path.getmtime(path) + 5))
+    after = versioned.get("slow")
+    assert after.length == before.length + 1
+    assert versioned.lookup("task", ["slow"], [3.0])[0] == versioned.get().task[0]
+
+
+def test_compile_version_stage_column(protocol_rows):
+    staged = protocol_rows.assign(stage=np.where(protocol_rows["day"] == 0, "Seeding", None))
+    compiled = compile_version("staged", staged)
+    assert compiled.stage[0] == "Seeding"
+    assert compiled.stage[1] == compile_version("plain", protocol_rows).stage[1]
@@ -0,0 +1,142 @@
+"""The vectorised calendar, schedule and calendar styles against the original per-row logic."""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from core.calendar import day_index_grid, day_index_on, make_calendar
+from core.registry import STYLE_MEDIA, STYLE_MILESTONE, STYLE_NONE
+from core.schedule import SCHEDULE_COLUMNS, build_schedule, task_table, write_csv, write_ical
+
+
+def _schedule_per_row(batches, protocol, start, end):
+    """One batch and one date at a time, as the Tasks view used to."""
+    rows = []
+    current = start
+    while current <= end:
+        for _, b in batches.iterrows():
+            if pd.isna(b["start_date"]):
+                continue
+            if pd.notna(b["end_date"]) and current > b["end_date"].date():
+                continue
+            day = (current - b["start_date"].date()).days
+            for n, entry in enumerate(protocol.get(day, []), 1):
+                rows.append((pd.Timestamp(current), b["username"], int(b["batch_id"]), day, n, entry["task"]))
+        current += timedelta(days=1)
+    return sorted(rows, key=lambda r: (r[0], r[1], r[2], r[4]))
+
+
+def test_day_index_grid_matches_make_calendar(batches, today):
+    dates = [today + timedelta(days=i) for i in range(22)]
+    expected = make_calendar(batches.dropna(subset=["start_date"]), today).to_numpy(dtype="float64")
+    ordered = batches.dropna(subset=["start_date"]).sort_values("batch_id")
+    np.testing.assert_array_equal(day_index_grid(ordered, dates), expected)
+
+
+def test_day_index_grid_leaves_rows_without_start_empty(batches, today):
+    grid = day_index_grid(batches, [today])
+    assert np.isnan(grid[batches["start_date"].isna().to_numpy()]).all()
+
+
+def test_day_index_on_is_one_grid_column(batches, today):
+    on = today + timedelta(days=3)
+    column = day_index_grid(batches, [on])[:, 0]
+    expected = pd.array([None if np.isnan(v) else int(v) for v in column], dtype="Int64")
+    pd.testing.assert_extension_array_equal(day_index_on(batches, on).array, expected)
+
+
+def test_build_schedule_matches_per_row(batches, registry, today):
+    protocol = registry.get().days
+    start, end = today - timedelta(days=10), today + timedelta(days=30)
+    out = build_schedule(batches, protocol, start, end)
+    assert list(out.columns) == SCHEDULE_COLUMNS
+    got = [
+        (pd.Timestamp(d), u, int(b), int(day), int(n), t)
+        for d, u, b, day, n, t in zip(out["date"], out["username"], out["batch_id"], out["day"], out["task_no"], out["task"])
+    ]
+    assert got == _schedule_per_row(batches, protocol, start, end)
+
+
+def test_build_schedule_empty_inputs(batches, registry, today):
+    assert build_schedule(batches.iloc[:0], registry.get().days, today, today).empty
+    assert build_schedule(batches, {}, today, today).empty
+
+
+def test_task_table_components_use_default_volume(registry):
+    from core.rules import default_volume_ml
+    from core.volumes import composition_volumes
+
+    protocol = registry.get().days
+    tasks = task_table(protocol)
+    assert len(tasks) == sum(len(entries) for entries in protocol.values())
+    for day, n, components in zip(tasks["day"], tasks["task_no"], tasks["components"]):
+        comps = composition_volumes(protocol[day][n - 1], default_volume_ml(day))
+        assert components == "; ".join(f"{c['Component']} {c['Volume']}".strip() for c in comps)
+
+
+def test_write_csv_quotes_fields(batches, registry, today):
+    import io
+
+    batches = batches.assign(cell=batches["cell"].replace("H9", 'H9, "clone 2"'))
+    out = build_schedule(batches, registry.get().days, today, today + timedelta(days=3))
+    buf = io.StringIO()
+    write_csv(out, buf)
+    parsed = pd.read_csv(io.StringIO(buf.getvalue()), dtype=str, keep_default_na=False)
+    assert list(parsed.columns) == SCHEDULE_COLUMNS
+    assert parsed["cell"].tolist() == out["cell"].tolist()
+    assert parsed["task"].tolist() == out["task"].tolist()
+
+
+def test_style_lookup_matches_original_day_sets(batches, registry, today):
+    """The default workbook shades the days the calendar used to hard-code."""
+    yellow = {1, 2, 4, 6, 8, 9, 10, 12, 14, 16, 18, 20}
+    blue = {15, 21}
+    days = day_index_grid(batches, [today + timedelta(days=i) for i in range(22)])
+    styles = registry.lookup("style", registry.versions_of(batches), days)
+    for day, style in zip(days.ravel(), styles.ravel()):
+        if np.isnan(day):
+            expected = STYLE_NONE
+        elif day in yellow:
+            expected = STYLE_MEDIA
+        elif day in blue:
+            expected = STYLE_MILESTONE
+        else:
+            expected = STYLE_NONE
+        assert style == expected, day
+
+
+def test_lookup_unknown_version_and_out_of_range_days(registry):
+    styles = registry.lookup("style", ["no-such-version", None, None], [1.0, np.nan, 99.0])
+    assert styles.tolist() == [STYLE_NONE] * 3
+    tasks = registry.lookup("task", [None], [15.0])
+    assert tasks.tolist() == [registry.get().task[15]]
+
+
+def test_mixed_version_exports_keep_each_versions_tasks(tmp_path, protocol_rows, batches, today):
+    """Versions share (day, task_no) pairs: the writers must not reuse one version's text for another."""
+    import io
+
+    from core.registry import ProtocolRegistry
+    from schedule_export import versioned_schedule
+
+    directory = tmp_path / "protocols"
+    directory.mkdir()
+    variant = protocol_rows.assign(task=protocol_rows["task"].replace("Media Change", "MC-VARIANT"))
+    variant.to_excel(directory / "v2.xlsx", index=False)
+    protocol_rows.to_excel(tmp_path / "default.xlsx", index=False)
+    registry = ProtocolRegistry(str(tmp_path / "default.xlsx"), directory=str(directory))
+    # Same start date, so both versions hit the same protocol days
+    batches = batches.assign(start_date=pd.Timestamp("2026-03-10"), end_date=pd.NaT, protocol=["", "v2"] * 3)
+    out = versioned_schedule(batches, registry, today, today + timedelta(days=5))
+    assert {"Media Change", "MC-VARIANT"} <= set(out["task"])
+
+    buf = io.StringIO()
+    write_csv(out, buf)
+    parsed = pd.read_csv(io.StringIO(buf.getvalue()), dtype=str, keep_default_na=False)
+    assert parsed["task"].tolist() == out["task"].tolist()
+    assert parsed["components"].tolist() == out["components"].tolist()
+
+    buf = io.StringIO()
+    write_ical(out, buf)
+    summaries = [line for line in buf.getvalue().split("\r\n") if line.startswith("SUMMARY:")]
+    assert summaries == [f"SUMMARY:Batch {b} (D{d}): {t}" for b, d, t in zip(out["batch_id"], out["day"], out["task"])]
@@ -0,0 +1,54 @@
+"""DAP_diff_scheduler_app.py driven headlessly: the batch table and each batch's task today."""
+import os
+import shutil
+from datetime import date, timedelta
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from batch_journal import BatchJournal
+from conftest import PROTOCOL_FILE, ROOT
+from core.registry import NO_TASK
+
+APP = os.path.join(ROOT, "DAP_diff_scheduler_app.py")
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """An app directory with the protocol workbook and an empty batches.csv journal."""
+    shutil.copy(PROTOCOL_FILE, tmp_path)
+    monkeypatch.chdir(tmp_path)
+    st.cache_resource.clear()
+    yield tmp_path
+    st.cache_resource.clear()
+
+
+def test_batch_table_days_and_tasks(workdir, registry):
+    today = date.today()
+    journal = BatchJournal(str(workdir / "batches.csv"))
+    starts = {"1": 3, "2": 16, "3": 40, "4": -2, "5": 5}  # days since the start
+    for bid, days in starts.items():
+        journal.put({
+            "batch_id": bid, "cell": "H9", "start_date": (today - timedelta(days=days)).isoformat(),
+            "protocol": "no-such-version" if bid == "5" else "",
+        })
+    at = AppTest.from_file(APP, default_timeout=60).run()
+    assert not at.exception
+    table = at.dataframe[0].value.set_index("Batch ID")
+    assert table["Day Count"].tolist() == list(starts.values())
+    protocol = registry.get()
+    expected = [protocol.on("task", d) for d in (3, 16, 40, -2)] + [NO_TASK]
+    assert table["Today's Task"].tolist() == expected
+    assert expected[0] != NO_TASK and expected[2] == expected[3] == NO_TASK
+    assert table["Protocol"].tolist() == [registry.default] * 4 + ["no-such-version"]
+
+
+def test_selected_batch_shows_its_media(workdir):
+    journal = BatchJournal(str(workdir / "batches.csv"))
+    journal.put({"batch_id": "7", "cell": "H9", "start_date": date.today().isoformat(), "initial_plate_count": "2"})
+    at = AppTest.from_file(APP, default_timeout=60).run()
+    at.selectbox[0].set_value("7").run()
+    assert not at.exception
+    assert "**Day Count:** 0" in [m.value for m in at.markdown]
+    assert "**Suggested total media volume:** 12.0 mL" in [m.value for m in at.markdown]
@@ -0,0 +1,65 @@
+"""Typed decoding of raw worksheet values against the declared schemas."""
+import pandas as pd
+
+from sheets import INFO_SCHEMA, decode_sheet, decode_values
+
+HEADER = list(INFO_SCHEMA)
+
+
+def test_info_columns_are_typed():
+    df = decode_sheet("info", [
+        HEADER,
+        [" ann ", "3", "H9", "2026.03.01", "note", "2", "3 (+1)", "", ""],
+        ["bob", "2.5", "iPSC", "2026-03-01", "", "", "", "2026.03.22", "slow"],
+        ["bob", "n/a", "iPSC", "", "", "", "", "soon", ""],
+    ])
+    assert list(df.columns) == HEADER
+    assert isinstance(df["username"].dtype, pd.CategoricalDtype) and df["username"].tolist() == ["ann", "bob", "bob"]
+    assert str(df["batch_id"].dtype) == "Int64" and df["batch_id"].isna().tolist() == [False, True, True]
+    assert df["start_date"].tolist()[0] == pd.Timestamp("2026-03-01")
+    assert df["start_date"].isna().tolist() == [False, True, True]  # only YYYY.MM.DD is a date
+    assert df["end_date"].isna().tolist() == [True, False, True]
+    assert df["replaced_plate_count"].tolist() == ["3 (+1)", "", ""]
+    assert str(df["note"].dtype) == "string"
+
+
+def test_missing_unknown_and_ragged_columns():
+    df = decode_values(
+        [["username", "batch_id", "extra", "", "extra"], ["ann", "1", "x", "y", "z"], ["bob"]],
+        {"username": "category", "batch_id": "int", "start_date": "date"},
+    )
+    # Schema order first, unknown columns after as strings; blank and repeated headers dropped
+    assert list(df.columns) == ["username", "batch_id", "start_date", "extra"]
+    assert df["extra"].tolist()[0] == "x" and df["extra"].tolist()[1] == ""
+    assert df["start_date"].isna().all() and len(df) == 2
+    assert df["batch_id"].tolist()[1] is pd.NA
+
+
+def test_empty_sheet_has_every_schema_column():
+    df = decode_sheet("info", [])
+    assert list(df.columns) == HEADER and df.empty
+    assert str(decode_sheet("info", [HEADER])["batch_id"].dtype) == "Int64"
+
+
+def test_count_phase_column_is_read_by_position():
+    df = decode_sheet("cell_counts", [["username", "batch_id", "Phase", "A"], ["ann", "1", "Day 15", "1,000"]])
+    assert df["phase"].tolist() == ["Day 15"] and df["A"].tolist() == ["1,000"]
+
+
+def test_build_index_first_row_wins_and_skips_missing_keys():
+    from sheets import COUNTS_KEY, INFO_KEY, build_index
+
+    df = decode_sheet("info", [
+        HEADER,
+        ["ann", "1", "H9", "", "", "", "", "", ""],
+        ["ann", "2", "H9", "", "", "", "", "", ""],
+        ["ann", "1", "H1", "", "", "", "", "", ""],   # repeat: the first row wins
+        ["bob", "x", "H9", "", "", "", "", "", ""],   # no batch id: not indexed
+    ])
+    index = build_index(df, INFO_KEY)
+    assert index == {("ann", 1): 0, ("ann", 2): 1}
+    assert all(type(u) is str and type(b) is int for u, b in index)  # plain keys for plain lookups
+
+    counts = decode_sheet("cell_counts", [["username", "batch_id", "Phase"], ["ann", "1", "Day 15"], ["ann", "1", "Day 21"]])
+    assert build_index(counts, COUNTS_KEY) == {("ann", 1, "Day 15"): 0, ("ann", 1, "Day 21"): 1}
+    assert build_index(decode_sheet("info", []), INFO_KEY) == {}
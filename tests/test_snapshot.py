@@ -0,0 +1,128 @@
+"""The stale-while-revalidate snapshot store: cold starts, background refreshes and invalidation."""
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+from snapshot import SnapshotStore, load_snapshot, snapshot_path
+
+
+def _frame(*values):
+    return pd.DataFrame({"batch_id": list(values)})
+
+
+def _fails():
+    raise AssertionError("fetched from the API")
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "snapshots")
+
+
+def test_cold_start_fetches_once_and_writes_the_snapshot(directory):
+    calls = []
+    store = SnapshotStore(directory)
+    df = store.get("info", lambda: calls.append(1) or _frame(1, 2))
+    assert df["batch_id"].tolist() == [1, 2] and calls == [1]
+    assert store.get("info", _fails) is df
+    assert load_snapshot("info", directory)[0]["batch_id"].tolist() == [1, 2]
+
+
+def test_restart_serves_the_snapshot_without_fetching(directory):
+    SnapshotStore(directory).get("info", lambda: _frame(1))
+    restarted = SnapshotStore(directory)
+    assert restarted.has("info")
+    assert restarted.get("info", _fails)["batch_id"].tolist() == [1]
+    assert restarted.pending() == []
+
+
+def test_stale_copy_is_served_while_it_refreshes(directory):
+    store = SnapshotStore(directory, ttl=0)
+    store.get("info", lambda: _frame(1))
+    release = threading.Event()
+
+    def slow_fetch():
+        release.wait(5)
+        return _frame(1, 2)
+
+    # Stale: the old frame comes back at once, the fetch runs in the background
+    assert store.get("info", slow_fetch)["batch_id"].tolist() == [1]
+    assert len(store.pending()) == 1 and store.background_updates == 0
+    release.set()
+    store.wait(timeout=5)
+    assert store.background_updates == 1
+    store.ttl = 300
+    assert store.get("info", _fails)["batch_id"].tolist() == [1, 2]
+
+
+def test_failed_refresh_keeps_the_last_good_copy(directory):
+    store = SnapshotStore(directory, ttl=0)
+    store.get("info", lambda: _frame(1))
+
+    def broken():
+        raise ConnectionError
+
+    store.get("info", broken)
+    store.wait(timeout=5)
+    assert store.background_updates == 0
+    assert store.get("info", lambda: _frame(9))["batch_id"].tolist() == [1]
+
+
+def test_invalidate_rereads_and_drops_late_background_fetches(directory):
+    store = SnapshotStore(directory, ttl=0)
+    store.get("info", lambda: _frame(1))
+    release = threading.Event()
+
+    def old_fetch():
+        release.wait(5)
+        return _frame("stale")
+
+    store.get("info", old_fetch)
+    # A write lands while the refresh is in flight: the next read does not wait for it
+    store.invalidate("info")
+    assert not os.path.exists(snapshot_path("info", directory)) and not store.has("info")
+    assert store.pending() == []
+    assert store.get("info", lambda: _frame(1, 2, 3))["batch_id"].tolist() == [1, 2, 3]
+    release.set()
+    for thread in threading.enumerate():
+        if thread.name == "snapshot-refresh-info":
+            thread.join(5)
+    store.ttl = 300
+    assert store.get("info", _fails)["batch_id"].tolist() == [1, 2, 3]
+    assert store.background_updates == 0
+
+
+def test_derived_values_follow_their_frame(directory):
+    store = SnapshotStore(directory)
+    builds = []
+    build = lambda df: builds.append(1) or len(df)
+    df = store.get("info", lambda: _frame(1, 2))
+    assert store.derived("info", df, "size", build) == 2
+    assert store.derived("info", df, "size", build) == 2 and len(builds) == 1
+    store.invalidate("info")
+    df = store.get("info", lambda: _frame(1, 2, 3))
+    assert store.derived("info", df, "size", build) == 3 and len(builds) == 2
+
+
+def test_memory_only_sheets_never_touch_the_disk(directory):
+    os.makedirs(directory)
+    # A copy written before the sheet became memory-only is removed on first read
+    _frame("old").to_feather(snapshot_path("accounts", directory))
+    store = SnapshotStore(directory)
+    assert not store.has("accounts")
+    assert store.get("accounts", lambda: _frame("pw"))["batch_id"].tolist() == ["pw"]
+    assert not os.path.exists(snapshot_path("accounts", directory))
+    assert store.has("accounts")
+    assert not SnapshotStore(directory).has("accounts")
+
+
+def test_warm_loads_from_disk_or_fetches_quietly(directory):
+    SnapshotStore(directory).get("info", lambda: _frame(1))
+    store = SnapshotStore(directory)
+    assert store.warm("info", _fails) is None
+    thread = store.warm("cell_counts", lambda: _frame(5))
+    thread.join(5)
+    assert store.get("cell_counts", _fails)["batch_id"].tolist() == [5]
+    assert store.background_updates == 0  # nothing on screen was stale
@@ -0,0 +1,37 @@
+"""Views are imported on first use, each without the others or the heavy optional libraries."""
+import sys
+
+import pytest
+
+import import_budget
+import perf
+import views
+
+
+def test_render_imports_the_view_on_first_use(tmp_path, monkeypatch):
+    (tmp_path / "probe_view.py").write_text("seen = []\ndef render(ctx):\n    seen.append(ctx)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setitem(views.VIEWS, "Probe", "probe_view")
+    monkeypatch.delitem(sys.modules, "probe_view", raising=False)
+    perf.begin_run()
+    try:
+        views.render("Probe", "ctx")
+        views.render("Probe", "again")
+        spans = perf.current().spans
+    finally:
+        perf.end_run(log_path=None)
+    assert sys.modules["probe_view"].seen == ["ctx", "again"]
+    assert [(s["name"], s["view"]) for s in spans] == [("view_import", "Probe")] * 2
+
+
+def test_views_package_imports_no_view():
+    _, new_modules = import_budget.measure("views", ["common"])
+    assert not set(views.VIEWS.values()) & set(new_modules)
+
+
+@pytest.mark.parametrize("module", sorted(views.VIEWS.values()))
+def test_a_view_imports_no_other_view(module):
+    _, new_modules = import_budget.measure(module, ["common", "views"])
+    others = set(views.VIEWS.values()) - {module}
+    assert not others & set(new_modules)
+    assert not {m.split(".")[0] for m in new_modules} & set(import_budget.LAZY_ONLY)
@@ -0,0 +1,48 @@
+"""The streamed Excel export: sheets, calendar shading and composition rows."""
+from datetime import timedelta
+
+import openpyxl
+import pandas as pd
+
+from core.registry import STYLE_MEDIA
+from core.rules import default_volume_ml
+from core.volumes import composition_volumes
+from core.workbook import COMPOSITION_COLUMNS, FILL_COLORS, TASK_SHEET_COLUMNS, write_workbook
+
+
+def _write(tmp_path, batches, registry, start, end, today):
+    path = tmp_path / "export.xlsx"
+    write_workbook(str(path), batches.assign(protocol=""), registry, start, end, today=today)
+    return openpyxl.load_workbook(path)
+
+
+def test_workbook_sheets_shading_and_compositions(tmp_path, batches, registry, today):
+    start, end = today, today + timedelta(days=6)
+    wb = _write(tmp_path, batches, registry, start, end, today)
+    assert wb.sheetnames == ["Calendar", "Tasks", "Compositions"]
+
+    # Calendar: batch 1 started on 2026-03-10, so its first column is protocol day 4, a media change
+    cal = wb["Calendar"]
+    row = next(r for r in cal.iter_rows(min_row=4) if r[0].value == 1)
+    assert row[3].value == 4 and registry.get().on("style", 4) == STYLE_MEDIA
+    assert row[3].fill.start_color.rgb.endswith(FILL_COLORS[STYLE_MEDIA])
+    assert row[3].border.left.style == "thick"  # today's column
+    assert row[4].value == 5 and row[4].fill.fill_type is None
+
+    tasks = pd.DataFrame(wb["Tasks"].values)
+    assert tasks.iloc[0].tolist() == TASK_SHEET_COLUMNS
+    # Batch 2 is past the protocol, 7 starts after the range and 5 has no start date
+    assert set(tasks.iloc[1:, 2]) == {1, 3, 9}
+
+    comps = pd.DataFrame(list(wb["Compositions"].values)[1:], columns=COMPOSITION_COLUMNS)
+    first = comps[(comps["day"] == 4) & (comps["batches"] == "1")]
+    entry = registry.get().days[4][0]
+    expected = composition_volumes(entry, default_volume_ml(4))
+    assert first["component"].tolist() == [c["Component"] for c in expected]
+    assert first["volume"].tolist() == [c["Volume"] for c in expected]
+    assert (first["task"] == entry["task"]).all() and (first["total_ml"] == default_volume_ml(4)).all()
+
+
+def test_workbook_without_batches(tmp_path, batches, registry, today):
+    wb = _write(tmp_path, batches.iloc[:0], registry, today, today, today)
+    assert wb["Calendar"].max_row == 3 and wb["Tasks"].max_row == 1
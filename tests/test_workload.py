@@ -0,0 +1,73 @@
+"""Daily workload and start-date ranking against a plain loop over batches and dates."""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.rules import task_weight
+from core.workload import PEAK_WEIGHT, WEEKEND_WEIGHT, daily_load, rank_start_dates, workload_profile
+
+
+def _load_per_row(batches, profile, first, last):
+    dates = pd.date_range(first, last, freq="D")
+    load = pd.Series(0.0, index=dates)
+    for _, b in batches.iterrows():
+        if pd.isna(b["start_date"]):
+            continue
+        for day, weight in enumerate(profile):
+            due = b["start_date"] + pd.Timedelta(days=day)
+            if pd.notna(b["end_date"]) and due > b["end_date"]:
+                continue
+            if due in load.index:
+                load[due] += weight
+    return load
+
+
+def test_workload_profile_sums_task_weights(registry):
+    protocol = registry.get().days
+    profile = workload_profile(protocol)
+    for day, entries in protocol.items():
+        assert profile[day] == pytest.approx(sum(task_weight(e["task"]) for e in entries))
+
+
+def test_daily_load_matches_per_row(batches, registry, today):
+    profile = workload_profile(registry.get().days)
+    first, last = today - timedelta(days=20), today + timedelta(days=40)
+    got = daily_load(batches, profile, first, last)
+    pd.testing.assert_series_equal(got, _load_per_row(batches, profile, first, last), check_freq=False)
+
+
+def test_daily_load_per_batch_profiles(batches, registry, today):
+    profile = workload_profile(registry.get().days)
+    halved = np.vstack([profile if i % 2 else profile / 2 for i in range(len(batches))])
+    first, last = today - timedelta(days=20), today + timedelta(days=40)
+    expected = sum(
+        _load_per_row(batches.iloc[[i]], halved[i], first, last) for i in range(len(batches))
+    )
+    pd.testing.assert_series_equal(daily_load(batches, halved, first, last), expected, check_freq=False)
+
+
+def test_rank_start_dates_matches_brute_force(batches, registry, today):
+    profile = workload_profile(registry.get().days)
+    first, last = today, today + timedelta(days=13)
+    ranked = rank_start_dates(batches, profile, first, last)
+    assert len(ranked) == 14
+    existing = _load_per_row(batches, profile, first, last + timedelta(days=len(profile)))
+    for _, row in ranked.iterrows():
+        days = pd.date_range(row["start_date"], periods=len(profile), freq="D")
+        around = existing[days].to_numpy()
+        total = around + profile
+        peak = max(t for t, p in zip(total, profile) if p > 0)
+        weekend = sum(p for d, p in zip(days, profile) if d.weekday() >= 5)
+        assert row["overlap"] == pytest.approx(around @ profile)
+        assert row["peak_load"] == pytest.approx(peak)
+        assert row["weekend_work"] == pytest.approx(weekend)
+        assert row["score"] == pytest.approx(around @ profile + PEAK_WEIGHT * peak + WEEKEND_WEIGHT * weekend)
+    assert ranked["score"].is_monotonic_increasing
+
+
+def test_rank_start_dates_empty_window(batches, registry, today):
+    profile = workload_profile(registry.get().days)
+    assert rank_start_dates(batches, profile, today, today - timedelta(days=1)).empty
+    assert rank_start_dates(batches, [], today, today + timedelta(days=5)).empty
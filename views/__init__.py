@@ -0,0 +1,67 @@
+"""
+One module per view, each exposing `render(ctx)` (ctx is a common.AppContext).
+
+A view's module is imported the first time that view is selected, so a rerun
+only pays for the page on screen and a cold start does not load the
+dependencies of pages nobody has opened yet.
+
+Views run as fragments through `fragment` below rather than `st.fragment`
+directly: a fragment rerun skips streamlit_app.py, so it opens and closes its
+own perf timer and is logged as a run of kind "fragment".
+"""
+import importlib
+from functools import wraps
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import perf
+
+VIEWS = {
+    "Calendar": "views.calendar",
+    "Tasks": "views.tasks",
+    "Batch Manager": "views.batch_manager",
+    "Image Viewer": "views.image_viewer",
+    "History": "views.history",
+    "Reagents": "views.reagents",
+    "Cell Counts": "views.counts",
+    "Admin": "views.admin",
+}
+
+
+def render(name, ctx):
+    with perf.span("view_import", view=name):
+        module = importlib.import_module(VIEWS[name])
+    module.render(ctx)
+
+
+def is_fragment_rerun():
+    """True while Streamlit is rerunning only fragments, not the whole script."""
+    run_ctx = get_script_run_ctx()
+    return bool(run_ctx is not None and run_ctx.fragment_ids_this_run)
+
+
+def time_fragment_reruns(func):
+    """`func` wrapped to log each call made by a fragment rerun as a perf run of kind "fragment"."""
+    @wraps(func)
+    def run(*args, **kwargs):
+        if not is_fragment_rerun():
+            return func(*args, **kwargs)
+        perf.begin_run(
+            user=st.session_state.get("username"), view=st.session_state.get("view"),
+            run="fragment", fragment=func.__qualname__,
+        )
+        try:
+            return func(*args, **kwargs)
+        finally:
+            perf.end_run()
+
+    return run
+
+
+def fragment(func):
+    """
+    st.fragment that times its own reruns: a fragment rerun is logged as a run
+    of kind "fragment"; during a full run it is timed as part of that run.
+    """
+    return st.fragment(time_fragment_reruns(func))
@@ -0,0 +1,46 @@
+"""Admin-only tools: per-session memory, eviction and tracemalloc."""
+import time
+import tracemalloc
+
+import pandas as pd
+import streamlit as st
+
+import memwatch
+from common import get_memory_registry, memory_caps_mb
+
+
+def render(ctx):
+    """Per-session memory estimates, eviction and tracemalloc allocation sites."""
+    st.subheader("🛡️ Admin · Memory")
+    session_cap_mb, process_cap_mb = memory_caps_mb()
+    registry = get_memory_registry()
+    st.markdown(
+        f"**Process RSS:** {memwatch.process_rss_bytes() / memwatch.MB:.0f} MB "
+        f"(cap {process_cap_mb:.0f} MB) · "
+        f"**Tracked session state:** {registry.total_bytes() / memwatch.MB:.1f} MB "
+        f"(cap {session_cap_mb:.0f} MB per session)"
+    )
+    reports = registry.sessions()
+    if not reports:
+        st.info("No session has reported yet.")
+    else:
+        st.dataframe(pd.DataFrame([{
+            "user": r["user"],
+            "session": r["session"][:8],
+            "MB": round(r["bytes"] / memwatch.MB, 2),
+            "seen (s ago)": int(time.time() - r["updated"]),
+            "largest entries": ", ".join(f"{k} ({v / memwatch.MB:.1f} MB)" for k, v in list(r["top"].items())[:3]),
+        } for r in reports]), use_container_width=True, hide_index=True)
+        labels = {f"{r['user']} · {r['session'][:8]}": r["session"] for r in reports}
+        target = st.selectbox("Session", list(labels), key="admin_evict_target")
+        if st.button("Evict cached artifacts"):
+            registry.request_eviction(labels[target])
+            st.success("Eviction requested; it takes effect on that session's next rerun.")
+
+    st.markdown("**tracemalloc**")
+    if tracemalloc.is_tracing():
+        st.dataframe(pd.DataFrame(memwatch.tracemalloc_top()), use_container_width=True, hide_index=True)
+        if st.button("Stop tracing"):
+            tracemalloc.stop()
+    elif st.button("Start tracing (slows the whole process)"):
+        tracemalloc.start()
@@ -0,0 +1,258 @@
+"""Add a batch, or load one by id to edit its information and cell counts."""
+from datetime import timedelta
+
+import pandas as pd
+import streamlit as st
+
+import perf
+from archive import ARCHIVES, WRITE_LOCK, SheetChangedError, delete_batch
+from common import (
+    cell_text, ensure_info_headers, find_batch, find_counts, get_protocol_registry,
+    index_saved_batch, invalidate, read_sheet, user_batch_ids, worksheet,
+)
+from core.rules import LAST_DAY
+from core.workload import WEEKEND_WEIGHT, rank_start_dates
+from views import fragment
+
+
+def _use_start_date(start):
+    """Button callback: fill the new-batch dates before the form widgets are drawn."""
+    st.session_state["new_sdate"] = start
+    st.session_state["new_edate"] = start + timedelta(days=LAST_DAY)
+
+
+def protocol_select(label, key, current=None):
+    """Protocol version picker; a batch's version is kept as an option even if its workbook is gone."""
+    registry = get_protocol_registry()
+    options = registry.versions()
+    current = registry.resolve(current)
+    if current not in options:
+        options.append(current)
+    return st.selectbox(label, options, index=options.index(current), key=key)
+
+
+def start_date_suggestions(ctx, version):
+    """The best start dates in a window for a new `version` batch, given the batches already scheduled."""
+    col_from, col_to = st.columns(2)
+    with col_from:
+        first = st.date_input("Earliest start", value=ctx.today, key="opt_from")
+    with col_to:
+        last = st.date_input("Latest start", value=ctx.today + timedelta(days=14), key="opt_to")
+    col_scope, col_weekend = st.columns(2)
+    with col_scope:
+        scope = st.radio("Balance against", ["My batches", "Whole lab"], horizontal=True, key="opt_scope")
+    with col_weekend:
+        avoid_weekends = st.checkbox("Avoid weekend work", value=True, key="opt_weekends")
+    if last < first:
+        st.warning("The latest start is before the earliest one.")
+        return
+    batches = read_sheet("info")
+    if scope == "My batches":
+        batches = batches[batches["username"] == ctx.username]
+    registry = get_protocol_registry()
+    try:
+        profile = registry.get(version).weight
+        # Each scheduled batch weighs in with its own version's workload
+        batch_profiles = registry.rows("weight", registry.versions_of(batches))
+    except (FileNotFoundError, KeyError):
+        st.warning(f"Protocol file for '{version}' not found.")
+        return
+    with perf.span("rank_start_dates", batches=len(batches)):
+        ranked = rank_start_dates(
+            batches, profile, first, last,
+            weekend_weight=WEEKEND_WEIGHT if avoid_weekends else 0.0,
+            batch_profiles=batch_profiles,
+        ).head(5)
+    if ranked.empty:
+        # A protocol with no task days scores nothing
+        st.info(f"No start dates to suggest: protocol '{version}' has no scheduled work.")
+        return
+    st.caption(
+        "Lower score is better: work already scheduled on the new batch's task days, "
+        "its busiest day and (optionally) its weekend work, in media-change units."
+    )
+    st.dataframe(pd.DataFrame({
+        "Start": ranked["start_date"].dt.strftime("%a %Y-%m-%d"),
+        "Score": ranked["score"].round(1),
+        "Busiest day": ranked["peak_date"].dt.strftime("%a %m-%d") + " (" + ranked["peak_load"].round(1).astype(str) + ")",
+        "Overlap": ranked["overlap"].round(1),
+        "Weekend work": ranked["weekend_work"].round(1),
+    }), use_container_width=True, hide_index=True)
+    buttons = st.columns(len(ranked))
+    for col, start in zip(buttons, ranked["start_date"].dt.date):
+        with col:
+            st.button(f"Use {start:%m-%d}", key=f"opt_use_{start}", on_click=_use_start_date, args=(start,))
+
+
+@fragment
+def render(ctx):
+    """Add / edit batches. Runs as a fragment: editing a field or a cell-count cell reruns only this view."""
+    st.subheader("📋 Batch Manager")
+    username, today = ctx.username, ctx.today
+    if st.toggle("📦 Bulk import / export", key="bulk_show"):
+        # Imported on first use, like the views themselves
+        from views import bulk
+        bulk.render(ctx)
+    ws_info, ws_counts = worksheet("info"), worksheet("cell_counts")
+
+    if 'mode' not in st.session_state or st.session_state['mode'] == 'none':
+        st.session_state['mode'] = 'add'
+    if 'edit_id' not in st.session_state:
+        st.session_state['edit_id'] = None
+
+    col_add, col_load, col_button = st.columns([1, 3, 1])
+    with col_add:
+        if st.button("Add new batch"):
+            st.session_state['mode'] = 'add'
+            st.session_state['edit_id'] = None
+    with col_load:
+        load_bid = st.number_input("Batch ID to Load", min_value=1, step=1, key='load_bid')
+    with col_button:
+        if st.button("Load"):
+            st.session_state['mode'] = 'edit'
+            st.session_state['edit_id'] = int(load_bid)
+
+    if st.session_state['mode'] == 'add':
+        st.subheader("Batch Information")
+        # Next id after every batch this user has ever saved, not just the ongoing ones,
+        # so a new batch never reuses the id of a finished one
+        user_ids = user_batch_ids(username)
+        default_id = max(user_ids) + 1 if user_ids else 1
+        new_bid   = st.number_input("Batch ID",      min_value=1, step=1, value=default_id, key='new_bid')
+        new_cell  = st.text_input("Cell Type",      key='new_cell')
+        new_protocol = protocol_select("Protocol", key='new_protocol')
+        if st.toggle("🗓️ Suggest a start date", key="opt_show"):
+            start_date_suggestions(ctx, new_protocol)
+        # Defaults go through session_state so a suggested start date can fill them in
+        st.session_state.setdefault('new_sdate', today)
+        st.session_state.setdefault('new_edate', today + timedelta(days=21))
+        new_sdate = st.date_input("Start Date", key='new_sdate')
+        new_edate = st.date_input("End Date (opt)", key='new_edate')
+        new_note   = st.text_area("Note",           key='new_note')
+        new_initial_plate_count = st.text_input("Initial Plate Count", key='new_initial_plate_count')
+        new_replaced_plate_count = st.text_input("Replaced Plate Count", key='new_replaced_plate_count')
+
+        # --- Cell Count Table Editor ---
+        cols = ["A", "B", "C"] + [str(i) for i in range(1, 16)]
+        cell_index = ["Day 15", "Day 21", "Banking"]
+        # No local file: always create new empty DataFrame for new batch
+        cell_df = pd.DataFrame(index=cell_index, columns=cols)
+        edited_cell_df = st.data_editor(cell_df, use_container_width=True)
+
+        if st.button("Save New Batch"):
+            # Append to info sheet
+            info_row = [
+                username,
+                int(new_bid),
+                new_cell,
+                new_sdate.strftime("%Y.%m.%d"),
+                new_note,
+                new_initial_plate_count,
+                new_replaced_plate_count,
+                new_edate.strftime("%Y.%m.%d"),
+                new_protocol,
+            ]
+            with WRITE_LOCK:
+                ensure_info_headers()
+                ws_info.append_row(info_row)
+                index_saved_batch(username, new_bid, info_row)
+                invalidate("info")
+
+                # Append each cell_count row
+                for day in edited_cell_df.index:
+                    row = [username, int(new_bid), day] + edited_cell_df.loc[day].fillna("").tolist()
+                    ws_counts.append_row(row)
+
+                    st.success(f"Batch {new_bid} created and saved to Google Sheets.")
+                    # page refresh removed
+                invalidate("cell_counts")
+
+    elif st.session_state['mode'] == 'edit':
+        bid = st.session_state['edit_id']
+        st.subheader(f"Batch Information #{bid}")
+        # Look the batch up in the cached info sheet
+        rec = find_batch(username, bid)
+        if rec is not None:
+            edit_cell = st.text_input("Cell Type", value=cell_text(rec.get('cell')), key='edit_cell')
+            edit_protocol = protocol_select("Protocol", key='edit_protocol', current=rec.get('protocol'))
+            # Dates arrive parsed (NaT when blank or malformed)
+            sdt = rec.get('start_date')
+            edt_parsed = rec.get('end_date')
+            # Default to start_date + 21 days if parsed end is NaT
+            if pd.isna(edt_parsed) and not pd.isna(sdt):
+                default_edate = (sdt + timedelta(days=21)).date()
+            elif pd.isna(edt_parsed):
+                default_edate = today + timedelta(days=21)
+            else:
+                default_edate = edt_parsed.date()
+
+            edit_sdate = st.date_input(
+                "Start Date",
+                value=sdt.date() if not pd.isna(sdt) else today,
+                key='edit_sdate'
+            )
+            edit_edate = st.date_input(
+                "End Date",
+                value=default_edate,
+                key='edit_edate'
+            )
+            edit_note   = st.text_area("Note", value=cell_text(rec.get('note')), key='edit_note')
+            edit_initial_plate_count = st.text_input("Initial Plate Count", value=cell_text(rec.get('initial_plate_count')), key='edit_initial_plate_count')
+            edit_replaced_plate_count = st.text_input("Replaced Plate Count", value=cell_text(rec.get('replaced_plate_count')), key='edit_replaced_plate_count')
+
+            # --- Cell Count Table Editor ---
+            st.subheader("Cell count information")
+            cols = ["A", "B", "C"] + [str(i) for i in range(1, 16)]
+            cell_index = ["Day 15", "Day 21", "Banking"]
+            # Load cell counts from the cached cell_counts sheet
+            cell_df = pd.DataFrame(index=cell_index, columns=cols)
+            for phase, row in find_counts(username, bid).items():
+                cell_df.loc[phase] = [row.get(c, "") for c in cols]
+            edited_cell_df = st.data_editor(cell_df, use_container_width=True)
+
+            if st.button("Update Batch Information"):
+                updated_row = [
+                    username, bid,
+                    edit_cell,
+                    edit_sdate.strftime("%Y.%m.%d"),
+                    edit_note,
+                    edit_initial_plate_count,
+                    edit_replaced_plate_count,
+                    edit_edate.strftime("%Y.%m.%d"),
+                    edit_protocol,
+                ]
+                parts = ["info", "cell_counts", *ARCHIVES.values()]
+                with WRITE_LOCK:
+                    # Before anything is deleted: a header problem must not leave the batch half-removed
+                    ensure_info_headers()
+
+                    # Delete this batch's old rows, from the archive too if it was finished and moved there.
+                    # Rows are found by (username, batch_id) on live reads and checked again just before
+                    # each delete (see archive.delete_where), so rows shifted by other writers are never hit.
+                    leftover = None
+                    try:
+                        for name in parts:
+                            delete_batch(worksheet(name), name, username, bid)
+                    except SheetChangedError as exc:
+                        # The new rows are written regardless, so the batch is never left out of the sheet
+                        leftover = exc
+
+                    ws_info.append_row(updated_row)
+                    index_saved_batch(username, bid, updated_row)
+
+                    # Rewrite cell_counts for this batch
+                    for day in edited_cell_df.index:
+                        row = [username, bid, day] + edited_cell_df.loc[day].fillna("").tolist()
+                        ws_counts.append_row(row)
+                invalidate(*parts)
+                if leftover is not None:
+                    st.warning(f"Batch {bid} was saved, but some old rows could not be removed ({leftover}). Update it again.")
+                st.session_state["update_ack"] = bid
+        # If no record loaded, show error
+        if rec is None:
+            st.error(f"Batch {bid} not found.")
+        else:
+            # Show update confirmation if just updated
+            if st.session_state.get("update_ack") == bid:
+                st.success(f"Batch {bid} updated in Google Sheets.")
+                del st.session_state["update_ack"]
@@ -0,0 +1,100 @@
+"""Bulk import and export of batches and cell counts (a Batch Manager panel, see bulk.py)."""
+import io
+
+import streamlit as st
+
+import bulk
+import perf
+from archive import ARCHIVES, WRITE_LOCK
+from common import (
+    EVICTABLE_PREFIX, account_session_memory, ensure_info_headers, get_protocol_registry, invalidate, read_sheet,
+    user_batch_ids, worksheet,
+)
+from views import fragment, is_fragment_rerun
+
+# The last export zip built in this session, with the user and day it was built for
+EXPORT_KEY = EVICTABLE_PREFIX + "bulk_export"
+
+
+def _export(username):
+    """The user's export zip as bytes."""
+    with perf.span("bulk_export"):
+        batches, counts = bulk.export_frames(
+            [read_sheet("info"), read_sheet(ARCHIVES["info"])],
+            [read_sheet("cell_counts"), read_sheet(ARCHIVES["cell_counts"])],
+            username,
+        )
+        return bulk.write_export(batches, counts, io.BytesIO()).getvalue()
+
+
+@fragment
+def render(ctx):
+    """
+    Import many batches with their cell counts from a CSV, Excel or zip file, and
+    export all of this user's batches as a zip in the same layout. Runs as a fragment.
+    """
+    username = ctx.username
+    ack = st.session_state.pop("bulk_ack", None)
+    if ack:
+        st.success(ack)
+    wanted = (username, ctx.today)
+    if st.button("Export all my batches", key="bulk_export_build"):
+        st.session_state[EXPORT_KEY] = (wanted, _export(username))
+        # The zip is an evictable artifact; a fragment rerun is not accounted by streamlit_app.py
+        if is_fragment_rerun():
+            account_session_memory(ctx)
+    built = st.session_state.get(EXPORT_KEY)
+    if built is not None and built[0] == wanted:
+        st.download_button(
+            "Download export (zip)",
+            built[1],
+            file_name=f"{username}_batches_{ctx.today:%Y%m%d}.zip",
+            mime="application/zip",
+            key="bulk_export",
+        )
+
+    st.caption(
+        "Import: a CSV of batches (" + ", ".join(bulk.BATCH_FIELDS) + "), a CSV of cell counts "
+        "(batch_id, phase, A–C, 1–15), an Excel file with `batches` and `cell_counts` sheets, "
+        "or a zip as exported above. Nothing is written unless every row is valid."
+    )
+    # A new key after each import clears the uploader, so the same file is not offered again
+    generation = st.session_state.setdefault("bulk_upload_gen", 0)
+    upload = st.file_uploader("Import file", type=["csv", "xlsx", "zip"], key=f"bulk_upload_{generation}")
+    if upload is None:
+        return
+    try:
+        tables = bulk.read_upload(upload.name, upload.getvalue())
+    except (ValueError, KeyError) as exc:
+        st.error(f"Could not read {upload.name}: {exc}")
+        return
+    if tables["batches"] is None:
+        st.error("Cell counts can only be imported together with their batches.")
+        return
+
+    registry = get_protocol_registry()
+    with perf.span("bulk_validate", rows=len(tables["batches"])):
+        plan = bulk.plan_import(
+            tables["batches"], tables["cell_counts"], username,
+            user_batch_ids(username), registry.versions(), registry.default,
+        )
+    if not plan.errors.empty:
+        st.error(f"{len(plan.errors)} problem(s) found; fix them and upload the file again.")
+        st.dataframe(plan.errors, use_container_width=True, hide_index=True)
+        return
+    if not plan.ok:
+        st.info("The file holds no batches.")
+        return
+
+    n = len(plan.info_rows)
+    st.caption(f"{n} batch{'es' if n != 1 else ''} and {len(plan.count_rows)} cell-count rows ready to import.")
+    st.dataframe(plan.batches.head(50), use_container_width=True, hide_index=True)
+    if st.button(f"Import {n} batch{'es' if n != 1 else ''}", key="bulk_import"):
+        with WRITE_LOCK, perf.span("bulk_write", batches=n, counts=len(plan.count_rows)):
+            ensure_info_headers()
+            requests = bulk.write_import(plan, worksheet("info"), worksheet("cell_counts"))
+        invalidate("info", "cell_counts")
+        st.session_state.pop(EXPORT_KEY, None)
+        st.session_state["bulk_ack"] = f"Imported {n} batch{'es' if n != 1 else ''} in {requests} request(s)."
+        st.session_state["bulk_upload_gen"] = generation + 1
+        st.rerun()
@@ -0,0 +1,67 @@
+"""Differentiation Calendar: the next 22 days of every ongoing batch, and its Excel export."""
+import io
+from datetime import timedelta
+
+import pandas as pd
+import streamlit as st
+
+import perf
+from archive import ARCHIVES
+from common import EVICTABLE_PREFIX, calendar_styles, get_protocol_registry, make_calendar, read_sheet, style_calendar
+from core.workbook import write_workbook
+
+# The last workbook built in this session, with the (user, from, to) it was built for
+EXPORT_KEY = EVICTABLE_PREFIX + "xlsx_export"
+
+
+def _workbook(username, start, end, today):
+    """The styled calendar / tasks / compositions workbook as bytes."""
+    frames = [read_sheet(name) for name in ("info", ARCHIVES["info"])]
+    batches = pd.concat([df[df["username"] == username] for df in frames], ignore_index=True)
+    # A batch in both partitions (see archive.py): the hot copy wins
+    batches = batches.drop_duplicates("batch_id")
+    with perf.span("export_workbook", batches=len(batches), days=(end - start).days + 1):
+        return write_workbook(io.BytesIO(), batches, get_protocol_registry(), start, end, today=today).getvalue()
+
+
+def export_workbook(ctx):
+    """
+    Date range and download button for the Excel export of this user's batches.
+    The workbook is only built when asked for, then kept for the download button
+    until the range changes.
+    """
+    col_from, col_to = st.columns(2)
+    with col_from:
+        start = st.date_input("From", value=ctx.today, key="xlsx_from")
+    with col_to:
+        end = st.date_input("To", value=ctx.today + timedelta(weeks=12), key="xlsx_to")
+    if end < start:
+        st.warning("The end date is before the start date.")
+        return
+    wanted = (ctx.username, start, end)
+    if st.button("Build Excel workbook", key="xlsx_build"):
+        st.session_state[EXPORT_KEY] = (wanted, _workbook(ctx.username, start, end, ctx.today))
+    built = st.session_state.get(EXPORT_KEY)
+    if built is None or built[0] != wanted:
+        return
+    st.download_button(
+        "Download calendar & tasks (.xlsx)",
+        built[1],
+        file_name=f"{ctx.username}_calendar_{start:%Y%m%d}_{end:%Y%m%d}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        key="xlsx_download",
+    )
+
+
+def render(ctx):
+    st.subheader("📆 Differentiation Calendar")
+    if ctx.batches.empty:
+        st.info("No ongoing batches to display.")
+    else:
+        cal = make_calendar(ctx.batches, ctx.today)
+        styled = cal.style.apply(style_calendar, today=ctx.today, styles=calendar_styles(ctx.batches, cal), axis=None)
+        st.dataframe(styled, use_container_width=True, hide_index=False)
+        # Display scheme image below calendar
+        st.image("scheme.png", use_container_width=True)
+    with st.expander("📥 Export to Excel"):
+        export_workbook(ctx)
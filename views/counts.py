@@ -0,0 +1,60 @@
+"""Cell Counts: yield per phase and Day 15 → Day 21 expansion across batches, by group and month."""
+import time
+
+import pandas as pd
+import streamlit as st
+
+from common import batch_yields
+from core.counts import EXPANSION, YIELD_COLUMNS, yield_summary, yield_trend
+from views import fragment
+
+GROUPS = {"Cell type": "cell", "User": "username", "Protocol": "protocol"}
+
+
+def _cells(value):
+    return "" if pd.isna(value) else f"{value:.2e}"
+
+
+@fragment
+def render(ctx):
+    """
+    Lab-wide or own yields from every batch with counts, hot or archived. The
+    per-batch table is cached; each widget change is a group-by over it.
+    Runs as a fragment.
+    """
+    st.subheader("🔬 Cell Counts")
+    col_scope, col_by, col_metric = st.columns(3)
+    with col_scope:
+        scope = st.radio("Batches", ["My batches", "Whole lab"], horizontal=True, key="counts_scope")
+    with col_by:
+        by = GROUPS[st.selectbox("Group by", list(GROUPS), key="counts_by")]
+    with col_metric:
+        metric = st.selectbox("Trend of", [EXPANSION, *YIELD_COLUMNS.values()], key="counts_metric")
+
+    yields = batch_yields()
+    t0 = time.perf_counter()
+    if scope == "My batches":
+        yields = yields[yields["username"] == ctx.username]
+    if yields.empty:
+        st.info("No cell counts recorded yet.")
+        return
+    summary = yield_summary(yields, by)
+    trend = yield_trend(yields, metric, by)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+
+    n = len(yields)
+    st.caption(f"{n} batch{'es' if n != 1 else ''} with counts · medians per group · {elapsed_ms:.0f} ms")
+    table = summary.rename(columns={by: next(k for k, v in GROUPS.items() if v == by)})
+    for col in table.columns:
+        if col.endswith(" cells"):
+            table[col] = table[col].map(_cells)
+    table[f"median {EXPANSION}"] = table[f"median {EXPANSION}"].round(2)
+    st.dataframe(table, use_container_width=True, hide_index=True)
+
+    st.markdown(f"**Median {metric} by start month**")
+    if trend.empty:
+        st.info(f"No batch has a {metric} value yet.")
+    else:
+        trend.index = trend.index.to_timestamp()
+        trend.columns = [str(c) for c in trend.columns]
+        st.line_chart(trend)
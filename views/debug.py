@@ -0,0 +1,52 @@
+"""Rerun timings and cProfile results, shown with ?debug=<ADMIN_TOKEN> / ?profile=<ADMIN_TOKEN>."""
+import os
+
+import pandas as pd
+import streamlit as st
+
+import perf
+from common import get_prefetcher, read_sheet
+from sheets import frame_nbytes
+
+
+def profile_panel(path):
+    """Top hot functions of the profile just captured, plus the .prof file for a full viewer."""
+    with st.expander("🔬 Profile of this rerun", expanded=True):
+        st.caption(f"Saved to {path}. Open with `snakeviz`, `tuna` or `python -m pstats`.")
+        st.dataframe(pd.DataFrame(perf.top_functions(path, n=30)), use_container_width=True, hide_index=True)
+        with open(path, "rb") as f:
+            st.download_button("Download .prof", f.read(), file_name=os.path.basename(path))
+
+
+def debug_panel():
+    """Timings and Sheets API calls for this rerun, plus p50/p99 over the recent JSONL log."""
+    timer = perf.current()
+    if timer is None:
+        return
+    with st.expander("⏱ Rerun timings", expanded=True):
+        st.markdown(
+            f"**This run:** {timer.elapsed_ms():.1f} ms so far · "
+            f"{timer.api_total()} Sheets API calls"
+        )
+        if timer.spans:
+            spans_df = pd.DataFrame(timer.spans)
+            spans_df["name"] = ["  " * d + n for d, n in zip(spans_df["depth"], spans_df["name"])]
+            st.dataframe(spans_df.drop(columns=["depth"]), use_container_width=True, hide_index=True)
+        if timer.api_calls:
+            st.write({"API calls by method": timer.api_calls})
+        info_df = read_sheet("info")
+        st.caption(f"info table: {len(info_df)} rows, {frame_nbytes(info_df) / 1024:.1f} KiB in memory")
+        prefetcher = get_prefetcher()
+        st.caption(
+            f"prefetch: {prefetcher.stats['done']} done, {prefetcher.stats['failed']} failed, "
+            f"{prefetcher.stats['skipped']} over API budget · queued: {', '.join(prefetcher.pending()) or 'none'} · "
+            f"budget left {prefetcher.bucket.tokens():.1f} calls"
+        )
+        records = perf.read_log(limit=1000)
+        for run in ("full", "fragment"):
+            summary = perf.summarize(records, run)
+            if summary["runs"]:
+                st.caption(
+                    f"Last {summary['runs']} logged {run} reruns: p50 {summary['p50_ms']:.0f} ms · "
+                    f"p99 {summary['p99_ms']:.0f} ms · {summary['api_calls_mean']:.1f} API calls/run"
+                )
@@ -0,0 +1,78 @@
+"""Batch History: search every batch ever run, hot or archived, one page at a time."""
+import math
+import time
+
+import pandas as pd
+import streamlit as st
+
+from common import cell_text, sync_history
+from core.counts import OUTCOMES
+from history import HistoryQuery
+from views import fragment
+
+PAGE_SIZE = 25
+
+
+@fragment
+def render(ctx):
+    """
+    Filter by user, cell type, outcome and start date, and search notes and cell
+    types by keyword (best matches first). Runs as a fragment: paging reruns only this view.
+    """
+    st.subheader("🗂️ Batch History")
+    history = sync_history()
+
+    all_users = history.distinct("username")
+    col_user, col_cell, col_outcome = st.columns(3)
+    with col_user:
+        own = [ctx.username] if ctx.username in all_users else []
+        users = st.multiselect("User", all_users, default=own, key="hist_users")
+    with col_cell:
+        cells = st.multiselect("Cell Type", history.distinct("cell"), key="hist_cells")
+    with col_outcome:
+        outcomes = st.multiselect("Outcome", OUTCOMES, key="hist_outcomes", help="The last phase the batch was counted at")
+    col_from, col_to, col_text = st.columns([1, 1, 2])
+    with col_from:
+        start_from = st.date_input("Started from", value=None, key="hist_from")
+    with col_to:
+        start_to = st.date_input("Started until", value=None, key="hist_to")
+    with col_text:
+        text = st.text_input("Search notes", key="hist_text", placeholder="e.g. contamination, coating, lot")
+    query = HistoryQuery(users=users, cells=cells, start_from=start_from, start_to=start_to, text=text, outcomes=outcomes)
+
+    # New filters start again from the first page; a shrunken result keeps the page in range
+    if st.session_state.get("hist_last_query") != query:
+        st.session_state["hist_last_query"] = query
+        st.session_state["hist_page"] = 1
+
+    t0 = time.perf_counter()
+    total = history.count(query)
+    pages = max(1, math.ceil(total / PAGE_SIZE))
+    st.session_state["hist_page"] = min(st.session_state.get("hist_page", 1), pages)
+    page = st.number_input("Page", min_value=1, max_value=pages, step=1, key="hist_page")
+    rows = history.page(query, page - 1, PAGE_SIZE)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+
+    st.caption(f"{total} batch{'es' if total != 1 else ''} · page {page} of {pages} · {elapsed_ms:.0f} ms")
+    if rows.empty:
+        st.info("No batches match these filters.")
+        return
+    table = pd.DataFrame({
+        "User": rows["username"],
+        "Batch": rows["batch_id"],
+        "Cell": rows["cell"],
+        "Start": rows["start_date"].dt.strftime("%Y-%m-%d").fillna(""),
+        "End": rows["end_date"].dt.strftime("%Y-%m-%d").fillna(""),
+        "Plates (initial / replaced)": [
+            f"{cell_text(i)} / {cell_text(r)}".strip(" /")
+            for i, r in zip(rows["initial_plate_count"], rows["replaced_plate_count"])
+        ],
+        "Outcome": rows["outcome"],
+        "Day 15 → 21": rows["expansion"].round(2),
+        "Note": rows["note"],
+        "Archived": rows["source"] != "info",
+    })
+    if query.match:
+        # Ranked by relevance: show where the words matched
+        table.insert(0, "Match", rows["snippet"].where(rows["snippet"] != "", rows["cell"]))
+    st.dataframe(table, use_container_width=True, hide_index=True)
@@ -0,0 +1,213 @@
+"""Batch information plus uploaded microscope images grouped by day and dish."""
+import re
+
+import pandas as pd
+import streamlit as st
+
+import perf
+from common import (
+    UPLOAD_KEY_PREFIX, account_session_memory, cell_text, find_batch, find_counts, get_image_analyzer, get_montage_cache,
+)
+from sheets import COUNT_COLUMNS, COUNT_PHASES
+from views import fragment, is_fragment_rerun
+
+LAYOUTS = ["Grid", "Montage"]
+
+
+def image_grid(files, images_per_row, show_filenames):
+    """One st.image per file, `images_per_row` to a row."""
+    # Only this view decodes images; keep Pillow out of the other pages' cold start
+    from PIL import Image
+
+    for i in range(0, len(files), images_per_row):
+        chunk = files[i:i+images_per_row]
+        cols = st.columns(images_per_row)
+        for idx, fobj in enumerate(chunk):
+            with perf.span("image_decode", file=fobj.name):
+                img = Image.open(fobj)
+                cols[idx].image(img, use_container_width=True)
+            if show_filenames:
+                cols[idx].caption(fobj.name)
+        for idx in range(len(chunk), images_per_row):
+            cols[idx].empty()
+
+
+def image_montage(files, images_per_row, show_filenames):
+    """All files as one server-side montage (see montage.py), cached by content hash."""
+    images = [(f.name, f.getvalue()) for f in files]
+    with perf.span("image_montage", images=len(images)):
+        montage, cached = get_montage_cache().get(images, images_per_row, captions=show_filenames)
+    st.image(montage.jpeg, use_container_width=True)
+    n = montage.count
+    st.caption(f"{n} image{'s' if n != 1 else ''} · {len(montage.jpeg) / 1024:.0f} KB{' · cached' if cached else ''}")
+
+
+def _pct(value):
+    return "–" if pd.isna(value) else f"{value:.0%}"
+
+
+def _score(value):
+    return "–" if pd.isna(value) else f"{value:.2f}"
+
+
+def measure_uploads(uploaded):
+    """{id(file): metrics row} for every upload, measured in one batch (see image_metrics.py)."""
+    with perf.span("image_metrics", images=len(uploaded)):
+        metrics = get_image_analyzer().analyze([(f.name, f.getvalue()) for f in uploaded])
+    return dict(zip(map(id, uploaded), metrics.to_dict("records")))
+
+
+def metrics_caption(files, by_file):
+    """Median confluence and focus of a dish's (or day's) images, as a caption."""
+    df = pd.DataFrame([by_file[id(f)] for f in files])
+    n = len(df)
+    st.caption(
+        f"Confluence {_pct(df['confluence'].median())} · focus {_score(df['focus'].median())} "
+        f"(lowest {_score(df['focus'].min())}) · {n} image{'s' if n != 1 else ''}"
+    )
+
+
+def day_metrics_table(days, by_file):
+    """Per-day aggregates of the image metrics, days in display order."""
+    rows = []
+    for day, files in days:
+        df = pd.DataFrame([by_file[id(f)] for f in files])
+        rows.append({
+            "Day": day,
+            "Images": len(df),
+            "Confluence (median)": _pct(df["confluence"].median()),
+            "Confluence (range)": f"{_pct(df['confluence'].min())} – {_pct(df['confluence'].max())}",
+            "Focus (median)": _score(df["focus"].median()),
+            "Focus (lowest)": _score(df["focus"].min()),
+        })
+    st.markdown("### Image metrics")
+    st.caption("Confluence: share of the field covered by textured (cell) regions. Focus: higher is sharper.")
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+
+@fragment
+def render(ctx):
+    """Batch info plus uploaded images grouped by day and dish. Runs as a fragment."""
+    st.subheader("🛠️ Image Viewer Setup")
+
+    # All controls on one row
+    cols = st.columns(7)
+    with cols[0]:
+        batch_id_to_view = st.number_input("Batch ID", min_value=1, step=1, key="img_setup_bid")
+    with cols[1]:
+        day_prefix = st.text_input("Day prefix", "D", max_chars=3, key="img_setup_prefix")
+    with cols[2]:
+        show_filenames = st.selectbox("Show filenames", ["Yes","No"], index=0, key="img_setup_showfn")
+    with cols[3]:
+        images_per_row = st.number_input("Images/row", 1, 6, 4, key="img_setup_cols")
+    with cols[4]:
+        images_per_day = st.number_input("Images/day", 1, 100, 100, key="img_setup_maxday")
+    with cols[5]:
+        images_per_dish = st.number_input("Images/dish", 1, 10, 4, key="img_setup_perdish")
+    with cols[6]:
+        layout = st.selectbox("Layout", LAYOUTS, index=0, key="img_setup_layout")
+    show_tiles = image_montage if layout == "Montage" else image_grid
+
+    # Second row: file uploader. The key carries a generation number so the
+    # memory cap can release the uploads by giving the widget a fresh key.
+    if st.session_state.pop("memory_evicted_uploads", False):
+        st.warning("Uploaded images were released to keep this session under its memory cap. Please upload again.")
+    uploaded = st.file_uploader(
+        "Upload images (JPEG/PNG)",
+        type=["jpg","jpeg","png"],
+        accept_multiple_files=True,
+        key=f"{UPLOAD_KEY_PREFIX}_{st.session_state.get('img_upload_gen', 0)}"
+    )
+
+    # Third row: Run button
+    col_run, col_metrics = st.columns([1, 5])
+    with col_run:
+        run = st.button("Run")
+    with col_metrics:
+        measure = st.toggle("Measure confluence & focus", key="img_setup_metrics")
+
+    if run:
+        if not uploaded:
+            st.warning("No images uploaded.")
+            return
+
+        # 1) Batch info
+        if batch_id_to_view:
+            rec = find_batch(ctx.username, batch_id_to_view)
+            if rec is None:
+                st.error(f"Batch {batch_id_to_view} not found.")
+            else:
+                st.subheader(f"Batch {batch_id_to_view} Information")
+                st.write(f"• Cell Type: {cell_text(rec['cell'])}")
+                st.write(f"• Start Date: {cell_text(rec['start_date'])}")
+                st.write(f"• End Date: {cell_text(rec['end_date'])}")
+                st.markdown("**Note:**")
+                st.write(cell_text(rec["note"]))
+                st.write(f"• Initial Count: {cell_text(rec['initial_plate_count'])}")
+                st.write(f"• Replaced Count: {cell_text(rec['replaced_plate_count'])}")
+                st.markdown("---")
+
+                # Cell counts
+                batch_counts = find_counts(ctx.username, batch_id_to_view)
+                if batch_counts:
+                    st.subheader("Cell Counts")
+                    # one row per phase, blank where that phase has no counts yet
+                    pivot = pd.DataFrame(
+                        [[cell_text(batch_counts[ph].get(c)) if ph in batch_counts else "" for c in COUNT_COLUMNS]
+                         for ph in COUNT_PHASES],
+                        index=COUNT_PHASES, columns=COUNT_COLUMNS,
+                    )
+                    # drop empty columns
+                    pivot = pivot.replace("", pd.NA).dropna(axis=1, how="all")
+                    st.table(pivot)
+                else:
+                    st.info("No cell counts available for this batch.")
+
+        # 2) Images grouping
+        from collections import defaultdict
+        day_pat  = re.compile(rf"_{re.escape(day_prefix)}(\d+)_", re.IGNORECASE)
+        dish_pat = re.compile(r"#([^_]+)", re.IGNORECASE)
+        groups   = defaultdict(list)
+        for f in uploaded:
+            m = day_pat.search(f.name)
+            day = m.group(1) if m else "Unknown"
+            groups[day].append(f)
+
+        # sort days
+        def day_key(it): 
+            x,_=it
+            return int(x) if x.isdigit() else float('inf')
+        days = sorted(groups.items(), key=day_key)
+        by_file = None
+        if measure:
+            by_file = measure_uploads(uploaded)
+            day_metrics_table(days, by_file)
+        for day, files in days:
+            st.markdown(f"### Day {day}")
+            # check dish IDs
+            dish_ids = [dish_pat.search(f.name).group(1) for f in files if dish_pat.search(f.name)]
+            if dish_ids:
+                # group by dish
+                from collections import defaultdict
+                dg=defaultdict(list)
+                for f in files:
+                    m2=dish_pat.search(f.name)
+                    di = m2.group(1) if m2 else "Unknown"
+                    dg[di].append(f)
+                for di,flist in sorted(dg.items()):
+                    st.markdown(f"#### Dish {di}")
+                    flist = sorted(flist, key=lambda x: x.name)
+                    if by_file is not None:
+                        metrics_caption(flist, by_file)
+                    show_tiles(flist[:images_per_dish], images_per_row, show_filenames=="Yes")
+            else:
+                # no dishes, show by day only
+                if by_file is not None:
+                    metrics_caption(files, by_file)
+                flist = sorted(files, key=lambda x: x.name)[:images_per_day]
+                show_tiles(flist, images_per_row, show_filenames=="Yes")
+    else:
+        st.info("Configure settings above and click Run to view batch info and images.")
+    # A full run is accounted at the end of streamlit_app.py; a fragment rerun never gets there
+    if is_fragment_rerun():
+        account_session_memory(ctx)
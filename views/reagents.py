@@ -0,0 +1,69 @@
+"""Reagent Forecast: stock volume of every medium component needed over the next weeks."""
+from datetime import timedelta
+
+import pandas as pd
+import streamlit as st
+
+import perf
+from common import PROTOCOL_FILE, get_protocol_registry, read_sheet
+from core.reagents import consumption_long, consumption_summary, forecast_groups
+from core.volumes import format_volume
+from views import fragment
+
+
+@fragment
+def render(ctx):
+    """
+    Daily and cumulative consumption for every running and planned batch, from
+    plate counts (default volumes when unknown) and its own protocol version.
+    Runs as a fragment.
+    """
+    st.subheader("🧴 Reagent Forecast")
+    col_weeks, col_scope = st.columns([1, 2])
+    with col_weeks:
+        weeks = st.number_input("Weeks ahead", min_value=1, max_value=104, value=4, step=1, key="reagent_weeks")
+    with col_scope:
+        scope = st.radio("Batches", ["My batches", "Whole lab"], horizontal=True, key="reagent_scope")
+
+    # Running and planned batches are all in the hot sheet; finished ones use nothing ahead
+    batches = read_sheet("info")
+    if scope == "My batches":
+        batches = batches[batches["username"] == ctx.username]
+    registry = get_protocol_registry()
+    missing = registry.missing(registry.versions_of(batches))
+    if missing:
+        st.warning(f"No workbook for protocol version(s) {', '.join(missing)}: their batches are left out.")
+    start, end = ctx.today, ctx.today + timedelta(weeks=int(weeks)) - timedelta(days=1)
+    try:
+        groups = [(protocol.days, group) for protocol, group in registry.groups(batches)]
+    except FileNotFoundError:
+        st.warning(f"Protocol file '{PROTOCOL_FILE}' not found.")
+        return
+    with perf.span("forecast_consumption", batches=len(batches), weeks=int(weeks)):
+        daily = forecast_groups(groups, start, end)
+    summary = consumption_summary(daily, *(protocol for protocol, _ in groups))
+    if summary.empty:
+        st.info("No media changes scheduled in this period.")
+        return
+
+    st.caption(f"{start:%Y-%m-%d} to {end:%Y-%m-%d} · {len(batches)} batches · volumes are of the stock solution")
+    st.dataframe(pd.DataFrame({
+        "Component": summary["component"],
+        "Stock": summary["stock_conc"],
+        "Total": [format_volume(ml) for ml in summary["total_ml"]],
+        "Busiest day": [f"{d:%a %m-%d} ({format_volume(ml)})" for d, ml in zip(summary["peak_date"], summary["peak_ml"])],
+    }), use_container_width=True, hide_index=True)
+
+    used = daily[summary["component"]]
+    if st.toggle("Cumulative", value=True, key="reagent_cumulative"):
+        st.line_chart(used.cumsum())
+    else:
+        st.bar_chart(used)
+
+    st.download_button(
+        "Download forecast (CSV)",
+        consumption_long(daily).to_csv(index=False, float_format="%.4f"),
+        file_name=f"reagent_forecast_{start:%Y%m%d}_{end:%Y%m%d}.csv",
+        mime="text/csv",
+        key="reagent_download",
+    )
@@ -0,0 +1,78 @@
+"""Tasks of every ongoing batch on a chosen date, grouped by protocol version and day, with component volumes."""
+import pandas as pd
+import streamlit as st
+
+import perf
+from common import PROTOCOL_FILE, get_protocol_registry
+from core.calendar import day_index_on
+from core.rules import default_volume_ml
+from core.volumes import composition_volumes
+from views import fragment
+
+
+@fragment
+def composition_table(version, day, idx, entry):
+    """Volume input and composition table for one task of a day. Typing a volume reruns only this block."""
+    total_vol = st.number_input(
+        f"Total Volume (mL) for Task {idx+1}", 
+        min_value=1.0, value=default_volume_ml(day), step=1.0, 
+        key=f"vol_{version}_d{day}_{idx}"
+    )
+    display_rows = composition_volumes(entry, total_vol)
+    st.table(pd.DataFrame(display_rows))
+
+
+def day_block(protocol, day, batch_ids, show_version=False):
+    """Stage, batches and tasks of one protocol day, drawn once however many batches are on it."""
+    st.markdown(f"### 🧪 D{day} · {protocol.on('stage', day)}")
+    if show_version:
+        st.caption(f"Protocol: {protocol.version}")
+    label = "Batch" if len(batch_ids) == 1 else "Batches"
+    st.markdown(f"**{label}:** {', '.join(str(b) for b in batch_ids)}")
+    day_entries = protocol.on("entries", day)
+    if not day_entries:
+        st.info("No task for this day.")
+    for idx, entry in enumerate(day_entries):
+        task_txt = entry.get("task", "No task")
+        st.markdown(f"**Task {idx+1}:** {task_txt}")
+        if entry.get("composition"):
+            composition_table(protocol.version, day, idx, entry)
+
+
+@fragment
+def render(ctx):
+    """
+    Tasks on the picked date, one block per protocol version and day with the
+    batches on it, so the page grows with distinct (version, day) pairs, not
+    with batches. Changing the date reruns only this view.
+    """
+    st.subheader("📌 Batch Tasks")
+    batches = ctx.batches
+    selected_date = st.date_input("Select Date", value=ctx.today, key='task_date')
+    if batches.empty:
+        st.info("No ongoing batches.")
+    else:
+        registry = get_protocol_registry()
+        versions = registry.versions_of(batches)
+        missing = registry.missing(versions)
+        try:
+            with perf.span("load_protocol"):
+                protocols = {v: registry.get(v) for v in set(versions) - set(missing)}
+        except FileNotFoundError:
+            st.warning(f"Protocol file '{PROTOCOL_FILE}' not found.")
+            protocols = {}
+        if missing:
+            st.warning(f"No workbook for protocol version(s) {', '.join(missing)}: their batches are not shown.")
+
+        # Day index of every batch on the picked date, then batch ids grouped by version and day
+        days = day_index_on(batches, selected_date)
+        running = batches.assign(version=versions, day=days).dropna(subset=["day"])
+        running = running[running["version"].isin(list(protocols))].sort_values(["day", "version", "batch_id"])
+        by_day = running.groupby(["day", "version"], sort=False)["batch_id"].agg(list)
+
+        if not by_day.empty:
+            for (day, version), batch_ids in by_day.items():
+                with st.container(border=True):
+                    day_block(protocols[version], int(day), batch_ids, show_version=len(protocols) > 1)
+        else:
+            st.info("No ongoing batches with tasks for today.")